@@ -0,0 +1,144 @@
+"""
+Benchmark: Word document assembly with per-builder saves (legacy) vs a single deferred save.
+
+Builds a synthetic 10-remediation report offline (no S3 / Bedrock) and reports the number of
+doc.save calls and the assembly wall time for both modes.
+
+Usage:
+    python image/benchmarks/bench_document_assembly.py [--runs 3]
+"""
+#system imports
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+#placeholder region so boto3 clients can be constructed offline
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+#third-party imports
+import docx.document
+from docx.api import Document
+
+#local/user imports
+import document_wrangler
+from report_context import ReportContext
+
+PILLAR_IDS = ['operationalExcellence', 'security', 'reliability', 'performance', 'costOptimization', 'sustainability']
+BUILDERS = ['json_to_table', 'create_risk_metrics_table', 'create_bar_chart', 'create_qw_remediation_item', 'create_top_10_qw_table']
+
+
+def build_synthetic_context(num_remediations=10, questions_per_pillar=2, choices_per_question=3):
+    context = ReportContext('benchmark', 'wellarchitected', 1)
+    context.risk_metrics = [
+        {"Name": pillar_id, "Unanswered": 0, "High": questions_per_pillar, "Medium": questions_per_pillar, "None": 1, "NotApplicable": 0}
+        for pillar_id in PILLAR_IDS
+    ]
+    for risk, target in (("HIGH", context.high_risk_questions), ("MEDIUM", context.medium_risk_questions)):
+        for pillar_id in PILLAR_IDS:
+            target[pillar_id] = {
+                f"{pillar_id} {q}. {risk} question": {
+                    "UnselectedChoices": [f"Best practice choice {c}" for c in range(choices_per_question)],
+                    "Risk": risk,
+                }
+                for q in range(1, questions_per_pillar + 1)
+            }
+    context.top_10_quick_wins = [
+        {"quick_win_id": str(i), "best_practice_question": f"Question {i}", "unselected_best_practice_item": f"Best practice {i}", "effort_estimate": "quick-win"}
+        for i in range(1, num_remediations + 1)
+    ]
+    paragraph = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20
+    context.remediation_items = [
+        {
+            "quick_win_id": str(i),
+            "best_practice_option": f"Best practice {i}",
+            "remediation_description": paragraph,
+            "remediation_solution": paragraph * 3,
+            "remediation_general_considerations": paragraph,
+            "effort_estimate": paragraph,
+            "resources_needed": paragraph,
+            "domain_impact": "Security",
+        }
+        for i in range(1, num_remediations + 1)
+    ]
+    return context
+
+
+def assemble(context, template_path):
+    doc = Document(template_path)
+    document_wrangler.add_risk_breakdown_section(doc, context)
+    document_wrangler.add_risk_items_sections(doc, context)
+    document_wrangler.add_quick_wins_table_section(doc, context)
+    document_wrangler.add_remediation_sections(doc, context)
+    document_wrangler.serialise_document(doc)
+
+
+def with_legacy_saves(doc_path):
+    #re-create the old behaviour: every builder saves the whole document when it finishes
+    originals = {name: getattr(document_wrangler, name) for name in BUILDERS}
+
+    def saving(builder):
+        def wrapper(json_data, doc, *args):
+            builder(json_data, doc, *args)
+            doc.save(doc_path)
+        return wrapper
+
+    for name, builder in originals.items():
+        setattr(document_wrangler, name, saving(builder))
+    return originals
+
+
+def run(mode, context, template_path, doc_path):
+    save_count = 0
+    save_time = 0.0
+    original_save = docx.document.Document.save
+
+    def counting_save(self, path_or_stream):
+        nonlocal save_count, save_time
+        save_start = time.perf_counter()
+        original_save(self, path_or_stream)
+        save_time += time.perf_counter() - save_start
+        save_count += 1
+
+    docx.document.Document.save = counting_save
+    originals = with_legacy_saves(doc_path) if mode == 'legacy' else {}
+    try:
+        start = time.perf_counter()
+        assemble(context, template_path)
+        elapsed = time.perf_counter() - start
+    finally:
+        docx.document.Document.save = original_save
+        for name, builder in originals.items():
+            setattr(document_wrangler, name, builder)
+    return save_count, save_time, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--remediations', type=int, default=10)
+    args = parser.parse_args()
+
+    context = build_synthetic_context(args.remediations)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        template_path = os.path.join(tmp_dir, 'template.docx')
+        doc_path = os.path.join(tmp_dir, 'wip_document.docx')
+        Document().save(template_path)
+
+        rows = []
+        for mode in ('legacy', 'deferred'):
+            results = [run(mode, context, template_path, doc_path) for _ in range(args.runs)]
+            save_times = [save_time for _, save_time, _ in results]
+            timings = [elapsed for _, _, elapsed in results]
+            rows.append((mode, results[0][0], min(save_times), min(timings), sum(timings) / len(timings)))
+
+        print(f"{'mode':<10}{'saves':>8}{'save (s)':>12}{'best (s)':>12}{'mean (s)':>12}")
+        for mode, save_count, save_time, best, mean in rows:
+            print(f"{mode:<10}{save_count:>8}{save_time:>12.3f}{best:>12.3f}{mean:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
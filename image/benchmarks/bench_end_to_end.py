@@ -0,0 +1,351 @@
+"""
+Benchmark suite: the report pipeline end to end, offline.
+
+Stubs every external dependency through the provider registry:
+- WA Tool API: an in-memory workload with a synthetic lens review and paginated list_answers (optional page latency).
+- S3: in-memory template download / report upload, counting every call and the bytes written.
+- Bedrock: a fake LLM with a fixed latency, answering the ranking and remediation prompts with canned JSON
+  built from the prompt's own candidates.
+
+For every workload size it measures these stages separately:
+- fetch_wafr_questions
+- quick_wins_section_prep
+- initialise_docs (rendering and upload, with the LLM output already in the context)
+- end_to_end (get_wafr_report)
+
+For each stage it reports:
+- median wall time over --runs
+- S3 saves and bytes written
+- WA Tool and model calls
+- peak traced memory (one extra tracemalloc run)
+
+Results are written as JSON to --output (default: wafr_bench_results.json in the temp directory, outside
+the repo). With --baseline, every metric is compared to a previous results file and the run exits with
+status 1 when a wall time or peak memory regresses by more than --threshold.
+
+Usage:
+    python image/benchmarks/bench_end_to_end.py [--sizes small,medium,large] [--runs 3] [--warmup 1] [--llm-latency 0.05]
+                                                [--output results.json] [--baseline previous.json]
+"""
+#system imports
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+#offline and repeatable - no persistent caches, no rate limiting, no incremental state, placeholder region
+os.environ["WAFR_LLM_CACHE"] = "off"
+os.environ["WAFR_WA_CACHE"] = "off"
+os.environ["WAFR_LENS_CACHE"] = "memory"
+os.environ["WAFR_TEMPLATE_CACHE"] = "memory"
+os.environ["WAFR_REPORT_STATE"] = "off"
+os.environ["WAFR_PROGRESS_MARKERS"] = "false"
+os.environ["WAFR_STREAMING_ASSEMBLY"] = "false"
+os.environ["WAFR_LLM_MAX_REQUESTS_PER_SECOND"] = "1000"
+os.environ["WAFR_LLM_MAX_TOKENS_PER_MINUTE"] = "100000000"
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+#third-party imports
+from docx.api import Document
+from langchain_core.language_models.llms import LLM
+
+#local/user imports
+import document_wrangler
+import gpt_magic
+import providers
+import state_manager
+import wafr_tool_api
+from bench_streaming_assembly import FakeS3
+
+#workload sizes: questions per pillar, choices per question, share of HIGH / MEDIUM risk questions
+SIZES = {
+    "small": {"questions_per_pillar": 3, "choices_per_question": 3, "high": 0.3, "medium": 0.3},
+    "medium": {"questions_per_pillar": 10, "choices_per_question": 5, "high": 0.4, "medium": 0.3},
+    "large": {"questions_per_pillar": 30, "choices_per_question": 8, "high": 0.5, "medium": 0.3},
+}
+PILLARS = {
+    "operationalExcellence": "Operational Excellence",
+    "security": "Security",
+    "reliability": "Reliability",
+    "performance": "Performance Efficiency",
+    "costOptimization": "Cost Optimization",
+    "sustainability": "Sustainability",
+}
+STAGES = ["fetch_wafr_questions", "quick_wins_section_prep", "initialise_docs", "end_to_end"]
+#metrics compared against --baseline (lower is better)
+REGRESSION_METRICS = ["wall_seconds", "peak_memory_bytes"]
+
+
+class FakeWellArchitected:
+    """
+    WA Tool client for one synthetic workload - a lens review plus paginated list_answers.
+    """
+    def __init__(self, questions_per_pillar, choices_per_question, high, medium, page_latency_seconds=0.0):
+        self.page_latency_seconds = page_latency_seconds
+        self.calls = 0
+        self.answers = {}
+        for pillar_idx, pillar_id in enumerate(PILLARS):
+            self.answers[pillar_id] = []
+            for question in range(questions_per_pillar):
+                #deterministic risk mix - the first share of questions HIGH, the next MEDIUM, the rest NONE
+                position = (question + pillar_idx) % questions_per_pillar / questions_per_pillar
+                risk = "HIGH" if position < high else "MEDIUM" if position < high + medium else "NONE"
+                choices = [{"ChoiceId": f"{pillar_id}_q{question}_c{choice}", "Title": f"Best practice {choice} for {pillar_id} question {question}"} for choice in range(choices_per_question)]
+                choices.append({"ChoiceId": f"{pillar_id}_q{question}_no", "Title": "None of these"})
+                self.answers[pillar_id].append({
+                    "QuestionId": f"{pillar_id}_q{question}",
+                    "PillarId": pillar_id,
+                    "QuestionTitle": f"How do you manage {pillar_id} concern {question}?",
+                    "Choices": choices,
+                    "SelectedChoices": [] if risk != "NONE" else [choice["ChoiceId"] for choice in choices[:-1]],
+                    "Risk": risk,
+                })
+
+    def _call(self):
+        self.calls += 1
+        if self.page_latency_seconds:
+            time.sleep(self.page_latency_seconds)
+
+    def get_lens_review(self, WorkloadId, LensAlias, MilestoneNumber=None):
+        self._call()
+        summaries = []
+        for pillar_id, name in PILLARS.items():
+            risk_counts = {risk: 0 for risk in ("UNANSWERED", "HIGH", "MEDIUM", "NONE", "NOT_APPLICABLE")}
+            for answer in self.answers[pillar_id]:
+                risk_counts[answer["Risk"]] += 1
+            summaries.append({"PillarId": pillar_id, "PillarName": name, "RiskCounts": risk_counts})
+        return {"LensReview": {"LensAlias": LensAlias, "LensVersion": "benchmark", "PillarReviewSummaries": summaries}}
+
+    def list_answers(self, WorkloadId, LensAlias, PillarId, MaxResults=50, NextToken=None, MilestoneNumber=None):
+        self._call()
+        start = int(NextToken or 0)
+        response = {"AnswerSummaries": self.answers[PillarId][start:start + MaxResults]}
+        if start + MaxResults < len(self.answers[PillarId]):
+            response["NextToken"] = str(start + MaxResults)
+        return response
+
+
+class CountingS3(FakeS3):
+    """
+    In-memory S3 that counts calls and bytes written.
+    """
+    def __init__(self, template_bytes):
+        super().__init__(template_bytes)
+        self.reset()
+
+    def reset(self):
+        self.saves = 0
+        self.bytes_written = 0
+        self.reads = 0
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self.reads += 1
+        return super().get_object(Bucket, Key, IfNoneMatch)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, Config=None):
+        super().upload_fileobj(Fileobj, Bucket, Key, Config)
+        self.saves += 1
+        self.bytes_written += len(self.uploads[Key])
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        super().put_object(Bucket, Key, Body, **kwargs)
+        self.saves += 1
+        self.bytes_written += len(Body)
+
+
+class CannedLLM(LLM):
+    """
+    Fixed latency per call. Ranking prompts get quick wins built from the prompt's candidates, remediation
+    prompts a canned plan for the requested quick win.
+    """
+    latency_seconds: float = 0.05
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-canned"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency_seconds)
+        if "figure out which of these items are quick wins" in prompt:
+            #the candidates are the last prompt line - ranking candidates or shortlisted quick wins (reduce step)
+            quick_wins = []
+            for candidate in json.loads(prompt.rsplit("\n", 1)[-1]):
+                if "choices" in candidate:
+                    quick_wins.extend((candidate["question"], choice) for choice in candidate["choices"])
+                else:
+                    quick_wins.append((candidate["best_practice_question"], candidate["unselected_best_practice_item"]))
+            return json.dumps([
+                {"quick_win_id": str(idx), "best_practice_question": question, "unselected_best_practice_item": choice, "effort_estimate": "quick-win"}
+                for idx, (question, choice) in enumerate(quick_wins[:10], start=1)
+            ])
+        quick_win_id = prompt.rsplit("'quick_win_id': '", 1)[-1].split("'", 1)[0]
+        paragraph = f"Remediation {quick_win_id}. " + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20
+        return json.dumps({
+            "quick_win_id": quick_win_id,
+            "best_practice_option": f"Best practice {quick_win_id}",
+            "remediation_description": paragraph,
+            "remediation_solution": paragraph * 3,
+            "remediation_general_considerations": paragraph,
+            "effort_estimate": paragraph,
+            "resources_needed": paragraph,
+            "domain_impact": "Security",
+        })
+
+
+def run_stage(stage, env):
+    """
+    Run one stage once against the stubs, returns its output.
+    """
+    if stage == "fetch_wafr_questions":
+        return wafr_tool_api.fetch_wafr_questions("benchmark", "wellarchitected", 1)
+    if stage == "quick_wins_section_prep":
+        return gpt_magic.quick_wins_section_prep(env["context"])
+    if stage == "initialise_docs":
+        #the LLM output is already in the context - measure rendering + upload only
+        prepared = env["context"]
+        original_prep = document_wrangler.quick_wins_section_prep
+        document_wrangler.quick_wins_section_prep = lambda context: context.remediation_items
+        try:
+            return document_wrangler.initialise_docs(prepared, 'templates', 'template.docx', 'output', 'benchmark', progress_markers=False, streaming=False)
+        finally:
+            document_wrangler.quick_wins_section_prep = original_prep
+    return state_manager.get_wafr_report("benchmark", 1, "benchmark", lens_alias="wellarchitected")
+
+
+def measure_stage(stage, env, runs, warmup):
+    wa, s3, llm = env["wa"], env["s3"], env["llm"]
+    #untimed runs first - imports, pooled clients and caches are warm like in a reused container
+    for _ in range(warmup):
+        run_stage(stage, env)
+
+    wall_seconds = []
+    for _ in range(runs):
+        wa.calls, llm.calls = 0, 0
+        s3.reset()
+        start = time.perf_counter()
+        run_stage(stage, env)
+        wall_seconds.append(time.perf_counter() - start)
+
+    #call / byte counts of the last run
+    metrics = {
+        "wall_seconds": round(statistics.median(wall_seconds), 4),
+        "wall_seconds_min": round(min(wall_seconds), 4),
+        "s3_saves": s3.saves,
+        "s3_reads": s3.reads,
+        "bytes_written": s3.bytes_written,
+        "wa_calls": wa.calls,
+        "llm_calls": llm.calls,
+    }
+
+    #one more run under tracemalloc for the peak (tracing slows the run down, so it isn't timed)
+    tracemalloc.start()
+    run_stage(stage, env)
+    metrics["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return metrics
+
+
+def run_size(size_name, args, s3):
+    size = SIZES[size_name]
+    wa = FakeWellArchitected(page_latency_seconds=args.wa_latency, **size)
+    llm = CannedLLM(latency_seconds=args.llm_latency)
+    providers.register("aws:wellarchitected:ap-southeast-2", lambda: wa)
+    providers.register("llm_bedrock", lambda: llm)
+    providers.registry.reset("lens_cache")
+    env = {"wa": wa, "s3": s3, "llm": llm}
+
+    results = {}
+    for stage in STAGES:
+        if stage == "quick_wins_section_prep":
+            env["context"] = wafr_tool_api.fetch_wafr_questions("benchmark", "wellarchitected", 1)
+        results[stage] = measure_stage(stage, env, args.runs, args.warmup)
+        print(f"{size_name:<8}{stage:<26}{results[stage]['wall_seconds']:>10.3f}{results[stage]['s3_saves']:>7}{results[stage]['bytes_written']:>12}"
+              f"{results[stage]['wa_calls']:>6}{results[stage]['llm_calls']:>6}{results[stage]['peak_memory_bytes'] / 2**20:>11.1f}")
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_seconds):
+    """
+    Print metric deltas against a previous results file.
+
+    Returns:
+    - list of (size, stage, metric, baseline value, value) regressions above threshold (wall time changes
+      below min_delta_seconds are noise, not regressions).
+    """
+    regressions = []
+    print(f"\ncompared to baseline {baseline['run']['timestamp']}:")
+    for size_name, stages in results.items():
+        for stage, metrics in stages.items():
+            previous = baseline.get("results", {}).get(size_name, {}).get(stage)
+            if not previous:
+                continue
+            deltas = []
+            for metric, value in metrics.items():
+                if metric not in previous or not previous[metric]:
+                    continue
+                change = (value - previous[metric]) / previous[metric]
+                deltas.append(f"{metric} {change:+.0%}")
+                if metric == "wall_seconds" and value - previous[metric] < min_delta_seconds:
+                    continue
+                if metric in REGRESSION_METRICS and change > threshold:
+                    regressions.append((size_name, stage, metric, previous[metric], value))
+            print(f"  {size_name:<8}{stage:<26}{', '.join(deltas)}")
+    for size_name, stage, metric, previous_value, value in regressions:
+        print(f"REGRESSION {size_name} {stage} {metric}: {previous_value} -> {value}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='small,medium,large')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=1, help='untimed runs per stage before measuring')
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='seconds per fake model call')
+    parser.add_argument('--wa-latency', type=float, default=0.0, help='seconds per fake WA Tool API call')
+    parser.add_argument('--output', default=os.path.join(tempfile.gettempdir(), 'wafr_bench_results.json'))
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative wall time / memory increase counted as a regression')
+    parser.add_argument('--min-delta-seconds', type=float, default=0.05, help='smaller wall time increases are never regressions')
+    args = parser.parse_args()
+
+    template = io.BytesIO()
+    Document().save(template)
+    s3 = CountingS3(template.getvalue())
+    providers.register("aws:s3:default", lambda: s3)
+
+    print(f"{'size':<8}{'stage':<26}{'wall (s)':>10}{'saves':>7}{'bytes':>12}{'wa':>6}{'llm':>6}{'peak (MB)':>11}")
+    results = {size_name: run_size(size_name, args, s3) for size_name in args.sizes.split(",")}
+
+    output = {
+        "run": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.output, 'w') as output_file:
+        json.dump(output, output_file, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold, args.min_delta_seconds)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark: portfolio analytics on NumPy arrays vs dict-of-dicts loops.
+
+Builds synthetic compact answers for --workloads workloads on a Well-Architected sized lens (6 pillars,
+~57 questions, up to 8 choices), then:
+- packs them into a PortfolioMatrix and runs every aggregate (density, percentiles, top unselected practices),
+- computes the same density / top unselected practices with plain Python loops over the dicts,
+and reports wall time, memory held (tracemalloc) and whether both give the same numbers. Renders the
+portfolio report sections into an in-memory document with --render.
+
+Usage:
+    python image/benchmarks/bench_portfolio_analytics.py [--workloads 1000] [--render]
+"""
+#system imports
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+#placeholder region so boto3 clients can be constructed
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+#third-party imports
+from docx.api import Document
+
+#local/user imports
+import portfolio_analytics
+from lens_cache import LensDefinition
+
+#question counts per pillar of the Well-Architected lens
+PILLAR_QUESTIONS = {
+    "operationalExcellence": 11,
+    "security": 11,
+    "reliability": 13,
+    "performance": 5,
+    "costOptimization": 11,
+    "sustainability": 6,
+}
+RISKS = ["HIGH", "MEDIUM", "NONE", "UNANSWERED", "NOT_APPLICABLE"]
+RISK_WEIGHTS = [0.3, 0.25, 0.3, 0.1, 0.05]
+
+
+def build_lens(seed=1):
+    rng = random.Random(seed)
+    answer_summaries = {
+        pillar_id: [
+            {
+                "QuestionId": f"{pillar_id}-q{question}",
+                "QuestionTitle": f"How do you handle {pillar_id} topic {question}?",
+                "Choices": [{"ChoiceId": f"{pillar_id}-q{question}-c{choice}", "Title": f"Best practice {choice} of {pillar_id} {question}"} for choice in range(rng.randint(4, 8))],
+            }
+            for question in range(1, questions + 1)
+        ]
+        for pillar_id, questions in PILLAR_QUESTIONS.items()
+    }
+    return LensDefinition.from_answer_summaries("wellarchitected", "2023-10-03", answer_summaries)
+
+
+def synthetic_answers(lens, workloads, seed=2):
+    rng = random.Random(seed)
+    portfolio_answers = []
+    for _ in range(workloads):
+        answers = {}
+        for pillar_id, pillar in lens.pillars.items():
+            answers[pillar_id] = {}
+            for question_id in pillar["questions"]:
+                choices = list(lens.questions[question_id]["choices"])
+                #earlier choices are left unselected more often, so there are clear "most common" practices
+                unselected = [choice_id for idx, choice_id in enumerate(choices) if rng.random() < 0.7 / (1 + idx * 0.3)]
+                answers[pillar_id][question_id] = {"UnselectedChoiceIds": unselected, "Risk": rng.choices(RISKS, RISK_WEIGHTS)[0]}
+        portfolio_answers.append(answers)
+    return portfolio_answers
+
+
+def loop_aggregates(lens, portfolio_answers, top_n=10):
+    #the same rollups over dict-of-dicts, one Python loop per workload / question / choice
+    high = Counter()
+    medium = Counter()
+    answered = Counter()
+    unselected = Counter()
+    for answers in portfolio_answers:
+        for pillar_id, questions in answers.items():
+            for question_id, answer in questions.items():
+                if answer["Risk"] in ("HIGH", "MEDIUM", "NONE"):
+                    answered[pillar_id] += 1
+                if answer["Risk"] == "HIGH":
+                    high[pillar_id] += 1
+                if answer["Risk"] == "MEDIUM":
+                    medium[pillar_id] += 1
+                if answer["Risk"] in ("HIGH", "MEDIUM"):
+                    for choice_id in answer["UnselectedChoiceIds"]:
+                        unselected[(question_id, choice_id)] += 1
+    density = {pillar_id: round(high[pillar_id] / max(1, answered[pillar_id]), 3) for pillar_id in lens.pillars}
+    top = sorted(unselected.values(), reverse=True)[:top_n]
+    return density, top
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workloads', type=int, default=1000)
+    parser.add_argument('--render', action='store_true', help='also render the portfolio report sections')
+    args = parser.parse_args()
+
+    lens = build_lens()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    portfolio_answers = synthetic_answers(lens, args.workloads)
+    dict_bytes = tracemalloc.get_traced_memory()[0] - baseline
+
+    start = time.perf_counter()
+    density, top = loop_aggregates(lens, portfolio_answers)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    portfolio = portfolio_analytics.PortfolioMatrix(lens, initial_capacity=args.workloads)
+    for idx, answers in enumerate(portfolio_answers):
+        portfolio.add_workload(f"workload-{idx}", 1, answers)
+    pack_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = portfolio_analytics.portfolio_summary(portfolio)
+    aggregate_seconds = time.perf_counter() - start
+    tracemalloc.stop()
+
+    names = {pillar_id: pillar["name"] for pillar_id, pillar in lens.pillars.items()}
+    same_density = all(density[pillar_id] == row["HRI density"] for pillar_id, row in zip(lens.pillars, summary["pillar_density"]) if names[pillar_id] == row["Pillar"])
+    same_top = top == [row["Workloads"] for row in summary["top_unselected_practices"]]
+
+    print(f"workloads: {len(portfolio)}  questions: {len(portfolio.question_ids)}  max choices: {portfolio.unselected.shape[2]}")
+    print(f"{'':<24}{'seconds':>10}{'memory (MB)':>14}")
+    print(f"{'dict-of-dicts loops':<24}{loop_seconds:>10.3f}{dict_bytes / 2**20:>14.2f}")
+    print(f"{'numpy pack':<24}{pack_seconds:>10.3f}{portfolio.nbytes() / 2**20:>14.2f}")
+    print(f"{'numpy aggregates':<24}{aggregate_seconds:>10.3f}")
+    print(f"same HRI density: {same_density}  same top unselected counts: {same_top}")
+    for row in summary["top_unselected_practices"][:3]:
+        print(f"  {row['Workloads']:>6}  {row['Question']} / {row['Best Practice']}")
+
+    if args.render:
+        import document_wrangler
+        start = time.perf_counter()
+        doc = Document()
+        document_wrangler.add_portfolio_sections(doc, summary)
+        print(f"portfolio sections rendered in {time.perf_counter() - start:.2f}s ({len(doc.tables)} tables)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark / demo: adaptive rate limiter against a local fake Bedrock endpoint that throttles.
+
+Starts an HTTP server speaking the Bedrock InvokeModel API (Claude v2 completions). It admits
+--server-rps requests per second and answers the rest with 429 ThrottlingException. A pool of
+workers then pushes --calls chain invocations through the real boto3 client + LangChain Bedrock LLM:
+- unlimited: llm | parser straight to the endpoint (throttled calls fail).
+- limited: the same chain behind rate_limiter.AdaptiveRateLimiter (token buckets, AIMD, jittered backoff).
+
+Reports successes, failures, throttles, retries, queue wait, the adapted request rate and wall time.
+
+Usage:
+    python image/benchmarks/bench_rate_limiter.py [--calls 40] [--workers 10] [--server-rps 5]
+"""
+#system imports
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+#offline - no response cache, dummy credentials for the local endpoint
+os.environ["WAFR_LLM_CACHE"] = "off"
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+#third-party imports
+import boto3
+from langchain.llms.bedrock import Bedrock
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import JsonOutputParser
+
+#local/user imports
+from aws_clients import build_client_config
+from llm_cache import cached_llm
+from rate_limiter import AdaptiveRateLimiter, TokenBucket
+
+
+class FakeBedrockHandler(BaseHTTPRequestHandler):
+    """
+    InvokeModel with a server-side request bucket - over the limit answers 429 ThrottlingException.
+    """
+    bucket = None
+    latency_seconds = 0.2
+    throttled = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.bucket._lock:
+            self.bucket._refill(time.monotonic())
+            admitted = self.bucket._tokens >= 1
+            if admitted:
+                self.bucket._tokens -= 1
+
+        if not admitted:
+            with self.lock:
+                FakeBedrockHandler.throttled += 1
+            self.respond(429, {"message": "Too many requests, please wait before trying again."}, {"x-amzn-ErrorType": "ThrottlingException"})
+            return
+
+        time.sleep(self.latency_seconds)
+        self.respond(200, {"completion": json.dumps({"answer": "ok"}), "stop_reason": "stop_sequence"})
+
+    def respond(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def run(chain, calls, workers):
+    successes = 0
+    failures = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(chain.invoke, {"item": str(i)}) for i in range(calls)]:
+            try:
+                future.result()
+                successes += 1
+            except Exception:
+                failures += 1
+    return successes, failures, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument('--server-rps', type=float, default=5)
+    parser.add_argument('--client-rps', type=float, default=20, help='limiter start / max request rate (above the server limit to show AIMD)')
+    args = parser.parse_args()
+
+    FakeBedrockHandler.bucket = TokenBucket(args.server_rps, args.server_rps)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBedrockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = boto3.client('bedrock-runtime', endpoint_url=f"http://127.0.0.1:{server.server_port}", config=build_client_config('bedrock-runtime'))
+    llm = Bedrock(client=client, model_id="anthropic.claude-v2:1", model_kwargs={"max_tokens_to_sample": 256})
+    prompt = PromptTemplate.from_template("Answer as json for item {item}")
+    output_parser = JsonOutputParser()
+
+    print(f"{'mode':<11}{'ok':>5}{'failed':>8}{'throttles':>11}{'retries':>9}{'wait (s)':>10}{'rps':>7}{'wall (s)':>10}")
+    for mode in ('unlimited', 'limited'):
+        FakeBedrockHandler.throttled = 0
+        limiter = AdaptiveRateLimiter(max_requests_per_second=args.client_rps, backoff_base_seconds=0.25) if mode == 'limited' else None
+        chain = prompt | cached_llm(llm, output_parser, None, limiter)
+        time.sleep(1) #let the server bucket refill between modes
+        successes, failures, wall_seconds = run(chain, args.calls, args.workers)
+        stats = limiter.stats() if limiter else {"retries": 0, "queue_wait_seconds": 0.0, "requests_per_second": float('nan')}
+        print(f"{mode:<11}{successes:>5}{failures:>8}{FakeBedrockHandler.throttled:>11}{stats['retries']:>9}{stats['queue_wait_seconds']:>10.2f}{stats['requests_per_second']:>7.2f}{wall_seconds:>10.2f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
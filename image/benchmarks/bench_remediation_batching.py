@@ -0,0 +1,111 @@
+"""
+Benchmark: remediation plans in batches of K quick wins per LLM call vs one call per quick win.
+
+Runs generate_remediation_plans offline against a fake LLM whose latency is a fixed per-request
+overhead plus a per-token cost for the prompt and output. For each batch size / worker count
+it reports the LLM calls, prompt tokens sent (format instructions are repeated per call),
+single-item fallbacks and the wall time. --invalid-rate drops a share of the plans from batch
+responses so the fallback path is exercised.
+
+Usage:
+    python image/benchmarks/bench_remediation_batching.py [--quick-wins 10] [--batch-sizes 1,2,5,10] [--workers 1,5]
+"""
+#system imports
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+#offline - no response cache, placeholder region so boto3 clients can be constructed
+os.environ["WAFR_LLM_CACHE"] = "off"
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+#third-party imports
+from langchain_core.language_models.llms import LLM
+
+#local/user imports
+import gpt_magic
+
+
+class FakeRemediationLLM(LLM):
+    """
+    Answers single and batched remediation prompts with valid plans after a simulated latency.
+    """
+    overhead_seconds: float = 0.4
+    seconds_per_prompt_token: float = 0.00002
+    seconds_per_output_token: float = 0.0005
+    invalid_rate: float = 0.0
+    calls: int = 0
+    prompt_tokens: int = 0
+    lock: object = None
+
+    @property
+    def _llm_type(self):
+        return "fake-remediation"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        input_text = prompt.rsplit("\n", 1)[-1]
+        if "remediation_plans" in prompt:
+            items = json.loads(input_text)
+            plans = [self.plan(item) for item in items if random.random() >= self.invalid_rate]
+            output = json.dumps({"remediation_plans": plans})
+        else:
+            quick_win_id = input_text.split("'quick_win_id': '", 1)[-1].split("'", 1)[0]
+            output = json.dumps(self.plan({"quick_win_id": quick_win_id}))
+
+        with self.lock:
+            self.calls += 1
+            self.prompt_tokens += gpt_magic.estimate_tokens(prompt)
+        output_tokens = gpt_magic.estimate_tokens(output) + 500 * output.count("quick_win_id")
+        time.sleep(self.overhead_seconds + gpt_magic.estimate_tokens(prompt) * self.seconds_per_prompt_token + output_tokens * self.seconds_per_output_token)
+        return output
+
+    @staticmethod
+    def plan(item):
+        return {
+            "quick_win_id": item["quick_win_id"],
+            "best_practice_option": "Best practice",
+            "remediation_description": "Description",
+            "remediation_solution": "Solution",
+            "remediation_general_considerations": "Considerations",
+            "effort_estimate": "2 weeks",
+            "resources_needed": "Cloud engineer",
+            "domain_impact": "Security",
+        }
+
+
+def build_quick_wins(count):
+    return [
+        {"quick_win_id": str(i), "best_practice_question": f"How do you manage question {i}?", "unselected_best_practice_item": f"Best practice {i}", "effort_estimate": "quick-win"}
+        for i in range(1, count + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick-wins', type=int, default=10)
+    parser.add_argument('--batch-sizes', default='1,2,5,10')
+    parser.add_argument('--workers', default='1,5')
+    parser.add_argument('--invalid-rate', type=float, default=0.1)
+    args = parser.parse_args()
+
+    random.seed(0)
+    quick_wins = build_quick_wins(args.quick_wins)
+
+    print(f"{'batch':>6}{'workers':>9}{'calls':>7}{'prompt tokens':>15}{'plans':>7}{'wall (s)':>10}")
+    for max_workers in [int(value) for value in args.workers.split(',')]:
+        for batch_size in [int(value) for value in args.batch_sizes.split(',')]:
+            llm = FakeRemediationLLM(invalid_rate=args.invalid_rate, lock=threading.Lock())
+            start = time.perf_counter()
+            results = gpt_magic.generate_remediation_plans(quick_wins, llm, max_workers, batch_size)
+            wall_seconds = time.perf_counter() - start
+            print(f"{batch_size:>6}{max_workers:>9}{llm.calls:>7}{llm.prompt_tokens:>15}{len(results):>7}{wall_seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: Lambda cold start for the main.handler entry point.
+
+Each run starts a fresh interpreter, times `import main` and the first GET / request through the
+Mangum handler, and reports which heavy modules were loaded by then (they should all be False).
+
+Usage:
+    python image/benchmarks/bench_startup.py [--runs 5]
+"""
+#system imports
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+HEAVY_MODULES = ['langchain', 'langchain_core', 'langsmith', 'openai', 'matplotlib', 'numpy', 'docx']
+
+#runs inside a fresh interpreter so every measurement is a real cold start
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import main
+import_seconds = time.perf_counter() - start
+
+event = {
+    "version": "2.0",
+    "routeKey": "GET /",
+    "rawPath": "/",
+    "rawQueryString": "",
+    "headers": {"host": "localhost"},
+    "requestContext": {"http": {"method": "GET", "path": "/", "protocol": "HTTP/1.1", "sourceIp": "127.0.0.1", "userAgent": "bench"}, "stage": "$default"},
+    "isBase64Encoded": False,
+}
+
+class LambdaContext:
+    function_name = "bench"
+    aws_request_id = "bench"
+
+start = time.perf_counter()
+response = main.handler(event, LambdaContext())
+first_request_seconds = time.perf_counter() - start
+
+print(json.dumps({
+    "import_seconds": import_seconds,
+    "first_request_seconds": first_request_seconds,
+    "status_code": response["statusCode"],
+    "loaded": {name: name in sys.modules for name in HEAVY_MODULES},
+}))
+'''
+
+
+def run_probe():
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    probe = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{PROBE}"
+    output = subprocess.run([sys.executable, '-c', probe], cwd=SRC_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = [run_probe() for _ in range(args.runs)]
+    import_times = [result['import_seconds'] for result in results]
+    request_times = [result['first_request_seconds'] for result in results]
+
+    print(f"{'metric':<22}{'best (ms)':>12}{'mean (ms)':>12}")
+    print(f"{'import main':<22}{min(import_times) * 1000:>12.1f}{sum(import_times) / len(import_times) * 1000:>12.1f}")
+    print(f"{'first GET /':<22}{min(request_times) * 1000:>12.1f}{sum(request_times) / len(request_times) * 1000:>12.1f}")
+    print(f"status code: {results[-1]['status_code']}")
+    print("heavy modules loaded at first response: " + ", ".join(f"{name}={loaded}" for name, loaded in results[-1]['loaded'].items()))
+
+
+if __name__ == "__main__":
+    main()
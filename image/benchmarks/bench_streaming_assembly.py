@@ -0,0 +1,140 @@
+"""
+Benchmark: streaming LLM -> document assembly vs LLM stage first, then rendering.
+
+Runs initialise_docs offline (in-memory S3, fake LLM with a fixed latency per call) in both modes,
+and reports the LLM-only time, the rendering-only time and the end-to-end time of each mode.
+Streaming should land near max(LLM, rendering) and sequential near their sum. Also checks both
+modes produce the same document text.
+
+Usage:
+    python image/benchmarks/bench_streaming_assembly.py [--llm-latency 0.5] [--questions-per-pillar 10]
+"""
+#system imports
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+#offline - no response cache, placeholder region so boto3 clients can be constructed
+os.environ["WAFR_LLM_CACHE"] = "off"
+os.environ["WAFR_TEMPLATE_CACHE"] = "memory"
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+#third-party imports
+from botocore.exceptions import ClientError
+from docx.api import Document
+from langchain_core.language_models.llms import LLM
+
+#local/user imports
+import document_wrangler
+import gpt_magic
+import providers
+from bench_document_assembly import build_synthetic_context
+
+
+class FakeS3:
+    """
+    Just enough of the S3 client for initialise_docs: template download, report upload, progress markers.
+    """
+    def __init__(self, template_bytes):
+        self.template_bytes = template_bytes
+        self.uploads = {}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        etag = f'"{hashlib.md5(self.template_bytes).hexdigest()}"'
+        if IfNoneMatch == etag:
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"}, "ResponseMetadata": {"HTTPStatusCode": 304}}, "GetObject")
+        return {"Body": io.BytesIO(self.template_bytes), "ETag": etag}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, Config=None):
+        self.uploads[Key] = Fileobj.read()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.uploads[Key] = Body
+
+
+class FakeLLM(LLM):
+    """
+    Answers the ranking and remediation prompts with valid JSON after a fixed latency.
+    """
+    latency_seconds: float = 0.5
+
+    @property
+    def _llm_type(self):
+        return "fake-streaming"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_seconds)
+        if "figure out which of these items are quick wins" in prompt:
+            return json.dumps([
+                {"quick_win_id": str(i), "best_practice_question": f"Question {i}", "unselected_best_practice_item": f"Best practice {i}", "effort_estimate": "quick-win"}
+                for i in range(1, 11)
+            ])
+        quick_win_id = prompt.rsplit("'quick_win_id': '", 1)[-1].split("'", 1)[0]
+        paragraph = f"Remediation {quick_win_id}. " + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20
+        return json.dumps({
+            "quick_win_id": quick_win_id,
+            "best_practice_option": f"Best practice {quick_win_id}",
+            "remediation_description": paragraph,
+            "remediation_solution": paragraph * 3,
+            "remediation_general_considerations": paragraph,
+            "effort_estimate": paragraph,
+            "resources_needed": paragraph,
+            "domain_impact": "Security",
+        })
+
+
+def fresh_context(args):
+    context = build_synthetic_context(questions_per_pillar=args.questions_per_pillar, choices_per_question=args.choices_per_question)
+    context.top_10_quick_wins = []
+    context.remediation_items = []
+    return context
+
+
+def run_report(args, s3, streaming):
+    start = time.perf_counter()
+    key = document_wrangler.initialise_docs(fresh_context(args), 'templates', 'template.docx', 'output', 'benchmark', progress_markers=False, streaming=streaming)
+    elapsed = time.perf_counter() - start
+    text = "\n".join(paragraph.text for paragraph in Document(io.BytesIO(s3.uploads[key])).paragraphs)
+    return elapsed, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--questions-per-pillar', type=int, default=10)
+    parser.add_argument('--choices-per-question', type=int, default=4)
+    args = parser.parse_args()
+
+    template = io.BytesIO()
+    Document().save(template)
+    s3 = FakeS3(template.getvalue())
+    providers.register("aws:s3:default", lambda: s3)
+
+    # Rendering only - the LLM answers instantly
+    providers.register("llm_bedrock", lambda: FakeLLM(latency_seconds=0.0))
+    run_report(args, s3, streaming=False) #warm up imports / chart cache
+    rendering_seconds, _ = run_report(args, s3, streaming=False)
+
+    # LLM only
+    providers.register("llm_bedrock", lambda: FakeLLM(latency_seconds=args.llm_latency))
+    start = time.perf_counter()
+    gpt_magic.quick_wins_section_prep(fresh_context(args))
+    llm_seconds = time.perf_counter() - start
+
+    sequential_seconds, sequential_text = run_report(args, s3, streaming=False)
+    streaming_seconds, streaming_text = run_report(args, s3, streaming=True)
+
+    print(f"{'llm only (s)':>14}{'render only (s)':>17}{'sequential (s)':>16}{'streaming (s)':>15}")
+    print(f"{llm_seconds:>14.2f}{rendering_seconds:>17.2f}{sequential_seconds:>16.2f}{streaming_seconds:>15.2f}")
+    print(f"max(llm, render): {max(llm_seconds, rendering_seconds):.2f}s  sum: {llm_seconds + rendering_seconds:.2f}s")
+    print(f"identical document text: {sequential_text == streaming_text}")
+
+
+if __name__ == "__main__":
+    main()
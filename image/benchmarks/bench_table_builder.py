@@ -0,0 +1,255 @@
+"""
+Benchmark: bulk (single pass) table builder vs the legacy add_row / cell / merge table code.
+
+Builds the HRI/MRI, risk metrics and top 10 quick wins tables for a synthetic data set
+(500 choice rows by default), checks the generated table XML is identical for both
+implementations and reports the build times.
+
+Usage:
+    python image/benchmarks/bench_table_builder.py [--rows 500] [--runs 1]
+"""
+#system imports
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+#placeholder region so boto3 clients can be constructed offline
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+#third-party imports
+from docx.api import Document
+from docx.enum.table import WD_ALIGN_VERTICAL
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.oxml.ns import qn
+from docx.shared import Inches
+from lxml import etree
+
+#local/user imports
+import document_wrangler
+
+PILLAR_IDS = ['operationalExcellence', 'security', 'reliability', 'performance', 'costOptimization', 'sustainability']
+
+
+# Legacy implementations (before the bulk table builder) - kept here as the reference output
+
+def legacy_json_to_table(json_data, doc):
+    """
+    Convert JSON data to a table in a Word document with vertical cell merging and separated best practice choices.
+
+    :param json_data: JSON data to convert to a table.
+    :param doc: Word document object to write the table to.
+    """
+    # Initialize the table
+    table = doc.add_table(rows=1, cols=3)
+    table.style = 'Table Grid'
+
+    #pillar mapping
+    pillar_mapping = {
+        "operationalExcellence": "Operational Excellence",
+        "security": "Security",
+        "reliability": "Reliability",
+        "performance": "Performance Efficiency",
+        "costOptimization": "Cost Optimisation",
+        "sustainability": "Sustainability"
+    }
+
+    # Add column headers and make them bold
+    header_cells = table.rows[0].cells
+    for idx, header_text in enumerate(['Pillar Name', 'Question Title', 'Best Practice Choice']):
+        cell = header_cells[idx]
+        cell.text = header_text
+        # Apply bold formatting to the text
+        for paragraph in cell.paragraphs:
+            for run in paragraph.runs:
+                run.font.bold = True
+
+    merge_ranges = {}
+
+    for pillar, questions in json_data.items():
+        for question, details in questions.items():
+            # Find the start and end row index for the current cell
+            start_row_index = len(table.rows)
+            for choice in details.get("UnselectedChoices", []):
+                if choice != "None of these":
+                    cells = table.add_row().cells
+                    cells[0].text = pillar
+                    cells[1].text = question
+                    cells[2].text = choice.strip()
+            
+            end_row_index = len(table.rows)
+            
+            # Update merge ranges dictionary
+            key = (pillar, question)
+            if key in merge_ranges:
+                merge_ranges[key] = (min(merge_ranges[key][0], start_row_index), max(merge_ranges[key][1], end_row_index))
+            else:
+                merge_ranges[key] = (start_row_index, end_row_index)
+
+    # Merge cells vertically for each unique value
+    for key, (start_row, end_row) in merge_ranges.items():
+    # Replace the incorrect pillar name with the correct one
+        pillar = key[0]
+        correct_pillar = pillar_mapping.get(pillar, pillar)
+        question = key[1]
+        for col in range(2):  # Merge only first two columns
+            start_cell = table.cell(start_row, col)
+            end_cell = table.cell(end_row - 1, col)  # Subtract 1 to get the last cell
+            start_text = start_cell.text
+            # Replace the pillar name with the correct one
+            start_text = start_text.replace(pillar, correct_pillar)
+            start_cell.merge(end_cell)
+            merged_cell = table.cell(start_row, col)  # Use start row for the merged cell
+            merged_cell.text = start_text  # Set the text of the merged cell to the start cell's text
+
+    # Set vertical alignment for all cells
+    for row in table.rows:
+        for cell in row.cells:
+            cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+
+
+def legacy_create_risk_metrics_table(json_data, doc):
+    """
+    Creates a Word table for risk metrics breakdown.
+    
+    Args:
+    - json_data: List of dictionaries containing risk metrics data.
+    - doc: Word document object the table is added to (not saved).
+    """
+    
+    # Add a table with headers
+    table = doc.add_table(rows=1, cols=len(json_data[0]) -1) #ignoring the None column
+    table.style = 'Table Grid'
+
+     # Add column headers and make them bold
+    headers = list(json_data[0].keys())
+    headers.remove('None')  # Remove 'None' column
+    row = table.rows[0]
+    for idx, header in enumerate(headers):
+        cell = row.cells[idx]
+        if header == 'NotApplicable':
+            cell.text = 'Not Applicable'
+        else:
+            cell.text = header
+        # Apply bold formatting to the text
+        for paragraph in cell.paragraphs:
+            for run in paragraph.runs:
+                run.font.bold = True
+
+    # Add data to the table
+    for entry in json_data:
+        row = table.add_row().cells
+        for idx, header in enumerate(headers):
+            row[idx].text = str(entry[header])
+    
+    # Set alignment for all cells
+    for row in table.rows:
+        for cell in row.cells:
+            # Set horizontal alignment to center
+            cell.paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+            # Set vertical alignment to middle
+            cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+
+    # Set the alignment for the first column to left-aligned
+    for cell in table.columns[0].cells:
+        for paragraph in cell.paragraphs:
+            paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
+
+
+def legacy_create_top_10_qw_table(json_data, doc):
+    # Add a table with headers
+    table = doc.add_table(rows=1, cols=3)
+    table.style = 'Table Grid'
+
+    # Add column headers
+    headers = ["#", "Question", "Best Practice"]
+    row = table.rows[0]
+    for idx, header in enumerate(headers):
+        cell = row.cells[idx]
+        cell.text = header
+        # Apply bold formatting to the text
+        for paragraph in cell.paragraphs:
+            for run in paragraph.runs:
+                run.font.bold = True
+
+    # Add data to the table
+    for entry in json_data:
+        row = table.add_row().cells
+        row[0].text = str(entry["quick_win_id"])
+        row[1].text = entry["best_practice_question"]
+        row[2].text = entry["unselected_best_practice_item"]
+    
+    # Set alignment for all cells
+    for row in table.rows:
+        for cell in row.cells:
+            cell.paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.LEFT  # Horizontal alignment
+            cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER  # Vertical alignment
+
+    # Adjust width of the first column
+    table.autofit = True
+    table.columns[0].width = Inches(0.5)  # Set width to fit 2digits
+    table.columns[1].width = Inches(3.0)  
+    table.columns[2].width = Inches(3.5)
+
+
+def build_synthetic_data(num_rows, choices_per_question=5):
+    risk_questions = {pillar_id: {} for pillar_id in PILLAR_IDS}
+    num_questions = max(1, num_rows // choices_per_question)
+    for q in range(num_questions):
+        pillar_id = PILLAR_IDS[q % len(PILLAR_IDS)]
+        risk_questions[pillar_id][f"Q{q + 1}. How do you manage {pillar_id} question {q + 1}?"] = {
+            "UnselectedChoices": [f"Best practice {q + 1}.{c + 1} " for c in range(choices_per_question)] + ["None of these"],
+            "Risk": "HIGH",
+        }
+    risk_metrics = [
+        {"Name": pillar_id, "Unanswered": 1, "High": 4, "Medium": 3, "None": 2, "NotApplicable": 0}
+        for pillar_id in PILLAR_IDS
+    ]
+    quick_wins = [
+        {"quick_win_id": str(i), "best_practice_question": f"Question {i}\twith tab", "unselected_best_practice_item": f"Best practice {i}\nsecond line", "effort_estimate": "quick-win"}
+        for i in range(1, 11)
+    ]
+    return risk_questions, risk_metrics, quick_wins
+
+
+def build_tables(json_to_table, create_risk_metrics_table, create_top_10_qw_table, data):
+    risk_questions, risk_metrics, quick_wins = data
+    doc = Document()
+    start = time.perf_counter()
+    json_to_table(risk_questions, doc)
+    hri_seconds = time.perf_counter() - start
+    create_risk_metrics_table(risk_metrics, doc)
+    create_top_10_qw_table(quick_wins, doc)
+    total_seconds = time.perf_counter() - start
+    tables_xml = [etree.tostring(tbl) for tbl in doc.element.body.iter(qn('w:tbl'))]
+    return hri_seconds, total_seconds, tables_xml
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--runs', type=int, default=1)
+    args = parser.parse_args()
+
+    data = build_synthetic_data(args.rows)
+    implementations = {
+        'legacy': (legacy_json_to_table, legacy_create_risk_metrics_table, legacy_create_top_10_qw_table),
+        'bulk': (document_wrangler.json_to_table, document_wrangler.create_risk_metrics_table, document_wrangler.create_top_10_qw_table),
+    }
+
+    results = {}
+    for name, builders in implementations.items():
+        runs = [build_tables(*builders, data) for _ in range(args.runs)]
+        results[name] = (min(run[0] for run in runs), min(run[1] for run in runs), runs[0][2])
+
+    print(f"{'builder':<10}{'HRI table (s)':>16}{'all tables (s)':>16}")
+    for name, (hri_seconds, total_seconds, _) in results.items():
+        print(f"{name:<10}{hri_seconds:>16.3f}{total_seconds:>16.3f}")
+    print(f"speed-up (all tables): {results['legacy'][1] / results['bulk'][1]:.1f}x")
+    print(f"identical table XML: {results['legacy'][2] == results['bulk'][2]}")
+
+
+if __name__ == "__main__":
+    main()
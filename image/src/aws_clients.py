@@ -0,0 +1,70 @@
+#third-party imports
+import boto3
+from botocore.config import Config
+
+#system imports
+import os
+import threading
+
+#local/user imports
+import providers
+from telemetry import instrument_client
+
+#Shared boto3 client pool - one client per (service, region), reused across warm Lambda invocations
+#so endpoint resolution, the credential chain and warm TLS connections are only paid for once
+
+#connections kept per client - WA Tool calls are capped at this many in flight (wafr_tool_api.wa_call) however
+#the portfolio / batch workers and their pillar fetches nest, the other fan-outs (remediation workers, S3
+#transfer threads) stay well below it
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("WAFR_AWS_MAX_POOL_CONNECTIONS", "32"))
+AWS_MAX_ATTEMPTS = int(os.getenv("WAFR_AWS_MAX_ATTEMPTS", "8"))
+
+#per-service overrides - Bedrock completions can run well past the default 60s read timeout, and its
+#throttles / timeouts are retried by rate_limiter (AIMD + backoff) rather than inside botocore
+SERVICE_CONFIG_OVERRIDES = {
+    "bedrock-runtime": {"read_timeout": 300, "retries": {"total_max_attempts": 1, "mode": "standard"}},
+}
+
+#boto3 sessions aren't thread safe, client construction is serialised on this lock
+_session_lock = threading.Lock()
+_session = None
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+def build_client_config(service_name):
+    """
+    botocore Config for a pooled client: tuned connection pool + adaptive retries (unless overridden per service).
+
+    Args:
+    - service_name: AWS service name i.e. s3.
+    """
+    config = {
+        "max_pool_connections": AWS_MAX_POOL_CONNECTIONS,
+        "retries": {"max_attempts": AWS_MAX_ATTEMPTS, "mode": "adaptive"},
+    }
+    config.update(SERVICE_CONFIG_OVERRIDES.get(service_name, {}))
+    return Config(**config)
+
+
+def get_client(service_name, region_name=None):
+    """
+    Return the shared client for (service, region), building it on first use.
+
+    Args:
+    - service_name: AWS service name i.e. s3, wellarchitected, bedrock-runtime.
+    - region_name: AWS region (None = default region from the environment).
+    """
+    provider_name = f"aws:{service_name}:{region_name or 'default'}"
+
+    def build_client():
+        with _session_lock:
+            client = _get_session().client(service_name, region_name=region_name, config=build_client_config(service_name))
+        return instrument_client(client)
+
+    return providers.registry.get_or_register(provider_name, build_client)
@@ -0,0 +1,233 @@
+#system imports
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from io import BytesIO
+
+#local/user imports
+import providers
+
+#Chart rendering - explicit Figure objects on the Agg canvas (no pyplot global state, safe to call from
+#worker threads) rendered straight into memory, with rendered PNGs cached on a hash of data + style
+
+CHART_DPI = int(os.getenv("WAFR_CHART_DPI", "100"))
+CHART_WIDTH_INCHES = float(os.getenv("WAFR_CHART_WIDTH_INCHES", "6.4"))
+CHART_HEIGHT_INCHES = float(os.getenv("WAFR_CHART_HEIGHT_INCHES", "4.8"))
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("WAFR_CHART_CACHE_MAX_ENTRIES", "64"))
+
+
+@dataclass(frozen=True)
+class ChartStyle:
+    """
+    Everything that changes the rendered image apart from the data (part of the cache key).
+    """
+    dpi: int = CHART_DPI
+    width_inches: float = CHART_WIDTH_INCHES
+    height_inches: float = CHART_HEIGHT_INCHES
+    title: str = 'Risk Metrics Breakdown'
+    hri_color: str = 'red'
+    mri_color: str = 'orange'
+    bar_width: float = 0.35
+
+
+def chart_cache_key(chart_name, json_data, style):
+    """
+    sha256 of (chart name, chart input data, style).
+
+    Args:
+    - chart_name: which renderer i.e. risk_bar_chart.
+    - json_data: JSON serialisable chart input.
+    - style: ChartStyle.
+    """
+    payload = json.dumps([chart_name, json_data, asdict(style)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ChartCache:
+    """
+    In-memory LRU of rendered chart images (PNG bytes), lives for the warm container.
+    """
+    def __init__(self, max_entries=CHART_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return image
+
+    def set(self, key, image):
+        with self._lock:
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+providers.register("chart_cache", ChartCache)
+
+
+def new_figure(style):
+    """
+    Figure bound to its own Agg canvas - independent of pyplot, so concurrent renders don't share state.
+    """
+    #matplotlib is heavy - imported on first chart only
+    Figure = providers.get_module('matplotlib.figure').Figure
+    FigureCanvasAgg = providers.get_module('matplotlib.backends.backend_agg').FigureCanvasAgg
+
+    fig = Figure(figsize=(style.width_inches, style.height_inches), dpi=style.dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def render_risk_bar_chart(json_data, style=None):
+    """
+    Render the HRI / MRI counts per pillar as a grouped bar chart.
+
+    Args:
+    - json_data: List of dictionaries containing risk metrics data (Name, High, Medium).
+    - style: ChartStyle (defaults from the WAFR_CHART_* env vars).
+
+    Returns:
+    - PNG image bytes.
+    """
+    style = style or ChartStyle()
+    np = providers.get_module('numpy')
+
+    # Extract pillar names
+    pillars = [entry['Name'] for entry in json_data]
+
+    # Extract counts of HRIs and MRIs
+    hris = [entry['High'] for entry in json_data]
+    mris = [entry['Medium'] for entry in json_data]
+
+    # Plot the bar chart
+    x = np.arange(len(pillars))  # the label locations
+    width = style.bar_width  # the width of the bars
+
+    fig = new_figure(style)
+    ax = fig.subplots()
+    rects1 = ax.bar(x - width/2, hris, width, label='HRIs', color=style.hri_color)
+    rects2 = ax.bar(x + width/2, mris, width, label='MRIs', color=style.mri_color)
+
+    # Add some text for labels, title and custom x-axis tick labels, etc.
+    ax.set_xlabel('Pillars')
+    ax.set_ylabel('Counts')
+    ax.set_title(style.title)
+    ax.set_xticks(x)
+    ax.set_xticklabels(pillars, rotation=45, ha='right')
+    ax.legend()
+
+    # Attach a text label above each bar in rects
+    for rects in (rects1, rects2):
+        for rect in rects:
+            height = rect.get_height()
+            ax.annotate('{}'.format(height),
+                        xy=(rect.get_x() + rect.get_width() / 2, height),
+                        xytext=(0, 3),  # 3 points vertical offset
+                        textcoords="offset points",
+                        ha='center', va='bottom')
+
+    # Adjust y-axis limit to create more vertical gap
+    max_count = max(max(hris, default=0), max(mris, default=0)) + 1
+    ax.set_ylim(0, max_count)
+
+    fig.tight_layout()
+
+    image = BytesIO()
+    fig.savefig(image, format='png')
+    return image.getvalue()
+
+
+def render_portfolio_density_chart(json_data, style=None):
+    """
+    Render the average HRIs / MRIs per workload of every pillar as a grouped horizontal bar chart.
+
+    Args:
+    - json_data: portfolio_analytics.pillar_density output (Pillar, HRI per workload, MRI per workload).
+    - style: ChartStyle (defaults from the WAFR_CHART_* env vars).
+
+    Returns:
+    - PNG image bytes.
+    """
+    style = style or ChartStyle(title='Average Risks per Workload')
+    np = providers.get_module('numpy')
+
+    pillars = [entry['Pillar'] for entry in json_data]
+    hris = [entry['HRI per workload'] for entry in json_data]
+    mris = [entry['MRI per workload'] for entry in json_data]
+
+    y = np.arange(len(pillars))
+    height = style.bar_width
+
+    fig = new_figure(style)
+    ax = fig.subplots()
+    ax.barh(y - height/2, hris, height, label='HRIs', color=style.hri_color)
+    ax.barh(y + height/2, mris, height, label='MRIs', color=style.mri_color)
+    ax.set_xlabel('Average per workload')
+    ax.set_title(style.title)
+    ax.set_yticks(y)
+    ax.set_yticklabels(pillars)
+    ax.invert_yaxis()
+    ax.legend()
+    fig.tight_layout()
+
+    image = BytesIO()
+    fig.savefig(image, format='png')
+    return image.getvalue()
+
+
+def get_chart(chart_name, render, json_data, style, cache=None):
+    """
+    Chart PNG from render(json_data, style), served from the chart cache when it was rendered before.
+    """
+    cache = cache or providers.get("chart_cache")
+
+    key = chart_cache_key(chart_name, json_data, style)
+    image = cache.get(key)
+    if image is None:
+        image = render(json_data, style)
+        cache.set(key, image)
+    return image
+
+
+def get_risk_bar_chart(json_data, style=None, cache=None):
+    """
+    Risk bar chart PNG, served from the chart cache when the same data + style was rendered before.
+
+    Args:
+    - json_data: List of dictionaries containing risk metrics data.
+    - style: ChartStyle (defaults from the WAFR_CHART_* env vars).
+    - cache: ChartCache (the shared one if None).
+
+    Returns:
+    - PNG image bytes.
+    """
+    return get_chart("risk_bar_chart", render_risk_bar_chart, json_data, style or ChartStyle(), cache)
+
+
+def get_portfolio_density_chart(json_data, style=None, cache=None):
+    """
+    Portfolio HRI / MRI per workload chart PNG (cached like get_risk_bar_chart).
+    """
+    return get_chart("portfolio_density_chart", render_portfolio_density_chart, json_data, style or ChartStyle(title='Average Risks per Workload'), cache)
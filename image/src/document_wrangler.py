@@ -1,5 +1,5 @@
 #third-party imports
-import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import NoCredentialsError
 from docx.api import Document
 from docx.shared import Pt
@@ -9,18 +9,33 @@ from docx.enum.table import WD_CELL_VERTICAL_ALIGNMENT
 from docx.enum.table import WD_ALIGN_VERTICAL
 from docx.shared import Inches
 
-import matplotlib.pyplot as plt
-import numpy as np
-
 
 #system imports
 from io import BytesIO
 import json
-from datetime import datetime
+from datetime import datetime, timezone
+import os
+import queue
+import threading
 
 #local/user imports
-from docx_helper_functions import add_empty_line, add_heading, add_page_break, add_paragraph, add_subheading
-from gpt_magic import quick_wins_section_prep
+from docx_helper_functions import add_empty_line, add_heading, add_page_break, add_paragraph, add_subheading, add_bulk_table, MERGE_WITH_ABOVE
+from gpt_magic import ReportCancelled, quick_wins_section_prep, quick_win_sort_key
+import providers
+from aws_clients import get_client
+from chart_renderer import get_portfolio_density_chart, get_risk_bar_chart
+from telemetry import span, timed
+from template_cache import build_template_cache
+
+#write a small progress marker object next to the report at every checkpoint
+PROGRESS_MARKERS = os.getenv("WAFR_PROGRESS_MARKERS", "false").lower() == "true"
+
+#overlap the LLM stage with document assembly - remediation sections are rendered as plans arrive
+STREAMING_ASSEMBLY = os.getenv("WAFR_STREAMING_ASSEMBLY", "true").lower() == "true"
+
+#reports above this size (i.e. large portfolio reports) are uploaded as multipart
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
 
 #Class Definitions
 class DateTimeEncoder(json.JSONEncoder):
@@ -31,34 +46,9 @@ class DateTimeEncoder(json.JSONEncoder):
 
 
 ###Workflow
-# Copy template to customer folder
-# then edit the customer one
+# Read the base template into memory (template cache, revalidated by ETag)
 # Pull in AWS WAFR Report - extract data
-
-# Function to create customer copy from base template
-def copy_template_to_output_bucket(input_bucket, input_key, output_bucket, customer_folder):
-    #To Do - create distinct files everytime
-
-    #initialise S3 client
-    s3 = boto3.client('s3')
-
-    copy_source = {'Bucket': input_bucket, 'Key': input_key}
-    output_key = f'{customer_folder}/CCL_WAFR_Report.docx'  # Adjust the output key as needed
-    s3.copy_object(CopySource=copy_source, Bucket=output_bucket, Key=output_key)
-
-    print(f"Template copied successfully to {output_bucket}/{output_key}")
-
-# Function to download wip doc into container runtime
-def download_docx_from_s3(bucket_name, key, local_path):
-    #initialise S3 client
-    s3 = boto3.client('s3')
-
-    # Download the document from S3
-    s3.download_file(bucket_name, key, local_path)
-
-    #stored in container filesystem - no external volumes / mnt
-    print(f"Document downloaded from S3 to {local_path}")
-
+# Build the customer report and upload it once to the customer folder
 
 #store file in s3
 def upload_to_s3(file_path, bucket_name, object_name):
@@ -71,8 +61,8 @@ def upload_to_s3(file_path, bucket_name, object_name):
     :return: True if the file was uploaded successfully, else False
     """
 
-    # Create an S3 client
-    s3_client = boto3.client('s3')
+    # Shared S3 client
+    s3_client = get_client('s3')
 
     try:
         # Upload the file to S3
@@ -87,6 +77,105 @@ def upload_to_s3(file_path, bucket_name, object_name):
     print(f"File uploaded successfully to S3 bucket '{bucket_name}' with key '{object_name}'")
     return True
 
+# Read the template into memory through the ETag-validated template cache - no copy_object / /tmp download
+def download_template_bytes(bucket_name, key):
+    """
+    Word template stored in S3, from the template cache (downloaded only when not cached or changed).
+
+    Args:
+    - bucket_name: S3 bucket holding the template.
+    - key: S3 object key of the template.
+
+    Returns:
+    - template file bytes.
+    """
+    #report templates cached in memory / on disk and revalidated by ETag - WAFR_TEMPLATE_CACHE=disk|memory|off
+    template_cache = providers.registry.get_or_register("template_cache", build_template_cache)
+    if template_cache is not None:
+        template_bytes = template_cache.get(bucket_name, key)
+        print(f"template cache stats: {template_cache.stats()}")
+        return template_bytes
+
+    s3 = get_client('s3')
+    response = s3.get_object(Bucket=bucket_name, Key=key)
+    template_bytes = response['Body'].read()
+    print(f"Template loaded from {bucket_name}/{key} ({len(template_bytes)} bytes)")
+    return template_bytes
+
+def load_template_document(bucket_name, key, template_bytes=None):
+    """
+    Open a Word template stored in S3 without touching the container filesystem.
+
+    Args:
+    - bucket_name: S3 bucket holding the template.
+    - key: S3 object key of the template.
+    - template_bytes: already downloaded template (i.e. shared across a batch), skips the download.
+
+    Returns:
+    - Document: Word document object loaded from the template bytes.
+    """
+    if template_bytes is None:
+        template_bytes = download_template_bytes(bucket_name, key)
+
+    with span("docx.load", bytes=len(template_bytes)):
+        return Document(BytesIO(template_bytes))
+
+# Serialise the Word doc into memory
+def serialise_document(doc):
+    """
+    Save the Word document into an in-memory buffer.
+
+    Args:
+    - doc: Word document object.
+
+    Returns:
+    - BytesIO: buffer holding the .docx bytes, rewound to the start.
+    """
+    with span("docx.save") as save_span:
+        doc_stream = BytesIO()
+        doc.save(doc_stream)
+        doc_stream.seek(0)
+        save_span.set(bytes=doc_stream.getbuffer().nbytes)
+    return doc_stream
+
+# Upload an in-memory doc to S3 (multipart above MULTIPART_THRESHOLD)
+def upload_document_to_s3(doc_stream, bucket_name, key):
+    """
+    Upload a serialised Word document to S3 in one go.
+
+    Args:
+    - doc_stream: BytesIO holding the .docx bytes.
+    - bucket_name: S3 bucket name.
+    - key: S3 object key.
+
+    Returns:
+    - number of bytes uploaded.
+    """
+    s3 = get_client('s3')
+
+    transfer_config = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_CHUNKSIZE)
+    size = doc_stream.getbuffer().nbytes
+    s3.upload_fileobj(doc_stream, bucket_name, key, Config=transfer_config)
+
+    print(f"Document uploaded to S3 bucket '{bucket_name}' with key '{key}' ({size} bytes)")
+    return size
+
+# Cheap progress marker instead of re-uploading the full WIP doc
+def put_progress_marker(bucket_name, key, stage):
+    """
+    Write a small JSON progress marker next to the report i.e. <key>.progress.json.
+
+    Args:
+    - bucket_name: S3 bucket name.
+    - key: S3 object key of the report.
+    - stage: name of the last completed stage.
+    """
+    s3 = get_client('s3')
+
+    marker = {"report_key": key, "stage": stage, "updated_at": datetime.now(timezone.utc).isoformat()}
+    s3.put_object(Bucket=bucket_name, Key=f"{key}.progress.json", Body=json.dumps(marker).encode('utf-8'), ContentType='application/json')
+    print(f"Progress marker updated: {stage}")
+
 # Function to create a Word document with a heading and a table
 def modify_word_document(local_path):
         
@@ -101,18 +190,13 @@ def modify_word_document(local_path):
     print(f"Document modified at {local_path}")
 
 #JSON to Word Table  
-def json_to_table(json_data, doc, doc_path):
+def json_to_table(json_data, doc):
     """
     Convert JSON data to a table in a Word document with vertical cell merging and separated best practice choices.
 
     :param json_data: JSON data to convert to a table.
     :param doc: Word document object to write the table to.
-    :param doc_path: Path to save the Word document.
     """
-    # Initialize the table
-    table = doc.add_table(rows=1, cols=3)
-    table.style = 'Table Grid'
-
     #pillar mapping
     pillar_mapping = {
         "operationalExcellence": "Operational Excellence",
@@ -123,190 +207,97 @@ def json_to_table(json_data, doc, doc_path):
         "sustainability": "Sustainability"
     }
 
-    # Add column headers and make them bold
-    header_cells = table.rows[0].cells
-    for idx, header_text in enumerate(['Pillar Name', 'Question Title', 'Best Practice Choice']):
-        cell = header_cells[idx]
-        cell.text = header_text
-        # Apply bold formatting to the text
-        for paragraph in cell.paragraphs:
-            for run in paragraph.runs:
-                run.font.bold = True
-
-    merge_ranges = {}
-
+    # One row per unselected choice, pillar and question cells merged vertically per question
+    rows = []
     for pillar, questions in json_data.items():
-        for question, details in questions.items():
-            # Find the start and end row index for the current cell
-            start_row_index = len(table.rows)
-            for choice in details.get("UnselectedChoices", []):
-                if choice != "None of these":
-                    cells = table.add_row().cells
-                    cells[0].text = pillar
-                    cells[1].text = question
-                    cells[2].text = choice.strip()
-            
-            end_row_index = len(table.rows)
-            
-            # Update merge ranges dictionary
-            key = (pillar, question)
-            if key in merge_ranges:
-                merge_ranges[key] = (min(merge_ranges[key][0], start_row_index), max(merge_ranges[key][1], end_row_index))
-            else:
-                merge_ranges[key] = (start_row_index, end_row_index)
-
-    # Merge cells vertically for each unique value
-    for key, (start_row, end_row) in merge_ranges.items():
-    # Replace the incorrect pillar name with the correct one
-        pillar = key[0]
+        # Replace the incorrect pillar name with the correct one
         correct_pillar = pillar_mapping.get(pillar, pillar)
-        question = key[1]
-        for col in range(2):  # Merge only first two columns
-            start_cell = table.cell(start_row, col)
-            end_cell = table.cell(end_row - 1, col)  # Subtract 1 to get the last cell
-            start_text = start_cell.text
-            # Replace the pillar name with the correct one
-            start_text = start_text.replace(pillar, correct_pillar)
-            start_cell.merge(end_cell)
-            merged_cell = table.cell(start_row, col)  # Use start row for the merged cell
-            merged_cell.text = start_text  # Set the text of the merged cell to the start cell's text
-
-    # Set vertical alignment for all cells
-    for row in table.rows:
-        for cell in row.cells:
-            cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+        for question, details in questions.items():
+            choices = [choice.strip() for choice in details.get("UnselectedChoices", []) if choice != "None of these"]
+            for idx, choice in enumerate(choices):
+                if idx == 0:
+                    rows.append([correct_pillar, question.replace(pillar, correct_pillar), choice])
+                else:
+                    rows.append([MERGE_WITH_ABOVE, MERGE_WITH_ABOVE, choice])
 
-    # Save the document
-    doc.save(doc_path)
+    # Build the table (bold headers, vertical merges, vertical alignment) in one pass
+    add_bulk_table(doc, ['Pillar Name', 'Question Title', 'Best Practice Choice'], rows)
 
 # Create Risk Metrics breakdown / counts
-def create_risk_metrics_table(json_data, doc_path, doc):
+def create_risk_metrics_table(json_data, doc):
     """
     Creates a Word table for risk metrics breakdown.
     
     Args:
-    - data: List of dictionaries containing risk metrics data.
-    
-    Returns:
-    - Document: Word document object containing the generated table.
+    - json_data: List of dictionaries containing risk metrics data.
+    - doc: Word document object the table is added to (not saved).
     """
     
-    # Add a table with headers
-    table = doc.add_table(rows=1, cols=len(json_data[0]) -1) #ignoring the None column
-    table.style = 'Table Grid'
-
-     # Add column headers and make them bold
+    # Column headers, ignoring the None column
     headers = list(json_data[0].keys())
     headers.remove('None')  # Remove 'None' column
-    row = table.rows[0]
-    for idx, header in enumerate(headers):
-        cell = row.cells[idx]
-        if header == 'NotApplicable':
-            cell.text = 'Not Applicable'
-        else:
-            cell.text = header
-        # Apply bold formatting to the text
-        for paragraph in cell.paragraphs:
-            for run in paragraph.runs:
-                run.font.bold = True
-
-    # Add data to the table
-    for entry in json_data:
-        row = table.add_row().cells
-        for idx, header in enumerate(headers):
-            row[idx].text = str(entry[header])
-    
-    # Set alignment for all cells
-    for row in table.rows:
-        for cell in row.cells:
-            # Set horizontal alignment to center
-            cell.paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-            # Set vertical alignment to middle
-            cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-
-    # Set the alignment for the first column to left-aligned
-    for cell in table.columns[0].cells:
-        for paragraph in cell.paragraphs:
-            paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
+    header_texts = ['Not Applicable' if header == 'NotApplicable' else header for header in headers]
 
-    # Save the document
-    doc.save(doc_path)
+    # Data rows
+    rows = [[str(entry[header]) for header in headers] for entry in json_data]
+
+    # First column left-aligned, counts centered, all cells vertically centered
+    column_alignments = [WD_PARAGRAPH_ALIGNMENT.LEFT] + [WD_PARAGRAPH_ALIGNMENT.CENTER] * (len(headers) - 1)
+    add_bulk_table(doc, header_texts, rows, column_alignments=column_alignments)
 
-def create_bar_chart(json_data, doc_path, doc):
+def create_bar_chart(json_data, doc, style=None):
     """
     Creates a bar chart of the risk metrics breakdown and inserts it into the Word document.
-    
+
+    The chart is rendered in memory (and cached on data + style) by chart_renderer, nothing touches disk.
+
     Args:
     - json_data: List of dictionaries containing risk metrics data.
-    - doc_path: Path to save the Word document.
-    - doc: Word document object.
+    - doc: Word document object (not saved).
+    - style: optional chart_renderer.ChartStyle (DPI, size, colours).
     """
-    # Extract pillar names
-    pillars = [entry['Name'] for entry in json_data]
-    
-    # Extract counts of HRIs and MRIs
-    hris = [entry['High'] for entry in json_data]
-    mris = [entry['Medium'] for entry in json_data]
-    
-    # Plot the bar chart
-    x = np.arange(len(pillars))  # the label locations
-    width = 0.35  # the width of the bars
-
-    fig, ax = plt.subplots()
-    rects1 = ax.bar(x - width/2, hris, width, label='HRIs', color='red')
-    rects2 = ax.bar(x + width/2, mris, width, label='MRIs', color='orange')
-
-    # Add some text for labels, title and custom x-axis tick labels, etc.
-    ax.set_xlabel('Pillars')
-    ax.set_ylabel('Counts')
-    ax.set_title('Risk Metrics Breakdown')
-    ax.set_xticks(x)
-    ax.set_xticklabels(pillars, rotation=45, ha='right')
-    ax.legend()
-
-    # Attach a text label above each bar in rects
-    def autolabel(rects):
-        for rect in rects:
-            height = rect.get_height()
-            ax.annotate('{}'.format(height),
-                        xy=(rect.get_x() + rect.get_width() / 2, height),
-                        xytext=(0, 3),  # 3 points vertical offset
-                        textcoords="offset points",
-                        ha='center', va='bottom')
-
-    autolabel(rects1)
-    autolabel(rects2)
-
-    # Adjust y-axis limit to create more vertical gap
-    max_count = max(max(hris), max(mris)) + 1
-    ax.set_ylim(0, max_count)
-
-    fig.tight_layout()
-
-    # Save the plot as an image
-    plot_path = '/tmp/bar_chart.png'
-    plt.savefig(plot_path)
-
-    # Close the plot to release resources
-    plt.close(fig)
-
-    # Insert the saved image into the Word document
-    doc.add_picture(plot_path, width=Inches(6))
+    image = get_risk_bar_chart(json_data, style)
 
-    # Save the document
-    doc.save(doc_path)
+    # Insert the rendered image into the Word document
+    doc.add_picture(BytesIO(image), width=Inches(6))
+
+# Portfolio tables / charts (portfolio_analytics output)
+def create_records_table(json_data, doc):
+    """
+    Creates a Word table from a list of flat dicts - one column per key, first column left-aligned.
+
+    Args:
+    - json_data: list of dicts with the same keys i.e. portfolio_analytics.pillar_density output.
+    - doc: Word document object the table is added to (not saved).
+    """
+    if not json_data:
+        return
+    headers = list(json_data[0].keys())
+    rows = [[str(entry[header]) for header in headers] for entry in json_data]
+    column_alignments = [WD_PARAGRAPH_ALIGNMENT.LEFT] + [WD_PARAGRAPH_ALIGNMENT.CENTER] * (len(headers) - 1)
+    add_bulk_table(doc, headers, rows, column_alignments=column_alignments)
 
-def create_qw_remediation_item(json_data, doc_path, doc):
+def create_portfolio_density_chart(json_data, doc, style=None):
+    """
+    Inserts the average HRIs / MRIs per workload chart of a portfolio (rendered in memory, cached).
+    """
+    image = get_portfolio_density_chart(json_data, style)
+    doc.add_picture(BytesIO(image), width=Inches(6))
+
+def create_qw_remediation_item(json_data, doc, flag=None):
     """
     Create a Word document section from a singular remediation plan part.
 
     Args:
     - json_data: JSON object containing the data to be written to the document.
-    - output_path: Path to save the Word document.
+    - doc: Word document object the section is added to (not saved).
+    - flag: optional note appended to the heading i.e. "changed since milestone 3".
     """
 
     #add subheading i.e. 1. Implement application telemetry
     text = f"{json_data['best_practice_option']}"
+    if flag:
+        text = f"{text} ({flag})"
     add_subheading(doc, text, style_name='Heading 4')
     
     #add sub-subheading 3 i.e. Description
@@ -368,146 +359,379 @@ def create_qw_remediation_item(json_data, doc_path, doc):
 
     # Add spacing between sections
     doc.add_paragraph()
-    # Save the document
-    doc.save(doc_path)
 
 
-def create_top_10_qw_table(json_data, doc, doc_path):
-    # Add a table with headers
-    table = doc.add_table(rows=1, cols=3)
-    table.style = 'Table Grid'
-
-    # Add column headers
-    headers = ["#", "Question", "Best Practice"]
-    row = table.rows[0]
-    for idx, header in enumerate(headers):
-        cell = row.cells[idx]
-        cell.text = header
-        # Apply bold formatting to the text
-        for paragraph in cell.paragraphs:
-            for run in paragraph.runs:
-                run.font.bold = True
-
-    # Add data to the table
-    for entry in json_data:
-        row = table.add_row().cells
-        row[0].text = str(entry["quick_win_id"])
-        row[1].text = entry["best_practice_question"]
-        row[2].text = entry["unselected_best_practice_item"]
+def create_top_10_qw_table(json_data, doc, changed_ids=None):
+    # Data rows - quick wins in changed_ids are marked with an asterisk
+    changed_ids = set(changed_ids or [])
+    rows = [
+        [str(entry["quick_win_id"]) + (" *" if str(entry["quick_win_id"]) in changed_ids else ""), entry["best_practice_question"], entry["unselected_best_practice_item"]]
+        for entry in json_data
+    ]
+
+    # Add the table with bold headers, left / middle aligned cells and the width of the first column fitted to 2 digits
+    add_bulk_table(
+        doc,
+        ["#", "Question", "Best Practice"],
+        rows,
+        column_alignments=[WD_PARAGRAPH_ALIGNMENT.LEFT] * 3,
+        column_widths=[Inches(0.5), Inches(3.0), Inches(3.5)],
+        autofit=True,
+    )
     
-    # Set alignment for all cells
-    for row in table.rows:
-        for cell in row.cells:
-            cell.paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.LEFT  # Horizontal alignment
-            cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER  # Vertical alignment
-
-    # Adjust width of the first column
-    table.autofit = True
-    table.columns[0].width = Inches(0.5)  # Set width to fit 2digits
-    table.columns[1].width = Inches(3.0)  
-    table.columns[2].width = Inches(3.5)  
 
-    # Save the document
-    doc.save(doc_path)
-    
-
-def initialise_docs(inputBucket, inputKey, outputBucket,customerFoler):
-    #initialise clients
-    s3 = boto3.client('s3')
+# Commit point - builders only mutate the Document, this is the only place it gets serialised
+def commit_document(doc, bucket_name, key):
+    """
+    Serialise the Word document in memory and upload it to S3.
 
-     #config vars
-    input_bucket = inputBucket
-    input_key = inputKey
-    output_bucket = outputBucket  # Replace with your output bucket name
-    customer_folder = customerFoler  # Specify customer-specific folder name
-    
-    # Copy the template to the output bucket under the customer-specific folder
-    copy_template_to_output_bucket(input_bucket, input_key, output_bucket, customer_folder)
-    
-    # Specify S3 bucket details and local file path
-    bucket_name = f'{output_bucket}'  # Replace with your S3 bucket name
-    key = f'{customer_folder}/CCL_WAFR_Report.docx'      # Replace with the key of the document in your S3 bucket
-    local_path = '/tmp/wip_document.docx' # Specify the local file path where the document will be saved
+    Args:
+    - doc: Word document object.
+    - bucket_name: S3 bucket name.
+    - key: S3 object key.
 
-    # Download the customer document copy from S3
-    download_docx_from_s3(bucket_name, key, local_path)
+    Returns:
+    - number of bytes uploaded.
+    """
+    return upload_document_to_s3(serialise_document(doc), bucket_name, key)
 
-    # Open Doc for WIP
-    doc_path = f'{local_path}'
-    doc = Document(doc_path)
-    
+# Report sections - each one only mutates the Document
+def add_risk_breakdown_section(doc, context):
     #insert Risk Metrics Breakdown
     add_heading(doc,'Risk Breakdown by Pillar', style_name='Heading 1') #insert Risk Metrics Header
     add_empty_line(doc) #insert empty line
-    json_file_path = '/tmp/risk_metrics.json'
-    
-    with open(json_file_path, 'rb') as json_file:
-        json_data = json.load(json_file)
-    
-    create_risk_metrics_table(json_data, doc_path, doc)
+    json_data = context.risk_metrics
+    create_risk_metrics_table(json_data, doc)
     add_empty_line(doc) #insert empty line
 
     #insert bar chart
-    create_bar_chart(json_data, doc_path, doc)
-
-    #store WIP doc in S3 - progress
-    upload_to_s3(local_path, bucket_name, key)
+    create_bar_chart(json_data, doc)
 
+def add_risk_items_sections(doc, context):
     # insert HRI table
     add_page_break(doc)
     add_heading(doc,'High Risk Items', style_name='Heading 1') #insert HRI Header
     add_empty_line(doc) #insert empty line
-    json_file_path = '/tmp/filter_high_risk_questions.json'
-    
-    with open(json_file_path, 'rb') as json_file:
-        json_data = json.load(json_file)
-
-    json_to_table(json_data, doc, doc_path)
+    json_to_table(context.resolve_questions(context.high_risk_questions), doc)
     add_empty_line(doc) #insert empty line
 
     #insert MRI Table in Doc
     add_page_break(doc)
     add_heading(doc,'Medium Risk Items', style_name='Heading 1') #insert MRI Header
     add_empty_line(doc) #insert empty line
-    json_file_path = '/tmp/filter_medium_risk_questions.json'
-    
-    with open(json_file_path, 'rb') as json_file:
-        json_data = json.load(json_file)
-    
-    json_to_table(json_data, doc, doc_path)
+    json_to_table(context.resolve_questions(context.medium_risk_questions), doc)
+    add_empty_line(doc) #insert empty line
+
+def add_milestone_changes_section(doc, context):
+    # Insert what changed since the previous milestone (incremental runs only)
+    if context.previous_milestone_number is None:
+        return
+    add_heading(doc, f'Changes since milestone {context.previous_milestone_number}', style_name='Heading 4')
+    if not context.changed_questions:
+        add_paragraph(doc, "No answers changed since the previous milestone.", style_name=None, alignment=None, bold=False, italic=False, underline=False)
+    for question_id in context.changed_questions:
+        text = context.lens.question_label(question_id) if question_id in context.lens.questions else question_id
+        add_paragraph(doc, f"- {text}", style_name=None, alignment=None, bold=False, italic=False, underline=False)
+    if context.changed_quick_win_ids:
+        add_paragraph(doc, "Quick wins marked * are new or have an updated remediation plan.", style_name=None, alignment=None, bold=False, italic=True, underline=False)
+    add_empty_line(doc) #insert empty line
+
+def add_quick_wins_table_section(doc, context):
+    add_milestone_changes_section(doc, context)
+    # Insert QW Table
+    create_top_10_qw_table(context.top_10_quick_wins, doc, context.changed_quick_win_ids)
+    add_empty_line(doc) #insert empty line
+
+def remediation_item_flag(context, remediation_item):
+    """
+    Heading note for a remediation plan regenerated in an incremental run (None otherwise).
+    """
+    if context.previous_milestone_number is None or str(remediation_item.get("quick_win_id")) not in context.changed_quick_win_ids:
+        return None
+    return f"changed since milestone {context.previous_milestone_number}"
+
+def add_remediation_sections(doc, context):
+    # Insert QW Remediation sections
+    for remediation_item in context.remediation_items:
+        add_remediation_item_section(doc, remediation_item, remediation_item_flag(context, remediation_item))
+
+
+class RemediationStream:
+    """
+    Hand-off between the LLM producer thread and document assembly.
+
+    The producer runs quick_wins_section_prep with ranked / plan_ready as callbacks. The consumer
+    renders each plan as soon as it can, in quick_win_id order - plans that arrive early are held
+    in a reorder buffer until the ones before them are rendered. If assembly fails, cancel() stops the
+    producer before its next model call.
+    """
+    def __init__(self):
+        self._events = queue.Queue()
+        self._thread = None
+        self._cancel_event = threading.Event()
+
+    # Producer side
+    def ranked(self, quick_wins):
+        self._events.put(("ranked", quick_wins))
+
+    def plan_ready(self, quick_win, remediation_plan):
+        self._events.put(("plan", quick_win, remediation_plan))
+
+    def start(self, context):
+        """
+        Run quick_wins_section_prep for the context in a background thread.
+        """
+        def produce():
+            try:
+                quick_wins_section_prep(context, on_ranked=self.ranked, on_plan=self.plan_ready, cancel_event=self._cancel_event)
+            except ReportCancelled:
+                print("quick wins producer cancelled")
+                self._events.put(("done",))
+            except Exception as e:
+                self._events.put(("error", e))
+            else:
+                self._events.put(("done",))
+
+        self._thread = threading.Thread(target=produce, name="wafr-quick-wins-producer", daemon=True)
+        self._thread.start()
+
+    # Consumer side
+    def _next_event(self):
+        event = self._events.get()
+        if event[0] == "error":
+            raise event[1]
+        return event
+
+    def wait_for_ranking(self):
+        """
+        Block until the top 10 quick wins are ranked (context.top_10_quick_wins is set by then).
+
+        Returns:
+        - the top 10 quick wins (None if the producer finished without ranking).
+        """
+        while True:
+            event = self._next_event()
+            if event[0] == "ranked":
+                return event[1]
+            if event[0] == "done":
+                return None
+
+    def render_plans(self, quick_wins, render):
+        """
+        Call render(remediation_plan) for every plan in quick_win_id order as they arrive.
+
+        Args:
+        - quick_wins: the ranked quick wins the plans are generated for.
+        - render: callable adding one remediation plan to the document.
+
+        Returns:
+        - number of plans rendered.
+        """
+        #plans are matched back to their quick win by identity, quick_win_ids from the model aren't guaranteed unique
+        order = sorted(range(len(quick_wins)), key=lambda idx: quick_win_sort_key(quick_wins[idx]))
+        position = {id(quick_wins[idx]): rank for rank, idx in enumerate(order)}
+        reorder_buffer = {}
+        next_rank = 0
+        rendered = 0
+
+        while next_rank < len(order):
+            event = self._next_event()
+            if event[0] == "done":
+                break
+            if event[0] != "plan" or id(event[1]) not in position:
+                continue
+
+            reorder_buffer[position[id(event[1])]] = event[2]
+            while next_rank in reorder_buffer:
+                remediation_plan = reorder_buffer.pop(next_rank)
+                next_rank += 1
+                if remediation_plan is not None:
+                    render(remediation_plan)
+                    rendered += 1
+        return rendered
+
+    def cancel(self):
+        """
+        Stop the producer (no new model calls, calls in flight finish) and wait for it to exit.
+        """
+        self._cancel_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def join(self):
+        """
+        Wait for the producer to finish (re-raises its error, if any).
+        """
+        if self._thread is not None:
+            self._thread.join()
+        while not self._events.empty():
+            self._next_event()
+
+
+def add_remediation_item_section(doc, remediation_item, flag=None):
+    create_qw_remediation_item(remediation_item, doc, flag)
+    add_empty_line(doc)
+
+
+def add_portfolio_sections(doc, summary):
+    # Portfolio overview
+    add_heading(doc, 'Portfolio Risk Overview', style_name='Heading 1')
+    add_paragraph(doc, f"{summary['workloads']} workloads reviewed against lens {summary['lens_alias']} ({summary['lens_version']}).", style_name=None, alignment=None, bold=False, italic=False, underline=False)
+    if summary['excluded_reviews']:
+        #reviews on another lens version have other questions - listed, not counted
+        versions = ", ".join(f"{version}: {reviews}" for version, reviews in summary['lens_versions'].items())
+        add_paragraph(doc, f"{len(summary['excluded_reviews'])} reviews on another lens version are excluded from the rollups (reviews per lens version - {versions}).", style_name=None, alignment=None, bold=False, italic=False, underline=False)
+    add_empty_line(doc) #insert empty line
+
+    add_heading(doc, 'Risk Density by Pillar', style_name='Heading 2')
+    create_records_table(summary['pillar_density'], doc)
     add_empty_line(doc) #insert empty line
+    create_portfolio_density_chart(summary['pillar_density'], doc)
 
-    #store WIP doc in S3 - progress
-    upload_to_s3(local_path, bucket_name, key)
+    add_page_break(doc)
+    add_heading(doc, 'HRIs per Workload - Percentiles', style_name='Heading 2')
+    create_records_table(summary['hri_percentiles'], doc)
+    add_empty_line(doc) #insert empty line
+    add_heading(doc, 'MRIs per Workload - Percentiles', style_name='Heading 2')
+    create_records_table(summary['mri_percentiles'], doc)
+    add_empty_line(doc) #insert empty line
 
-    # Start Remediation Plan
     add_page_break(doc)
-    add_heading(doc,'Remediation Plan', style_name='Heading 2')
-    #Insert Quick Wins Section
-    add_heading(doc,'Quick Wins', style_name='Heading 3')
-    remediation_pts = quick_wins_section_prep()
+    add_heading(doc, 'Most Common Unselected Best Practices', style_name='Heading 2')
+    create_records_table(summary['top_unselected_practices'], doc)
+    add_empty_line(doc) #insert empty line
 
-    # Insert QW Table
-    json_file_path = '/tmp/top_10_quick_wins.json'
+    if len(summary['milestone_trend']) > 1:
+        add_page_break(doc)
+        add_heading(doc, 'Risk Trend across Milestones', style_name='Heading 2')
+        create_records_table(summary['milestone_trend'], doc)
+        add_empty_line(doc) #insert empty line
+
+    if summary['excluded_reviews']:
+        add_page_break(doc)
+        add_heading(doc, 'Reviews on Other Lens Versions', style_name='Heading 2')
+        create_records_table(summary['excluded_reviews'], doc)
+        add_empty_line(doc) #insert empty line
+
+
+@timed("initialise_portfolio_doc")
+def initialise_portfolio_doc(summary, inputBucket, inputKey, outputBucket, customerFoler, on_stage=None, template_bytes=None):
+    """
+    Build the portfolio report (rollups across workloads) from the template.
+
+    Args:
+    - summary: portfolio_analytics.portfolio_summary output.
+    - inputBucket / inputKey: S3 location of the Word template.
+    - outputBucket: S3 bucket for the generated report.
+    - customerFoler: customer-specific folder in the output bucket.
+    - on_stage: optional callback, called with the stage name as each stage starts.
+    - template_bytes: already downloaded template bytes (None = download inputKey from inputBucket).
+
+    Returns:
+    - S3 key of the generated report.
+    """
+    key = f'{customerFoler}/CCL_WAFR_Portfolio_Report.docx'
+    if on_stage:
+        on_stage('load_template')
+    doc = load_template_document(inputBucket, inputKey, template_bytes)
+
+    if on_stage:
+        on_stage('portfolio_sections')
+    add_portfolio_sections(doc, summary)
+
+    if on_stage:
+        on_stage('upload')
+    commit_document(doc, outputBucket, key)
+    return key
+
+
+@timed("initialise_docs")
+def initialise_docs(context, inputBucket, inputKey, outputBucket,customerFoler, progress_markers=PROGRESS_MARKERS, on_stage=None, streaming=STREAMING_ASSEMBLY, template_bytes=None):
+    """
+    Build the customer report from the template and the ReportContext.
+
+    Args:
+    - context: ReportContext populated by fetch_wafr_questions.
+    - inputBucket / inputKey: S3 location of the Word template.
+    - outputBucket: S3 bucket for the generated report.
+    - customerFoler: customer-specific folder in the output bucket.
+    - progress_markers: write a small <key>.progress.json marker at each checkpoint.
+    - on_stage: optional callback, called with the stage name as each stage starts.
+    - streaming: run the LLM stage in the background while the risk sections are built, and render each
+      remediation plan as soon as it arrives (False = LLM stage first, then rendering).
+    - template_bytes: already downloaded template bytes (None = download inputKey from inputBucket).
+
+    Returns:
+    - S3 key of the generated report.
+    """
+     #config vars
+    input_bucket = inputBucket
+    input_key = inputKey
+    output_bucket = outputBucket  # Replace with your output bucket name
+    customer_folder = customerFoler  # Specify customer-specific folder name
     
-    with open(json_file_path, 'rb') as json_file:
-        json_data = json.load(json_file)
-    create_top_10_qw_table(json_data, doc, doc_path)
-    add_empty_line(doc) #insert empty line
+    # Specify S3 bucket details for the customer report
+    bucket_name = f'{output_bucket}'  # Replace with your S3 bucket name
+    key = f'{customer_folder}/CCL_WAFR_Report.docx'      # Replace with the key of the document in your S3 bucket
 
-    #store WIP doc in S3 - progress
-    upload_to_s3(local_path, bucket_name, key)
+    def start_stage(stage):
+        if on_stage:
+            on_stage(stage)
+
+    # Start the LLM stage straight away so it overlaps with the template download and the risk sections
+    stream = None
+    if streaming:
+        stream = RemediationStream()
+        stream.start(context)
+
+    try:
+        # Open the template in memory for WIP
+        start_stage('load_template')
+        doc = load_template_document(input_bucket, input_key, template_bytes)
     
-    # Insert QW Remediation sections
-    for file in remediation_pts:
-        print(f"current file path is: {file}")
-        with open(file, 'rb') as json_file:
-            json_data = json.load(json_file)
-        create_qw_remediation_item(json_data, doc_path, doc)  
-        add_empty_line(doc)
+        start_stage('risk_sections')
+        add_risk_breakdown_section(doc, context)
+        if progress_markers:
+            put_progress_marker(bucket_name, key, 'risk_breakdown')
+
+        add_risk_items_sections(doc, context)
+        if progress_markers:
+            put_progress_marker(bucket_name, key, 'risk_items')
+
+        # Start Remediation Plan
+        add_page_break(doc)
+        add_heading(doc,'Remediation Plan', style_name='Heading 2')
+        #Insert Quick Wins Section
+        add_heading(doc,'Quick Wins', style_name='Heading 3')
+        start_stage('quick_wins_llm')
+        if stream is None:
+            quick_wins_section_prep(context)
+        else:
+            stream.wait_for_ranking()
 
-    #store WIP doc in S3 - progress
-    upload_to_s3(local_path, bucket_name, key)
+        start_stage('quick_wins_sections')
+        add_quick_wins_table_section(doc, context)
+        if progress_markers:
+            put_progress_marker(bucket_name, key, 'quick_wins')
+    
+        if stream is None:
+            add_remediation_sections(doc, context)
+        else:
+            stream.render_plans(context.top_10_quick_wins, lambda remediation_item: add_remediation_item_section(doc, remediation_item, remediation_item_flag(context, remediation_item)))
+            stream.join()
+    except BaseException:
+        #assembly failed - don't leave the producer making model calls for a report that is gone
+        if stream is not None:
+            stream.cancel()
+        raise
+
+    #store final doc in S3 - single upload
+    start_stage('upload')
+    commit_document(doc, bucket_name, key)
+    if progress_markers:
+        put_progress_marker(bucket_name, key, 'complete')
+
+    return key
 
 
     # Modify the Word document
@@ -531,19 +755,13 @@ def test():
     customer_folder = 'KMD'  # Specify customer-specific folder name
     
     #initialise clients
-    s3 = boto3.client('s3')
-    
-    # Copy the template to the output bucket under the customer-specific folder
-    #copy_template_to_output_bucket(input_bucket, input_key, output_bucket, customer_folder)
+    s3 = get_client('s3')
     
     # Specify S3 bucket details and local file path
     bucket_name = f'{output_bucket}'  # Replace with your S3 bucket name
     key = f'{customer_folder}/CCL_WAFR_Report.docx'      # Replace with the key of the document in your S3 bucket
     local_path = '/tmp/wip_document.docx' # Specify the local file path where the document will be saved
 
-    # Download the customer document copy from S3
-    #download_docx_from_s3(bucket_name, key, local_path)
-
     # Open Doc for WIP
     doc_path = f'{local_path}'
     doc = Document(doc_path)
@@ -555,7 +773,7 @@ def test():
     
     with open(json_file_path) as json_file:
         json_data = json.load(json_file)
-    create_top_10_qw_table(json_data, doc, doc_path)
+    create_top_10_qw_table(json_data, doc)
 
     # Save the document
     doc.save(doc_path)
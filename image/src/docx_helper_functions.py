@@ -1,16 +1,13 @@
 #third-party imports
-import boto3
-from botocore.exceptions import NoCredentialsError
 from docx.api import Document
 from docx.shared import Pt
 from docx.shared import RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.enum.table import WD_CELL_VERTICAL_ALIGNMENT
 from docx.enum.table import WD_ALIGN_VERTICAL
-import matplotlib.pyplot as plt
+from docx.oxml.simpletypes import ST_Merge
 
 #system imports
-from io import BytesIO
 import json
 from datetime import datetime
 
@@ -96,6 +93,74 @@ def add_paragraph(doc, text, style_name=None, alignment=None, bold=False, italic
 
 
 
+#marker for a cell that continues the vertical merge of the cell above it (vMerge continue)
+MERGE_WITH_ABOVE = object()
+
+def add_bulk_table(doc, headers, rows, style='Table Grid', bold_headers=True, column_alignments=None,
+                   vertical_alignment=WD_ALIGN_VERTICAL.CENTER, column_widths=None, autofit=None):
+    """
+    Adds a table to the document in a single pass over the rows.
+
+    Rows, vertical merges, bold headers and alignment are written straight into the table XML as each
+    row is emitted, instead of add_row() / table.cell() / merge() calls that each walk the whole table.
+
+    Args:
+    - doc: Document object to which the table will be added.
+    - headers: List of header texts (first row).
+    - rows: List of rows, each a list of cell texts. A MERGE_WITH_ABOVE cell is vertically merged with the cell above it.
+    - style: Table style name (default: 'Table Grid').
+    - bold_headers: Whether the header text should be bold (default: True).
+    - column_alignments: Optional list of paragraph alignments per column, applied to header and body cells.
+    - vertical_alignment: Vertical alignment for every cell (default: center, None to skip).
+    - column_widths: Optional list of column widths (i.e. Inches(0.5)).
+    - autofit: Optional table autofit setting.
+
+    Returns:
+    - Table: the table that was added.
+    """
+    table = doc.add_table(rows=0, cols=len(headers))
+    table.style = style
+    tbl = table._tbl
+    grid_cols = tbl.tblGrid.gridCol_lst
+    all_rows = [list(headers)] + list(rows)
+
+    for row_idx, row in enumerate(all_rows):
+        next_row = all_rows[row_idx + 1] if row_idx + 1 < len(all_rows) else None
+        tr = tbl.add_tr()
+        for col_idx, grid_col in enumerate(grid_cols):
+            tc = tr.add_tc()
+            tc.width = grid_col.w
+            text = row[col_idx]
+
+            if text is MERGE_WITH_ABOVE:
+                #continuation cell keeps its single empty paragraph
+                tc.vMerge = ST_Merge.CONTINUE
+                p = tc.p_lst[0]
+            else:
+                if next_row is not None and next_row[col_idx] is MERGE_WITH_ABOVE:
+                    tc.vMerge = ST_Merge.RESTART
+                tc.clear_content()
+                p = tc.add_p()
+                r = p.add_r()
+                r.text = text
+                if bold_headers and row_idx == 0:
+                    r.get_or_add_rPr()._set_bool_val("b", True)
+
+            if column_alignments and column_alignments[col_idx] is not None:
+                p.get_or_add_pPr().jc_val = column_alignments[col_idx]
+            if vertical_alignment is not None and text is not MERGE_WITH_ABOVE:
+                #a merged cell takes its vertical alignment from the top cell
+                tc.get_or_add_tcPr().vAlign_val = vertical_alignment
+
+    if autofit is not None:
+        table.autofit = autofit
+    if column_widths:
+        for grid_col, width in zip(grid_cols, column_widths):
+            grid_col.w = width
+
+    return table
+
+
 # Example usage:
 
 # # Create a new document
@@ -1,48 +1,91 @@
-import boto3
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.pydantic_v1 import BaseModel, Field, validator
 from langchain.prompts import PromptTemplate
-from langchain.chains import SimpleSequentialChain
-from langchain.chains import LLMChain
-from langchain.chat_models.openai import ChatOpenAI
-from langchain.llms.bedrock import Bedrock
 #from langchain_community.chat_models import BedrockChat
-from langchain.llms.openai import OpenAI
 from langchain_core.output_parsers import JsonOutputParser
-from langsmith import Client
 
 from dotenv import load_dotenv, dotenv_values
 
+import incremental
+import providers
+from aws_clients import get_client
+from llm_cache import build_llm_cache, cached_llm
+from rate_limiter import build_rate_limiter, estimate_tokens
+from telemetry import timed
+
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..','..', '.env')
 load_dotenv(dotenv_path)
 
-#initialise LangSmith
-langsmith_client = Client()
-
-#OpenAI
-llm_open_ai = OpenAI(temperature=0.0) #OpenAI(max_tokens=3500, model='gpt-3.5-turbo', temperature=0.0)
-
 #Bedrock
 BEDROCK_CLAUDE_MODEL = "anthropic.claude-v2:1"
+BEDROCK_REGION = os.getenv("WAFR_BEDROCK_REGION", "us-east-1")
+
+#Clients and LLMs are registered lazily - nothing is built until a chain first needs it
+def build_langsmith_client():
+    #initialise LangSmith
+    from langsmith import Client
+    return Client()
+
+def build_llm_open_ai():
+    #OpenAI
+    from langchain.llms.openai import OpenAI
+    return OpenAI(temperature=0.0) #OpenAI(max_tokens=3500, model='gpt-3.5-turbo', temperature=0.0)
+
+def build_llm_bedrock():
+    from langchain.llms.bedrock import Bedrock
+    return Bedrock(
+        client=get_client("bedrock-runtime", BEDROCK_REGION),
+        model_id=BEDROCK_CLAUDE_MODEL,
+        model_kwargs={"max_tokens_to_sample": 5120},
+        region_name=BEDROCK_REGION
+    )
+    # credentials_profile_name="default",
+    # region_name="us-east-1",
 
-bedrock_session = boto3.Session(region_name='us-east-1')
-boto3_bedrock = bedrock_session.client(service_name="bedrock")
+providers.register("langsmith_client", build_langsmith_client)
+providers.register("llm_open_ai", build_llm_open_ai)
+providers.register("llm_bedrock", build_llm_bedrock)
 
-bedrock_client = boto3.client('bedrock')
-bedrock_runtime_client = boto3.client('bedrock-runtime')
+#LLM response cache (WAFR_LLM_CACHE=disk|s3|off) - re-runs of an unchanged milestone skip the model
+providers.register("llm_cache", build_llm_cache)
+
+#shared rate limiter / retry scheduler for every model call (throttles, timeouts, AIMD on the request rate)
+providers.register("llm_rate_limiter", build_rate_limiter)
+
+
+def llm_chain(llm, parser):
+    """
+    llm | parser behind the response cache and the shared rate limiter - use as prompt | llm_chain(llm, parser).
+    """
+    return cached_llm(llm, parser, providers.get("llm_cache"), providers.get("llm_rate_limiter"))
+
+class ReportCancelled(Exception):
+    pass
 
-llm_bedrock = Bedrock(
-    client=bedrock_runtime_client,
-    model_id=BEDROCK_CLAUDE_MODEL,
-    model_kwargs={"max_tokens_to_sample": 5120},
-    region_name="us-east-1"
-)
-    # credentials_profile_name="default",
-    # region_name="us-east-1",
+
+def check_cancelled(cancel_event):
+    #checked between model calls - a report that already failed stops spending Bedrock calls
+    if cancel_event is not None and cancel_event.is_set():
+        raise ReportCancelled("report cancelled")
+
+
+#max in-flight remediation calls - Bedrock calls are I/O bound so threads are fine
+REMEDIATION_MAX_WORKERS = int(os.getenv("WAFR_REMEDIATION_MAX_WORKERS", "5"))
+
+#quick wins ranking - single prompt, or map-reduce over token-budgeted chunks (auto = map-reduce only when over budget)
+QUICK_WINS_RANKING_MODE = os.getenv("WAFR_QUICK_WINS_RANKING", "auto").lower() #auto | single | map_reduce
+QUICK_WINS_CHUNK_TOKENS = int(os.getenv("WAFR_QUICK_WINS_CHUNK_TOKENS", "6000"))
+QUICK_WINS_SHORTLIST_SIZE = int(os.getenv("WAFR_QUICK_WINS_SHORTLIST_SIZE", "10"))
+QUICK_WINS_MAX_WORKERS = int(os.getenv("WAFR_QUICK_WINS_MAX_WORKERS", "6"))
+
+#remediation plans per LLM call (1 = one call per quick win)
+REMEDIATION_BATCH_SIZE = int(os.getenv("WAFR_REMEDIATION_BATCH_SIZE", "1"))
 
 def save_json_to_file(data, file_path):
     """
@@ -56,50 +99,194 @@ def save_json_to_file(data, file_path):
         json.dump(data, json_file, indent=4)
 
 
-def get_top_10_quick_wins(llm):
-    
-    class QuickWins(BaseModel):
-        quick_win_id: str = Field(description="index of quick wins for numbered list")
-        best_practice_question: str = Field(description="best practice question from hri or mri filtered views")
-        unselected_best_practice_item: str = Field(description="The unselected choice of best practice")
-        effort_estimate: str = Field(description="classify effort into quick-wins, or longer project")
+class QuickWins(BaseModel):
+    quick_win_id: str = Field(description="index of quick wins for numbered list")
+    best_practice_question: str = Field(description="best practice question from hri or mri filtered views")
+    unselected_best_practice_item: str = Field(description="The unselected choice of best practice")
+    effort_estimate: str = Field(description="classify effort into quick-wins, or longer project")
 
-    parser = JsonOutputParser(pydantic_object=QuickWins)
 
-    #get prompt input data
-    #read json
-    json_file_path = '/tmp/filter_high_risk_questions.json'
-    with open(json_file_path, 'rb') as json_file:
-            json_data = json.load(json_file)
-    
-    #prompt template
-    PROMPT_TEMPLATE_TEXT = "From the provided json, figure out which of these items are quick wins. Give me the best 10 quick wins:\n{format_instructions}\n{input_json}"
+def to_compact_json(data):
+    """
+    Minimal JSON for prompts - no whitespace, non-ASCII kept as is (fewer tokens than str() / indented JSON).
+    """
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+def hri_candidates(hri_data):
+    """
+    Flatten the HRI filter output into compact ranking candidates, grouped by pillar.
+
+    Args:
+    - hri_data: {pillar: {question: {"UnselectedChoices": [...], ...}}} (filter_high_risk_questions output).
+
+    Returns:
+    - {pillar: [{"pillar", "question", "choices"}, ...]} without the "None of these" choice.
+    """
+    candidates = {}
+    for pillar, questions in hri_data.items():
+        for question, details in questions.items():
+            choices = [choice.strip() for choice in details.get("UnselectedChoices", []) if choice != "None of these"]
+            if choices:
+                candidates.setdefault(pillar, []).append({"pillar": pillar, "question": question, "choices": choices})
+    return candidates
+
+
+def chunk_candidates(candidates, max_tokens=QUICK_WINS_CHUNK_TOKENS):
+    """
+    Split candidates into chunks of at most max_tokens (estimated) - one chunk per pillar, large pillars split further.
+
+    Args:
+    - candidates: hri_candidates output.
+    - max_tokens: token budget for the candidates of one chunk.
+
+    Returns:
+    - list of candidate lists.
+    """
+    chunks = []
+    for pillar_candidates in candidates.values():
+        chunk, chunk_tokens = [], 0
+        for candidate in pillar_candidates:
+            candidate_tokens = estimate_tokens(to_compact_json(candidate))
+            if chunk and chunk_tokens + candidate_tokens > max_tokens:
+                chunks.append(chunk)
+                chunk, chunk_tokens = [], 0
+            chunk.append(candidate)
+            chunk_tokens += candidate_tokens
+        if chunk:
+            chunks.append(chunk)
+    return chunks
+
+
+def invoke_quick_wins_prompt(llm, prompt_text, input_json):
+    """
+    Run a quick wins ranking prompt over input_json, returns the parsed list of QuickWins items.
+    """
+    parser = JsonOutputParser(pydantic_object=QuickWins)
 
     prompt = PromptTemplate(
-        template = PROMPT_TEMPLATE_TEXT,
+        template = prompt_text,
         input_variables=["input_json"],
         partial_variables={"format_instructions": parser.get_format_instructions()},
     )
 
-    chain = prompt | llm | parser
+    chain = prompt | llm_chain(llm, parser)
 
-    quick_wins_output_json = chain.invoke({"input_json": str(json_data)})
-    
-    return(quick_wins_output_json)
+    quick_wins_output_json = chain.invoke({"input_json": input_json})
+    #a single object instead of a list when only one item comes back
+    if isinstance(quick_wins_output_json, dict):
+        quick_wins_output_json = [quick_wins_output_json]
+    return quick_wins_output_json
 
-def get_quick_wins_remediation_plan(input_quick_win,llm):
-    #Define parser class (Pydantic) i.e. what should the llm output be
 
-    class QuickWinsRemediation(BaseModel):
-        quick_win_id: str = Field(description="index of quick wins for numbered list")
-        best_practice_option: str = Field(description="best practice option from hri or mri filtered views")
-        remediation_description: str = Field(description="A description of the remediation plan")
-        remediation_solution: str = Field(description="A detailed multi-paragraph elaboration on the implementation of an actual solution")
-        remediation_general_considerations: str = Field(description="General best practice considerations that supplement the remediation")
-        effort_estimate: str = Field(description="a detailed breakdown of the effort in terms of core milestones")
-        resources_needed: str = Field(description="a list of AWS skills and roles needed to perform this remediation")
-        domain_impact: str = Field(description="The area/domain it would mostly impact from the customer's business i.e. Security, Finance, etc")
+def shortlist_quick_wins(llm, chunk, shortlist_size=QUICK_WINS_SHORTLIST_SIZE):
+    """
+    Map step: shortlist the best quick win candidates of one chunk.
+    """
+    PROMPT_TEMPLATE_TEXT = "From the provided json, figure out which of these items are quick wins. Shortlist up to " + str(shortlist_size) + " of the best quick wins:\n{format_instructions}\n{input_json}"
+    return invoke_quick_wins_prompt(llm, PROMPT_TEMPLATE_TEXT, to_compact_json(chunk))[:shortlist_size]
+
+
+@timed("rank_quick_wins")
+def rank_quick_wins(llm, hri_data, top_n=10, mode=QUICK_WINS_RANKING_MODE, max_tokens=QUICK_WINS_CHUNK_TOKENS,
+                    shortlist_size=QUICK_WINS_SHORTLIST_SIZE, max_workers=QUICK_WINS_MAX_WORKERS):
+    """
+    Rank the top N quick wins from the HRIs.
 
+    single: one prompt over all candidates. map_reduce: candidates are split into token-budgeted chunks
+    (per pillar), each chunk is shortlisted in parallel and a final reduce prompt picks the top N from the
+    shortlists. auto: single when the candidates fit in max_tokens, map_reduce otherwise.
+
+    Args:
+    - llm: LLM used for the ranking chains.
+    - hri_data: filter_high_risk_questions output.
+    - top_n: number of quick wins to return.
+    - mode: auto | single | map_reduce.
+    - max_tokens: token budget per prompt chunk.
+    - shortlist_size: max items kept per chunk in the map step.
+    - max_workers: max number of concurrent map calls.
+
+    Returns:
+    - (quick wins list, stats dict with mode, input tokens, chunk count and per-chunk latency).
+    """
+    candidates = hri_candidates(hri_data)
+    all_candidates = [candidate for pillar_candidates in candidates.values() for candidate in pillar_candidates]
+    input_json = to_compact_json(all_candidates)
+    input_tokens = estimate_tokens(input_json)
+
+    if mode == "auto":
+        mode = "single" if input_tokens <= max_tokens else "map_reduce"
+
+    stats = {"mode": mode, "candidates": len(all_candidates), "input_tokens": input_tokens, "chunks": 0, "chunk_latency_seconds": []}
+    REDUCE_PROMPT_TEXT = "From the provided json, figure out which of these items are quick wins. Give me the best " + str(top_n) + " quick wins:\n{format_instructions}\n{input_json}"
+
+    if mode != "map_reduce":
+        start = time.perf_counter()
+        quick_wins = invoke_quick_wins_prompt(llm, REDUCE_PROMPT_TEXT, input_json)
+        stats["total_seconds"] = round(time.perf_counter() - start, 3)
+        return quick_wins[:top_n], stats
+
+    # Map - shortlist every chunk in parallel
+    start = time.perf_counter()
+    chunks = chunk_candidates(candidates, max_tokens)
+    stats["chunks"] = len(chunks)
+
+    def timed_shortlist(chunk):
+        chunk_start = time.perf_counter()
+        shortlist = shortlist_quick_wins(llm, chunk, shortlist_size)
+        return shortlist, round(time.perf_counter() - chunk_start, 3)
+
+    shortlists = [None] * len(chunks)
+    stats["chunk_latency_seconds"] = [None] * len(chunks)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks) or 1))) as executor:
+        futures = {executor.submit(timed_shortlist, chunk): idx for idx, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                shortlists[idx], stats["chunk_latency_seconds"][idx] = future.result()
+            except Exception as e:
+                print(f"quick wins shortlist for chunk {idx} failed: {e}")
+
+    shortlisted = [
+        {key: value for key, value in item.items() if key != "quick_win_id"}
+        for shortlist in shortlists if shortlist for item in shortlist
+    ]
+    if not shortlisted and chunks:
+        raise RuntimeError("every quick wins shortlist chunk failed")
+
+    # Reduce - pick the top N from the shortlists
+    reduce_json = to_compact_json(shortlisted)
+    stats["shortlisted"] = len(shortlisted)
+    stats["reduce_tokens"] = estimate_tokens(reduce_json)
+    reduce_start = time.perf_counter()
+    quick_wins = invoke_quick_wins_prompt(llm, REDUCE_PROMPT_TEXT, reduce_json)
+    stats["reduce_seconds"] = round(time.perf_counter() - reduce_start, 3)
+    stats["total_seconds"] = round(time.perf_counter() - start, 3)
+    return quick_wins[:top_n], stats
+
+
+def get_top_10_quick_wins(llm, hri_data):
+    quick_wins, stats = rank_quick_wins(llm, hri_data, top_n=10)
+    print(f"quick wins ranking stats: {stats}")
+    return(quick_wins)
+
+class QuickWinsRemediation(BaseModel):
+    quick_win_id: str = Field(description="index of quick wins for numbered list")
+    best_practice_option: str = Field(description="best practice option from hri or mri filtered views")
+    remediation_description: str = Field(description="A description of the remediation plan")
+    remediation_solution: str = Field(description="A detailed multi-paragraph elaboration on the implementation of an actual solution")
+    remediation_general_considerations: str = Field(description="General best practice considerations that supplement the remediation")
+    effort_estimate: str = Field(description="a detailed breakdown of the effort in terms of core milestones")
+    resources_needed: str = Field(description="a list of AWS skills and roles needed to perform this remediation")
+    domain_impact: str = Field(description="The area/domain it would mostly impact from the customer's business i.e. Security, Finance, etc")
+
+
+class QuickWinsRemediationBatch(BaseModel):
+    remediation_plans: List[QuickWinsRemediation] = Field(description="one remediation plan per input item, keeping the item's quick_win_id")
+
+
+def get_quick_wins_remediation_plan(input_quick_win,llm):
+    #Define parser class (Pydantic) i.e. what should the llm output be
     parser = JsonOutputParser(pydantic_object=QuickWinsRemediation)
 
     
@@ -112,46 +299,300 @@ def get_quick_wins_remediation_plan(input_quick_win,llm):
         partial_variables={"format_instructions": parser.get_format_instructions()},
     )
 
-    chain = prompt | llm | parser
+    chain = prompt | llm_chain(llm, parser)
 
     quick_wins_remediation_plan_json = chain.invoke({"input_json": str(input_quick_win)})
     
     return(quick_wins_remediation_plan_json)
 
 
-def quick_wins_section_prep():
+def get_quick_wins_remediation_plans_batch(input_quick_wins, llm):
+    """
+    Generate remediation plans for several quick wins in one call (format instructions sent once).
+
+    Args:
+    - input_quick_wins: list of quick win dicts.
+    - llm: LLM used for the remediation chain.
+
+    Returns:
+    - list of raw remediation plan dicts as returned by the model (not validated).
+    """
+    parser = JsonOutputParser(pydantic_object=QuickWinsRemediationBatch)
+
+    #prompt template
+    PROMPT_TEMPLATE_TEXT = "For each item in the input json list, generate a technical detailed remediation plan, one plan per item with the item's quick_win_id :\n{format_instructions}\n{input_json}"
+
+    prompt = PromptTemplate(
+        template = PROMPT_TEMPLATE_TEXT,
+        input_variables=["input_json"],
+        partial_variables={"format_instructions": parser.get_format_instructions()},
+    )
+
+    chain = prompt | llm_chain(llm, parser)
+
+    batch_output_json = chain.invoke({"input_json": to_compact_json(input_quick_wins)})
+
+    #accept the bare list as well as the {"remediation_plans": [...]} wrapper
+    if isinstance(batch_output_json, dict):
+        batch_output_json = batch_output_json.get("remediation_plans", [])
+    return batch_output_json if isinstance(batch_output_json, list) else []
+
+
+def validate_remediation_plan(plan):
+    """
+    Check a remediation plan against the QuickWinsRemediation schema.
+
+    Returns:
+    - the plan as a dict of the schema fields, or None if it is invalid.
+    """
+    try:
+        return QuickWinsRemediation.parse_obj(plan).dict()
+    except Exception:
+        return None
+
+
+def split_remediation_batch(quick_wins, plans):
+    """
+    Match the plans of a batch response back to their quick wins by quick_win_id.
+
+    Args:
+    - quick_wins: list of quick win dicts that were sent.
+    - plans: raw plans returned for the batch.
+
+    Returns:
+    - ({quick_win_id: validated plan}, list of quick wins without a valid plan).
+    """
+    valid_plans = {}
+    for plan in plans:
+        validated_plan = validate_remediation_plan(plan)
+        if validated_plan is not None:
+            valid_plans.setdefault(validated_plan["quick_win_id"].strip(), validated_plan)
+
+    matched, missing = {}, []
+    for item in quick_wins:
+        quick_win_id = str(item.get("quick_win_id", "")).strip()
+        if quick_win_id in valid_plans:
+            matched[quick_win_id] = valid_plans[quick_win_id]
+        else:
+            missing.append(item)
+    return matched, missing
+
+
+def generate_remediation_batch(quick_wins, llm):
+    """
+    One batched remediation call, with single-item calls for any item that didn't come back valid.
+
+    Returns:
+    - (list of (quick_win, remediation_plan) tuples, number of single-item fallback calls).
+    """
+    try:
+        matched, missing = split_remediation_batch(quick_wins, get_quick_wins_remediation_plans_batch(quick_wins, llm))
+    except Exception as e:
+        print(f"batched remediation call for {len(quick_wins)} quick wins failed: {e}")
+        matched, missing = {}, list(quick_wins)
+
+    results = [(item, matched[str(item.get("quick_win_id", "")).strip()]) for item in quick_wins if str(item.get("quick_win_id", "")).strip() in matched]
+    for item in missing:
+        try:
+            results.append((item, get_quick_wins_remediation_plan(item, llm)))
+        except Exception as e:
+            print(f"remediation plan for quick win {item.get('quick_win_id')} failed: {e}")
+    return results, len(missing)
+
+
+def quick_win_sort_key(item):
+    """
+    Sort key for ordering items by quick_win_id (numeric ids first, in numeric order).
+
+    Args:
+    - item: quick win / remediation dict containing a quick_win_id.
+    """
+    quick_win_id = str(item.get("quick_win_id", "")).strip()
+    if quick_win_id.isdigit():
+        return (0, int(quick_win_id), quick_win_id)
+    return (1, 0, quick_win_id)
+
+
+@timed("generate_remediation_plans")
+def generate_remediation_plans(quick_wins, llm, max_workers=REMEDIATION_MAX_WORKERS, batch_size=REMEDIATION_BATCH_SIZE, on_plan=None, cancel_event=None):
+    """
+    Generate remediation plans for a list of quick wins with bounded concurrency.
+
+    Quick wins are sent in batches of batch_size items per LLM call (1 = one call per quick win), with at
+    most max_workers calls in flight. Items missing or invalid in a batch response are retried as
+    single-item calls. A failing item is logged and left out, it does not stop the rest of the batch.
+
+    Args:
+    - quick_wins: list of quick win dicts (output of get_top_10_quick_wins).
+    - llm: LLM used for the remediation chain.
+    - max_workers: max number of concurrent LLM calls (1 = serial).
+    - batch_size: quick wins per LLM call.
+    - on_plan: optional callback, called as on_plan(quick_win, remediation_plan) the moment each plan is
+      parsed (completion order, remediation_plan is None for an item that failed).
+    - cancel_event: optional threading.Event - once set, calls not started yet are skipped and ReportCancelled is raised.
+
+    Returns:
+    - list of (quick_win, remediation_plan) tuples ordered by quick_win_id.
+    """
+    def run_call(fn, *args):
+        check_cancelled(cancel_event)
+        return fn(*args)
+
+    results = []
+    batch_size = max(1, int(batch_size))
+    batches = [quick_wins[idx:idx + batch_size] for idx in range(0, len(quick_wins), batch_size)]
+    max_workers = max(1, min(int(max_workers), len(batches) or 1))
+    fallback_calls = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if batch_size == 1:
+            futures = {executor.submit(run_call, get_quick_wins_remediation_plan, item, llm): item for item in quick_wins}
+        else:
+            futures = {executor.submit(run_call, generate_remediation_batch, batch, llm): batch for batch in batches}
+        for future in as_completed(futures):
+            check_cancelled(cancel_event)
+            if batch_size > 1:
+                batch_results, batch_fallback_calls = future.result()
+                results.extend(batch_results)
+                fallback_calls += batch_fallback_calls
+                if on_plan:
+                    for item, plan in batch_results:
+                        on_plan(item, plan)
+                    planned_items = [item for item, _ in batch_results]
+                    for item in futures[future]:
+                        if not any(item is planned_item for planned_item in planned_items):
+                            on_plan(item, None)
+                continue
+
+            item = futures[future]
+            try:
+                plan = future.result()
+            except Exception as e:
+                print(f"remediation plan for quick win {item.get('quick_win_id')} failed: {e}")
+                plan = None
+            else:
+                results.append((item, plan))
+            if on_plan:
+                on_plan(item, plan)
+
+    if batch_size > 1:
+        print(f"remediation plans: {len(batches)} batched calls of up to {batch_size}, {fallback_calls} single-item fallbacks")
+
+    results.sort(key=lambda result: quick_win_sort_key(result[0]))
+    return results
+
+
+@timed("quick_wins_section_prep")
+def quick_wins_section_prep(context, max_workers=REMEDIATION_MAX_WORKERS, batch_size=REMEDIATION_BATCH_SIZE, on_ranked=None, on_plan=None, cancel_event=None):
+    """
+    Rank the top 10 quick wins from the HRIs and generate a remediation plan for each.
+
+    In incremental mode (WAFR_INCREMENTAL) the answers are diffed against the stored state of the
+    workload's previous milestone: only changed HRIs are re-ranked (together with the previous quick wins
+    that still apply) and only quick wins of changed questions get a new remediation plan. A re-run of the
+    stored milestone itself reuses its quick wins and plans without any model call.
+
+    Args:
+    - context: ReportContext populated by fetch_wafr_questions.
+    - max_workers: max number of concurrent remediation calls.
+    - batch_size: quick wins per remediation call.
+    - on_ranked: optional callback, called with the top 10 quick wins as soon as they are ranked.
+    - on_plan: optional callback, called as on_plan(quick_win, remediation_plan) as each plan is parsed.
+    - cancel_event: optional threading.Event, checked between model calls (ReportCancelled once it is set).
+
+    Returns:
+    - list of remediation plans ordered by quick_win_id (also stored on the context).
+    """
     # #Choose LLM
-    # #llm = llm_open_ai
-    llm = llm_bedrock
+    # #llm = providers.get("llm_open_ai")
+    llm = providers.get("llm_bedrock")
+    milestone_state = incremental.load_milestone_state(context) if incremental.INCREMENTAL_MODE else None
+    reused_report = incremental.reuse_milestone_state(context, milestone_state) if milestone_state is not None else None
+    if reused_report is not None:
+        #same milestone, same answers - the stored report is reused as is
+        batch_size = max(1, int(batch_size))
+        context.model_calls_saved = milestone_state.get("ranking_calls", 1) + (len(reused_report) + batch_size - 1) // batch_size
+        print(f"incremental: milestone {context.milestone_number} unchanged since its last run, model calls saved: {context.model_calls_saved}")
+        if on_ranked:
+            on_ranked(context.top_10_quick_wins)
+        context.remediation_items = []
+        for item, remediation_item in sorted(reused_report, key=lambda result: quick_win_sort_key(result[0])):
+            if on_plan:
+                on_plan(item, remediation_item)
+            context.remediation_items.append(remediation_item)
+        return context.remediation_items
+
+    previous_state = incremental.load_previous_state(context) if incremental.INCREMENTAL_MODE else None
+    reusable_plans = {}
+    check_cancelled(cancel_event)
+
     #Get quick wins
-    quick_wins_output = get_top_10_quick_wins(llm)
-    file_path = "/tmp/top_10_quick_wins.json"
-    save_json_to_file(quick_wins_output, file_path)
-    print("quick wins top 10 file saved")
-
-    # #Get remediation plan
-    # Read JSON file
-    json_file_path = '/tmp/top_10_quick_wins.json'
-    with open(json_file_path, 'rb') as json_file:
-        json_data = json.load(json_file)
-
-    # Loop through each item in the JSON data
-    remediation_pts_file_paths = []
-    for item in json_data:
-        remediation_item = get_quick_wins_remediation_plan(item,llm)
-        index = item["quick_win_id"]
-        file_path = f"/tmp/quick_wins_remediation_pt{index}.json"
-        save_json_to_file(remediation_item, file_path)
-        print(f"{file_path} saved successfully")
-        remediation_pts_file_paths.append(file_path)
+    if previous_state is None:
+        context.top_10_quick_wins, ranking_stats = rank_quick_wins(llm, context.resolve_questions(context.high_risk_questions), top_n=10)
+    else:
+        run_plan = incremental.plan_incremental_run(context, previous_state)
+        reusable_plans = run_plan["reusable_plans"]
+        print(f"incremental: {len(context.changed_questions)} questions changed since milestone {context.previous_milestone_number}")
+        if run_plan["rerank_input"] is None:
+            #nothing that feeds the ranking changed - keep the previous top 10
+            context.top_10_quick_wins = run_plan["kept_quick_wins"]
+            ranking_stats = {"mode": "reused", "calls": 0}
+        else:
+            context.top_10_quick_wins, ranking_stats = rank_quick_wins(llm, run_plan["rerank_input"], top_n=10)
+    ranking_stats.setdefault("calls", ranking_stats["chunks"] + 1 if ranking_stats["mode"] == "map_reduce" else 1)
+
+    #Reuse the stored plans of unchanged quick wins, only the rest goes to the LLM
+    reused_results = []
+    new_quick_wins = []
+    for item in context.top_10_quick_wins:
+        plan = reusable_plans.get(incremental.quick_win_key(item))
+        if plan is None:
+            new_quick_wins.append(item)
+        else:
+            reused_results.append((item, dict(plan, quick_win_id=item["quick_win_id"])))
+    if previous_state is not None:
+        context.changed_quick_win_ids = [str(item["quick_win_id"]) for item in new_quick_wins]
+
+    context.dump_debug("top_10_quick_wins", context.top_10_quick_wins)
+    context.dump_debug("quick_wins_ranking_stats", ranking_stats)
+    print(f"quick wins ranking stats: {ranking_stats}")
+    print("quick wins top 10 ranked")
+    if on_ranked:
+        on_ranked(context.top_10_quick_wins)
+    if on_plan:
+        for item, plan in reused_results:
+            on_plan(item, plan)
+
+    # Generate remediation plans concurrently, results come back ordered by quick_win_id
+    check_cancelled(cancel_event)
+    results = reused_results + generate_remediation_plans(new_quick_wins, llm, max_workers, batch_size, on_plan, cancel_event)
+    results.sort(key=lambda result: quick_win_sort_key(result[0]))
+    context.remediation_items = []
+    for item, remediation_item in results:
+        context.remediation_items.append(remediation_item)
+        context.dump_debug(f"quick_wins_remediation_pt{item['quick_win_id']}", remediation_item)
+        print(f"remediation plan for quick win {item['quick_win_id']} ready")
+
+    if previous_state is not None:
+        #a full ranking costs what the stored state recorded, a remediation call covers batch_size quick wins
+        full_ranking_calls = previous_state.get("ranking_calls", 1)
+        batch_size = max(1, int(batch_size))
+        context.model_calls_saved = max(0, full_ranking_calls - ranking_stats["calls"]) + (len(reused_results) + batch_size - 1) // batch_size
+        print(f"incremental: reused {len(reused_results)} remediation plans, model calls saved: {context.model_calls_saved}")
+    incremental.save_state(context, results, ranking_stats["calls"] if previous_state is None else full_ranking_calls)
     
+    llm_cache = providers.get("llm_cache")
+    if llm_cache:
+        print(f"llm cache stats: {llm_cache.stats()}")
+    print(f"llm rate limiter stats: {providers.get('llm_rate_limiter').stats()}")
+
     # get sparccl products mapped
-    #get_sparkccl_products(llm)
-    return(remediation_pts_file_paths)
+    #get_sparkccl_products(llm, context.top_10_quick_wins, context.workspace)
+    return(context.remediation_items)
 
 
 #### Get CCL / Spark Products
-def get_sparkccl_products(llm):
+def get_sparkccl_products(llm, quick_wins, workspace=None):
     #Define parser class (Pydantic) i.e. what should the llm output be
 
     class SparkCCLProducts(BaseModel):
@@ -170,11 +611,6 @@ def get_sparkccl_products(llm):
     json_file_path = 'sparkccl_products_services.json'
     with open(json_file_path) as json_file:
             ccl_json_data = json.load(json_file)
-    
-    #read json
-    json_file_path = '/tmp/top_10_quick_wins.json'
-    with open(json_file_path, 'rb') as json_file:
-            qw_json_data = json.load(json_file)
 
     #prompt template
     PROMPT_TEMPLATE_TEXT = """
@@ -189,14 +625,14 @@ def get_sparkccl_products(llm):
         partial_variables={"format_instructions": parser.get_format_instructions()},
     )
 
-    chain = prompt | llm | parser
+    chain = prompt | llm_chain(llm, parser)
 
-    sparkccl_product_mapping_json = chain.invoke({"input_json": str(qw_json_data), "SparkCCL_products": str(ccl_json_data)})
+    sparkccl_product_mapping_json = chain.invoke({"input_json": str(quick_wins), "SparkCCL_products": str(ccl_json_data)})
     
-    #save json file
-    file_path = "/tmp/sparkccl_product_mapping.json"
-    save_json_to_file(sparkccl_product_mapping_json, file_path)
-    print("spark products mapped and saved to json")
+    #save json file into the job workspace
+    if workspace:
+        file_path = workspace.write_json("sparkccl_product_mapping.json", sparkccl_product_mapping_json)
+        print(f"spark products mapped and saved to {file_path}")
     return(sparkccl_product_mapping_json)
 
 #### Generate conclusion
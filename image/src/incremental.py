@@ -0,0 +1,242 @@
+#system imports
+import hashlib
+import json
+import os
+import threading
+
+#local/user imports
+import providers
+from llm_cache import DiskCacheBackend, S3CacheBackend
+
+#Milestone-diff incremental regeneration - every report stores a fingerprint per question plus its quick wins
+#and remediation plans, the next milestone of the same workload only sends changed questions to the model
+
+INCREMENTAL_MODE = os.getenv("WAFR_INCREMENTAL", "false").lower() == "true"
+REPORT_STATE_BACKEND = os.getenv("WAFR_REPORT_STATE", "disk").lower() #disk | s3 | off
+REPORT_STATE_DIR = os.getenv("WAFR_REPORT_STATE_DIR", "/tmp/wafr_report_state")
+REPORT_STATE_MAX_BYTES = int(os.getenv("WAFR_REPORT_STATE_MAX_BYTES", str(50 * 1024 * 1024)))
+REPORT_STATE_BUCKET = os.getenv("WAFR_REPORT_STATE_BUCKET", "aws-wafr-automation-output-reports")
+REPORT_STATE_PREFIX = os.getenv("WAFR_REPORT_STATE_PREFIX", "report-state/")
+
+
+def question_fingerprints(pillar_answers):
+    """
+    Fingerprint of every answered question: sha256 of its unselected choice ids and risk.
+
+    Args:
+    - pillar_answers: compact answers {pillar_id: {question_id: {"UnselectedChoiceIds", "Risk"}}}.
+
+    Returns:
+    - {question_id: fingerprint}.
+    """
+    fingerprints = {}
+    for questions in pillar_answers.values():
+        for question_id, answer in questions.items():
+            payload = json.dumps([sorted(answer["UnselectedChoiceIds"]), answer["Risk"]])
+            fingerprints[question_id] = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+    return fingerprints
+
+
+def changed_questions(previous_fingerprints, current_fingerprints):
+    """
+    Question ids that are new or whose fingerprint changed since the previous milestone.
+    """
+    return {question_id for question_id, fingerprint in current_fingerprints.items() if previous_fingerprints.get(question_id) != fingerprint}
+
+
+def quick_win_key(quick_win):
+    """
+    Identity of a quick win across milestones: its question and best practice (the ranking renumbers ids).
+    """
+    return f"{quick_win.get('best_practice_question', '').strip()}|{quick_win.get('unselected_best_practice_item', '').strip()}"
+
+
+class ReportStateStore:
+    """
+    Last report state per (workload_id, lens_alias): milestone, question fingerprints, quick wins, remediation plans.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(workload_id, lens_alias):
+        return hashlib.sha256(json.dumps([workload_id, lens_alias]).encode('utf-8')).hexdigest()
+
+    def get(self, workload_id, lens_alias):
+        try:
+            state = self.backend.get(self.key(workload_id, lens_alias))
+        except Exception as e:
+            print(f"report state read failed: {e}")
+            return None
+        return json.loads(state) if state is not None else None
+
+    def set(self, workload_id, lens_alias, state):
+        """
+        Store the state unless a later milestone of the workload is already stored.
+        """
+        with self._lock:
+            stored_state = self.get(workload_id, lens_alias)
+            if stored_state and (stored_state.get("milestone_number") or 0) > (state.get("milestone_number") or 0):
+                print(f"report state of milestone {stored_state['milestone_number']} kept, not replaced by milestone {state.get('milestone_number')}")
+                return
+            try:
+                self.backend.set(self.key(workload_id, lens_alias), json.dumps(state))
+            except Exception as e:
+                print(f"report state write failed: {e}")
+
+
+def build_report_state_store(backend_name=REPORT_STATE_BACKEND):
+    """
+    Build the report state store configured by WAFR_REPORT_STATE (disk, s3 or off).
+
+    Returns:
+    - ReportStateStore, or None when it is switched off.
+    """
+    if backend_name == "disk":
+        return ReportStateStore(DiskCacheBackend(REPORT_STATE_DIR, REPORT_STATE_MAX_BYTES))
+    if backend_name == "s3":
+        return ReportStateStore(S3CacheBackend(REPORT_STATE_BUCKET, REPORT_STATE_PREFIX, ttl_seconds=0))
+    return None
+
+providers.register("report_state_store", build_report_state_store)
+
+
+def load_stored_state(context):
+    store = providers.get("report_state_store")
+    if store is None or context.lens is None or context.milestone_number is None:
+        return None
+    state = store.get(context.workload_id, context.lens_alias)
+    if not state or state.get("milestone_number") is None:
+        return None
+    return state
+
+
+def load_previous_state(context):
+    """
+    Stored report state of an earlier milestone of the context's workload, if any - the baseline to diff against.
+    """
+    state = load_stored_state(context)
+    if state is None or state["milestone_number"] >= context.milestone_number:
+        return None
+    return state
+
+
+def load_milestone_state(context):
+    """
+    Stored report state of the context's own milestone, when its answers and lens version are unchanged
+    (a re-run of the same milestone - its quick wins and plans are reused as they are).
+    """
+    state = load_stored_state(context)
+    if state is None or state["milestone_number"] != context.milestone_number:
+        return None
+    if context.lens.lens_version is None or state.get("lens_version") != context.lens.lens_version or state.get("fingerprints") != question_fingerprints(context.pillar_answers):
+        return None
+    return state
+
+
+def save_state(context, remediation_results, ranking_calls):
+    """
+    Store the report state of the context's milestone for the next incremental run.
+
+    Args:
+    - context: ReportContext after the quick wins stage.
+    - remediation_results: list of (quick_win, remediation_plan) tuples.
+    - ranking_calls: number of model calls the ranking took (what a skipped ranking saves).
+    """
+    store = providers.get("report_state_store")
+    if store is None or context.lens is None or context.milestone_number is None:
+        return
+    #one state slot per workload and lens - the store keeps a newer milestone's baseline
+    store.set(context.workload_id, context.lens_alias, {
+        "milestone_number": context.milestone_number,
+        "lens_version": context.lens.lens_version,
+        "fingerprints": question_fingerprints(context.pillar_answers),
+        "quick_wins": context.top_10_quick_wins,
+        "remediation_plans": {quick_win_key(item): plan for item, plan in remediation_results},
+        "ranking_calls": ranking_calls,
+        #what this milestone's report showed as changed, so a re-run of it renders the same report
+        "previous_milestone_number": context.previous_milestone_number,
+        "changed_questions": context.changed_questions,
+        "changed_quick_win_ids": context.changed_quick_win_ids,
+    })
+
+
+def reuse_milestone_state(context, state):
+    """
+    Put a same-milestone state's quick wins and plans on the context (see load_milestone_state).
+
+    Returns:
+    - list of (quick_win, remediation_plan) tuples, or None when a quick win has no stored plan.
+    """
+    plans = state.get("remediation_plans", {})
+    if any(quick_win_key(item) not in plans for item in state.get("quick_wins", [])):
+        return None
+    context.top_10_quick_wins = state["quick_wins"]
+    context.previous_milestone_number = state.get("previous_milestone_number")
+    context.changed_questions = state.get("changed_questions", [])
+    context.changed_quick_win_ids = state.get("changed_quick_win_ids", [])
+    return [(item, dict(plans[quick_win_key(item)], quick_win_id=item["quick_win_id"])) for item in context.top_10_quick_wins]
+
+
+def plan_incremental_run(context, previous_state):
+    """
+    Work out what can be reused from the previous milestone.
+
+    Sets context.previous_milestone_number and context.changed_questions.
+
+    Returns:
+    - dict with:
+      - kept_quick_wins: previous quick wins whose question is unchanged and still a HRI
+      - rerank_input: {pillar_id: {question label: {"UnselectedChoices", "Risk"}}} of changed HRIs plus the
+        kept quick wins (every HRI when previous quick wins dropped out), or None when the previous ranking
+        can be reused as is
+      - reusable_plans: {quick_win_key: plan} of unchanged questions
+    """
+    lens = context.lens
+    changed = changed_questions(previous_state.get("fingerprints", {}), question_fingerprints(context.pillar_answers))
+    if lens.lens_version is None or previous_state.get("lens_version") != lens.lens_version:
+        #a new (or unknown) lens version can reword questions / choices - treat every question as changed
+        changed = set(lens.questions)
+
+    context.previous_milestone_number = previous_state["milestone_number"]
+    context.changed_questions = sorted(changed, key=lambda question_id: (lens.question_pillar(question_id), lens.questions[question_id]["number"]) if question_id in lens.questions else ("", 0))
+
+    label_to_question_id = {lens.question_label(question_id): question_id for question_id in lens.questions}
+    high_risk_question_ids = {question_id for questions in context.high_risk_questions.values() for question_id in questions}
+
+    def unchanged_question_id(quick_win):
+        question_id = label_to_question_id.get(str(quick_win.get("best_practice_question", "")).strip())
+        if question_id is None or question_id in changed:
+            return None
+        return question_id
+
+    previous_quick_wins = previous_state.get("quick_wins", [])
+    kept_quick_wins = [
+        quick_win for quick_win in previous_quick_wins
+        if unchanged_question_id(quick_win) in high_risk_question_ids
+    ]
+    changed_high_risk = {
+        pillar_id: {question_id: answer for question_id, answer in questions.items() if question_id in changed}
+        for pillar_id, questions in context.high_risk_questions.items()
+    }
+    changed_high_risk = {pillar_id: questions for pillar_id, questions in changed_high_risk.items() if questions}
+
+    rerank_input = None
+    if len(kept_quick_wins) < len(previous_quick_wins):
+        #quick wins dropped out - the free slots can be filled from any HRI, so rank them all
+        rerank_input = lens.resolve_questions(context.high_risk_questions)
+    elif changed_high_risk:
+        rerank_input = lens.resolve_questions(changed_high_risk)
+        for quick_win in kept_quick_wins:
+            question_id = label_to_question_id[quick_win["best_practice_question"].strip()]
+            pillar_questions = rerank_input.setdefault(lens.question_pillar(question_id), {})
+            question = pillar_questions.setdefault(lens.question_label(question_id), {"UnselectedChoices": [], "Risk": "HIGH"})
+            if quick_win["unselected_best_practice_item"] not in question["UnselectedChoices"]:
+                question["UnselectedChoices"].append(quick_win["unselected_best_practice_item"])
+
+    reusable_plans = {
+        key: plan for key, plan in previous_state.get("remediation_plans", {}).items()
+        if label_to_question_id.get(key.split("|", 1)[0]) is not None and label_to_question_id[key.split("|", 1)[0]] not in changed
+    }
+    return {"kept_quick_wins": kept_quick_wins, "rerank_input": rerank_input, "reusable_plans": reusable_plans}
@@ -0,0 +1,509 @@
+#system imports
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+#third-party imports
+from botocore.exceptions import ClientError
+
+#local/user imports
+from aws_clients import get_client
+from telemetry import record_span
+
+#Job subsystem - report requests become jobs with an id, go through a queue backend and are picked up
+#by a worker pool with bounded concurrency. Progress (stage, timings, output key) is readable at any time.
+#
+#On Lambda with WAFR_JOB_QUEUE_URL the API only enqueues: jobs go to SQS and are run by SQS-triggered
+#invocations of the same image (main.handler), job state lives in S3 so any container can answer
+#GET /jobs/{job_id}. On Lambda without a queue the job runs inside the submitting invocation (threads
+#would be frozen with the container once the response is sent). The in-process queue and worker threads
+#are for a long running server (uvicorn) - queued jobs are lost with the process.
+
+JOB_QUEUE_URL = os.getenv("WAFR_JOB_QUEUE_URL")
+JOB_QUEUE_BACKEND = os.getenv("WAFR_JOB_QUEUE", "sqs" if JOB_QUEUE_URL else "inprocess").lower() #sqs | inprocess | local_sqs
+JOB_WORKERS = int(os.getenv("WAFR_JOB_WORKERS", "2"))
+JOB_QUEUE_DIR = os.getenv("WAFR_JOB_QUEUE_DIR", "/tmp/wafr_jobs/queue")
+#a received job stays invisible this long, extended while it runs (set the SQS queue's own timeout >= the Lambda timeout)
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("WAFR_JOB_VISIBILITY_TIMEOUT", "900"))
+JOB_STORE_BACKEND = os.getenv("WAFR_JOB_STORE", "s3" if JOB_QUEUE_BACKEND == "sqs" else "memory").lower() #s3 | disk | memory
+JOB_STORE_DIR = os.getenv("WAFR_JOB_STORE_DIR", "/tmp/wafr_jobs/store")
+JOB_STORE_BUCKET = os.getenv("WAFR_JOB_STORE_BUCKET", "aws-wafr-automation-output-reports")
+JOB_STORE_PREFIX = os.getenv("WAFR_JOB_STORE_PREFIX", "jobs/")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """
+    A single report generation request and its progress.
+    """
+    job_id: str
+    params: Dict[str, object]
+    status: str = QUEUED
+    stage: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stage_timings: Dict[str, float] = field(default_factory=dict) #stage -> seconds
+    output_key: Optional[object] = None #report key, or {workload_id: result} for batch jobs / a result dict for portfolio jobs
+    error: Optional[str] = None
+    _stage_started_at: Optional[float] = None
+
+    def to_dict(self):
+        job_dict = asdict(self)
+        job_dict.pop("_stage_started_at")
+        for timestamp in ("created_at", "started_at", "finished_at"):
+            if job_dict[timestamp] is not None:
+                job_dict[timestamp] = datetime.fromtimestamp(job_dict[timestamp], timezone.utc).isoformat().replace("+00:00", "Z")
+        job_dict["duration_seconds"] = round(self.finished_at - self.started_at, 3) if self.finished_at and self.started_at else None
+        return job_dict
+
+
+# Job state backends - get / set of one job's json by job id
+class DiskJobBackend:
+    """
+    One json file per job on local disk (state of this machine only).
+    """
+    def __init__(self, store_dir=JOB_STORE_DIR):
+        self.store_dir = store_dir
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def get(self, job_id):
+        try:
+            with open(os.path.join(self.store_dir, f"{job_id}.json")) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, job_id, value):
+        path = os.path.join(self.store_dir, f"{job_id}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+
+class S3JobBackend:
+    """
+    One json object per job under an S3 prefix, shared by every container (API and workers).
+    """
+    def __init__(self, bucket=JOB_STORE_BUCKET, prefix=JOB_STORE_PREFIX):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3 = get_client('s3')
+
+    def get(self, job_id):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}{job_id}.json")
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        return response['Body'].read().decode('utf-8')
+
+    def set(self, job_id, value):
+        self.s3.put_object(Bucket=self.bucket, Key=f"{self.prefix}{job_id}.json", Body=value.encode('utf-8'), ContentType='application/json')
+
+
+class JobStore:
+    """
+    Thread safe job registry, persisted through a backend (one json per job) unless memory only.
+
+    With a backend, get() reads the persisted state so a job run by another container is seen as it
+    progresses. all() / the summary only cover the jobs submitted or run by this process.
+    """
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._persist_locks = {}
+
+    def add(self, job):
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._persist(job)
+
+    def get(self, job_id):
+        if self.backend is not None:
+            job = self._load(job_id)
+            if job is not None:
+                return job
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def all(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def start_stage(self, job, stage):
+        """
+        Close the timing of the current stage and start the next one.
+
+        Args:
+        - job: Job being processed.
+        - stage: name of the stage that is starting (None = close the current stage only).
+        """
+        now = time.time()
+        with self._lock:
+            if job.stage and job._stage_started_at is not None:
+                job.stage_timings[job.stage] = round(job.stage_timings.get(job.stage, 0.0) + now - job._stage_started_at, 3)
+                record_span(f"stage.{job.stage}", now - job._stage_started_at)
+            if stage is not None:
+                job.stage = stage
+            job._stage_started_at = now
+        self._persist(job)
+
+    def update(self, job, **changes):
+        with self._lock:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            self._jobs[job.job_id] = job
+        self._persist(job)
+
+    def _persist(self, job):
+        #written outside the registry lock (an S3 put must not stall every other job), one write per job
+        #at a time and each a copy taken just before it, so the last write holds the latest state
+        if self.backend is None:
+            return
+        with self._lock:
+            persist_lock = self._persist_locks.setdefault(job.job_id, threading.Lock())
+        with persist_lock:
+            with self._lock:
+                job_state = asdict(job)
+            job_state.pop("_stage_started_at")
+            self.backend.set(job.job_id, json.dumps(job_state))
+
+    def _load(self, job_id):
+        job_state = self.backend.get(job_id)
+        return Job(**json.loads(job_state)) if job_state is not None else None
+
+
+def build_job_store(backend_name=JOB_STORE_BACKEND):
+    """
+    Build the job store configured by WAFR_JOB_STORE (s3, disk or memory).
+    """
+    if backend_name == "s3":
+        return JobStore(S3JobBackend())
+    if backend_name == "disk":
+        return JobStore(DiskJobBackend())
+    return JobStore()
+
+
+# Queue backends - SQS-style interface: send / receive (with a receipt) / extend_visibility / delete
+class InProcessQueue:
+    """
+    In-memory FIFO queue, not durable - queued jobs are lost with the process.
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def send(self, message):
+        self._queue.put(message)
+
+    def receive(self, wait_seconds=1.0):
+        try:
+            message = self._queue.get(timeout=wait_seconds)
+        except queue.Empty:
+            return None
+        return message, None
+
+    def extend_visibility(self, receipt, seconds):
+        pass
+
+    def delete(self, receipt):
+        pass
+
+    def depth(self):
+        return self._queue.qsize()
+
+
+class LocalSQSQueue:
+    """
+    Local stand-in for SQS: messages are files in a directory, received messages stay invisible for
+    visibility_timeout seconds (extended while the job runs) and are redelivered unless deleted
+    (at-least-once, survives restarts of this machine).
+    """
+    def __init__(self, queue_dir=JOB_QUEUE_DIR, visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+        self.queue_dir = queue_dir
+        self.visibility_timeout = visibility_timeout
+        self._in_flight = {} #receipt -> invisible until
+        self._lock = threading.Lock()
+        os.makedirs(self.queue_dir, exist_ok=True)
+
+    def send(self, message):
+        name = f"{time.time_ns():020d}_{uuid.uuid4().hex}.json"
+        path = os.path.join(self.queue_dir, name)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(message, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _receive_once(self):
+        now = time.time()
+        with self._lock:
+            for name in sorted(os.listdir(self.queue_dir)):
+                if not name.endswith('.json'):
+                    continue
+                if self._in_flight.get(name, 0) > now:
+                    continue
+                try:
+                    with open(os.path.join(self.queue_dir, name)) as f:
+                        message = json.load(f)
+                except FileNotFoundError:
+                    continue
+                self._in_flight[name] = now + self.visibility_timeout
+                return message, name
+        return None
+
+    def receive(self, wait_seconds=1.0):
+        deadline = time.time() + wait_seconds
+        while True:
+            received = self._receive_once()
+            if received or time.time() >= deadline:
+                return received
+            time.sleep(0.1)
+
+    def extend_visibility(self, receipt, seconds):
+        with self._lock:
+            if receipt in self._in_flight:
+                self._in_flight[receipt] = time.time() + seconds
+
+    def delete(self, receipt):
+        with self._lock:
+            self._in_flight.pop(receipt, None)
+            try:
+                os.remove(os.path.join(self.queue_dir, receipt))
+            except FileNotFoundError:
+                pass
+
+    def depth(self):
+        return len([name for name in os.listdir(self.queue_dir) if name.endswith('.json')])
+
+
+class SQSQueue:
+    """
+    Amazon SQS queue. On Lambda its messages are delivered to SQS-triggered invocations
+    (JobService.process_sqs_event) rather than received by worker threads.
+    """
+    def __init__(self, queue_url=JOB_QUEUE_URL, visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+        if not queue_url:
+            raise ValueError("WAFR_JOB_QUEUE_URL is required for the sqs job queue")
+        self.queue_url = queue_url
+        self.visibility_timeout = visibility_timeout
+        self.sqs = get_client('sqs')
+
+    def send(self, message):
+        self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(message))
+
+    def receive(self, wait_seconds=1.0):
+        response = self.sqs.receive_message(QueueUrl=self.queue_url, MaxNumberOfMessages=1, WaitTimeSeconds=int(min(20, wait_seconds)), VisibilityTimeout=self.visibility_timeout)
+        messages = response.get('Messages', [])
+        if not messages:
+            return None
+        return json.loads(messages[0]['Body']), messages[0]['ReceiptHandle']
+
+    def extend_visibility(self, receipt, seconds):
+        self.sqs.change_message_visibility(QueueUrl=self.queue_url, ReceiptHandle=receipt, VisibilityTimeout=int(seconds))
+
+    def delete(self, receipt):
+        self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt)
+
+    def depth(self):
+        response = self.sqs.get_queue_attributes(QueueUrl=self.queue_url, AttributeNames=['ApproximateNumberOfMessages'])
+        return int(response['Attributes']['ApproximateNumberOfMessages'])
+
+
+def build_queue(backend_name=JOB_QUEUE_BACKEND):
+    if backend_name == "sqs":
+        return SQSQueue()
+    if backend_name == "local_sqs":
+        return LocalSQSQueue()
+    return InProcessQueue()
+
+
+class WorkerPool:
+    """
+    Fixed number of worker threads pulling jobs off the queue and running the job handler.
+
+    The handler is called as handler(job, on_stage) and returns the output key of the report.
+    """
+    def __init__(self, job_queue, store, handler, concurrency=JOB_WORKERS):
+        self.job_queue = job_queue
+        self.store = store
+        self.handler = handler
+        self.concurrency = concurrency
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._work, name=f"wafr-job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                received = self.job_queue.receive(wait_seconds=1.0)
+            except Exception as e:
+                print(f"job queue receive failed: {e}")
+                self._stopping.wait(1.0)
+                continue
+            if received is None:
+                continue
+            message, receipt = received
+            try:
+                self.run_received(message, receipt)
+            except Exception as e:
+                #not deleted - the message is redelivered once its visibility timeout runs out
+                print(f"job {message.get('job_id')} could not be run: {type(e).__name__}: {e}")
+                continue
+            try:
+                self.job_queue.delete(receipt)
+            except Exception as e:
+                print(f"job {message.get('job_id')} could not be deleted from the queue: {e}")
+
+    def run_received(self, message, receipt):
+        """
+        Run a received job, keeping its message invisible on the queue until the job is done.
+        """
+        visibility_timeout = getattr(self.job_queue, "visibility_timeout", None)
+        if not visibility_timeout:
+            return self.run_job(message)
+
+        done = threading.Event()
+
+        def keep_invisible():
+            while not done.wait(visibility_timeout / 2):
+                try:
+                    self.job_queue.extend_visibility(receipt, visibility_timeout)
+                except Exception as e:
+                    print(f"job {message.get('job_id')} visibility extension failed: {e}")
+
+        heartbeat = threading.Thread(target=keep_invisible, name=f"wafr-job-visibility-{message.get('job_id')}", daemon=True)
+        heartbeat.start()
+        try:
+            return self.run_job(message)
+        finally:
+            done.set()
+            heartbeat.join()
+
+    def run_job(self, message):
+        job = self.store.get(message["job_id"])
+        if job is None:
+            #job state was lost (i.e. restart with an in-memory store) - rebuild it from the message
+            job = Job(job_id=message["job_id"], params=message["params"])
+            self.store.add(job)
+        elif job.status in (SUCCEEDED, FAILED):
+            #redelivered after it finished (i.e. the delete failed) - don't generate the report twice
+            print(f"job {job.job_id} already {job.status}, skipped")
+            return
+
+        self.store.update(job, status=RUNNING, started_at=time.time(), error=None)
+        try:
+            output_key = self.handler(job, lambda stage: self.store.start_stage(job, stage))
+        except Exception as e:
+            self.store.start_stage(job, None)
+            self.store.update(job, status=FAILED, finished_at=time.time(), error=f"{type(e).__name__}: {e}")
+            print(f"job {job.job_id} failed: {e}")
+            return
+
+        self.store.start_stage(job, None)
+        self.store.update(job, status=SUCCEEDED, finished_at=time.time(), output_key=output_key)
+        print(f"job {job.job_id} finished - output {output_key}")
+
+
+class JobService:
+    """
+    Front door for the job subsystem: submit jobs, look them up, summarise throughput.
+    """
+    def __init__(self, handler, job_queue=None, store=None, concurrency=JOB_WORKERS, start_workers=None, run_inline=None):
+        """
+        Args:
+        - handler: job handler, called as handler(job, on_stage).
+        - job_queue / store: queue backend and job store (None = WAFR_JOB_QUEUE / WAFR_JOB_STORE).
+        - concurrency: worker threads when they are started.
+        - start_workers: run worker threads in this process (None = unless the queue is SQS, whose jobs are
+          run by SQS-triggered invocations through process_sqs_event, or jobs run inline).
+        - run_inline: run each job inside submit() (None = on Lambda unless the queue is SQS).
+        """
+        self.store = store or build_job_store()
+        self.job_queue = job_queue or build_queue()
+        self.workers = WorkerPool(self.job_queue, self.store, handler, concurrency)
+        if run_inline is None:
+            run_inline = bool(os.getenv("AWS_LAMBDA_FUNCTION_NAME")) and not isinstance(self.job_queue, SQSQueue)
+        self.run_inline = run_inline
+        if start_workers is None:
+            start_workers = not run_inline and not isinstance(self.job_queue, SQSQueue)
+        self.workers_started = start_workers
+        if start_workers:
+            self.workers.start()
+
+    def submit(self, **params):
+        """
+        Register a job and queue it - or run it to completion first when jobs run inline.
+
+        Returns:
+        - the Job (finished when run inline).
+        """
+        job = Job(job_id=uuid.uuid4().hex, params=params)
+        self.store.add(job)
+        message = {"job_id": job.job_id, "params": params}
+        if self.run_inline:
+            self.workers.run_job(message)
+            return self.store.get(job.job_id) or job
+        self.job_queue.send(message)
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def process_sqs_event(self, event):
+        """
+        Run the jobs of an SQS-triggered Lambda invocation.
+
+        Args:
+        - event: SQS event, one job message per record.
+
+        Returns:
+        - {"batchItemFailures": [...]} - records whose job could not be run are redelivered by SQS
+          (needs ReportBatchItemFailures on the event source mapping), failed reports are finished jobs.
+        """
+        failures = []
+        for record in event.get("Records", []):
+            try:
+                self.workers.run_received(json.loads(record["body"]), record["receiptHandle"])
+            except Exception as e:
+                print(f"job message {record.get('messageId')} could not be run: {type(e).__name__}: {e}")
+                failures.append({"itemIdentifier": record["messageId"]})
+        return {"batchItemFailures": failures}
+
+    def summary(self):
+        jobs = self.store.all()
+        finished = [job for job in jobs if job.status == SUCCEEDED]
+        durations = [job.finished_at - job.started_at for job in finished]
+        counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+
+        return {
+            "workers": self.workers.concurrency if self.workers_started else 0,
+            "queue_depth": self.job_queue.depth(),
+            "jobs": counts,
+            "avg_duration_seconds": round(sum(durations) / len(durations), 3) if durations else None,
+            "completed_per_minute": round(len(finished) / ((max(job.finished_at for job in finished) - min(job.started_at for job in finished)) / 60), 3) if len(finished) > 1 else None,
+        }
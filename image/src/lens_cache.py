@@ -0,0 +1,232 @@
+#system imports
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+#local/user imports
+from llm_cache import DiskCacheBackend, S3CacheBackend
+
+#Lens definition cache - questions / choices / titles are static per lens version, so they are kept once
+#per (lens alias, lens version) and answers only carry choice ids, resolved to titles at render time
+
+LENS_CACHE_BACKEND = os.getenv("WAFR_LENS_CACHE", "disk").lower() #disk | s3 | memory
+LENS_CACHE_DIR = os.getenv("WAFR_LENS_CACHE_DIR", "/tmp/wafr_lens_cache")
+LENS_CACHE_MAX_BYTES = int(os.getenv("WAFR_LENS_CACHE_MAX_BYTES", str(20 * 1024 * 1024)))
+LENS_CACHE_BUCKET = os.getenv("WAFR_LENS_CACHE_BUCKET", "aws-wafr-automation-output-reports")
+LENS_CACHE_PREFIX = os.getenv("WAFR_LENS_CACHE_PREFIX", "lens-cache/")
+
+#short codes used in question labels i.e. "SEC 3. How do you ..." (other pillars use their pillar id)
+PILLAR_SHORT_CODES = {
+    "operationalExcellence": "OPS",
+    "security": "SEC",
+    "reliability": "REL",
+    "performance": "PERF",
+    "costOptimization": "COST",
+    "sustainability": "SUS",
+}
+
+NONE_OF_THESE = "None of these"
+
+
+@dataclass
+class LensDefinition:
+    """
+    Static content of one lens version: pillars -> questions -> choices.
+
+    pillars: {pillar_id: {"name", "short_code", "questions": [question_id, ...]}} in lens order.
+    questions: {question_id: {"pillar_id", "number", "title", "choices": {choice_id: title}}}.
+    """
+    lens_alias: str
+    lens_version: Optional[str]
+    pillars: Dict[str, dict] = field(default_factory=dict)
+    questions: Dict[str, dict] = field(default_factory=dict)
+
+    @classmethod
+    def from_answer_summaries(cls, lens_alias, lens_version, answer_summaries_by_pillar, pillar_names=None):
+        """
+        Build the definition from list_answers output (every AnswerSummary carries its question and choices).
+
+        Args:
+        - lens_alias / lens_version: lens the answers belong to.
+        - answer_summaries_by_pillar: {pillar_id: [AnswerSummary, ...]} in API order.
+        - pillar_names: optional {pillar_id: pillar name}.
+        """
+        lens = cls(lens_alias, lens_version)
+        for pillar_id, answer_summaries in answer_summaries_by_pillar.items():
+            lens.pillars[pillar_id] = {
+                "name": (pillar_names or {}).get(pillar_id, pillar_id),
+                "short_code": PILLAR_SHORT_CODES.get(pillar_id, pillar_id),
+                "questions": [answer_summary["QuestionId"] for answer_summary in answer_summaries],
+            }
+            for question_number, answer_summary in enumerate(answer_summaries, start=1):
+                lens.questions[answer_summary["QuestionId"]] = {
+                    "pillar_id": pillar_id,
+                    "number": question_number,
+                    "title": answer_summary["QuestionTitle"],
+                    "choices": {choice["ChoiceId"]: choice["Title"] for choice in answer_summary["Choices"]},
+                }
+        return lens
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def covers(self, answer_summaries_by_pillar):
+        """
+        True when every pillar / question / choice in the answers is known to this definition.
+        """
+        for pillar_id, answer_summaries in answer_summaries_by_pillar.items():
+            if pillar_id not in self.pillars:
+                return False
+            for answer_summary in answer_summaries:
+                question = self.questions.get(answer_summary["QuestionId"])
+                if question is None or any(choice["ChoiceId"] not in question["choices"] for choice in answer_summary["Choices"]):
+                    return False
+        return True
+
+    # Lookups
+    def question_pillar(self, question_id):
+        return self.questions[question_id]["pillar_id"]
+
+    def question_label(self, question_id):
+        """
+        Numbered question title as shown in the report i.e. "SEC 3. How do you ...".
+        """
+        question = self.questions[question_id]
+        return f"{self.pillars[question['pillar_id']]['short_code']} {question['number']}. {question['title']}"
+
+    def choice_title(self, question_id, choice_id):
+        return self.questions[question_id]["choices"][choice_id]
+
+    def resolve_questions(self, compact_questions_by_pillar):
+        """
+        Turn compact answers back into the titled structure used for rendering and prompts.
+
+        Args:
+        - compact_questions_by_pillar: {pillar_id: {question_id: {"UnselectedChoiceIds": [...], "Risk": ...}}}.
+
+        Returns:
+        - {pillar_id: {question label: {"UnselectedChoices": [choice titles], "Risk": ...}}}.
+        """
+        resolved = {}
+        for pillar_id, questions in compact_questions_by_pillar.items():
+            resolved[pillar_id] = {
+                self.question_label(question_id): {
+                    "UnselectedChoices": [self.choice_title(question_id, choice_id) for choice_id in answer["UnselectedChoiceIds"]],
+                    "Risk": answer["Risk"],
+                }
+                for question_id, answer in questions.items()
+            }
+        return resolved
+
+
+def compact_answers(answer_summaries_by_pillar):
+    """
+    Answers as choice-id sets: {pillar_id: {question_id: {"UnselectedChoiceIds": [...], "Risk": ...}}}.
+
+    The "None of these" choice is left out, as in the titled structure.
+    """
+    compact = {}
+    for pillar_id, answer_summaries in answer_summaries_by_pillar.items():
+        compact[pillar_id] = {}
+        for answer_summary in answer_summaries:
+            selected_choices = set(answer_summary["SelectedChoices"])
+            compact[pillar_id][answer_summary["QuestionId"]] = {
+                "UnselectedChoiceIds": [
+                    choice["ChoiceId"] for choice in answer_summary["Choices"]
+                    if choice["ChoiceId"] not in selected_choices and choice["Title"] != NONE_OF_THESE
+                ],
+                "Risk": answer_summary["Risk"],
+            }
+    return compact
+
+
+def lens_cache_key(lens_alias, lens_version):
+    return hashlib.sha256(json.dumps([lens_alias, lens_version]).encode('utf-8')).hexdigest()
+
+
+class LensCache:
+    """
+    Lens definitions kept in memory for the warm container, backed by local disk or S3 (optional).
+    """
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lenses = {}
+        self._lock = threading.Lock()
+
+    def get(self, lens_alias, lens_version):
+        key = lens_cache_key(lens_alias, lens_version)
+        with self._lock:
+            lens = self._lenses.get(key)
+
+        if lens is None and self.backend is not None:
+            try:
+                stored_lens = self.backend.get(key)
+            except Exception as e:
+                print(f"lens cache read failed: {e}")
+                stored_lens = None
+            if stored_lens is not None:
+                lens = LensDefinition.from_dict(json.loads(stored_lens))
+                with self._lock:
+                    self._lenses[key] = lens
+
+        with self._lock:
+            if lens is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return lens
+
+    def put(self, lens):
+        key = lens_cache_key(lens.lens_alias, lens.lens_version)
+        with self._lock:
+            self._lenses[key] = lens
+        if self.backend is not None:
+            try:
+                self.backend.set(key, json.dumps(lens.to_dict()))
+            except Exception as e:
+                print(f"lens cache write failed: {e}")
+
+    def get_or_build(self, lens_alias, lens_version, answer_summaries_by_pillar, pillar_names=None):
+        """
+        Cached definition of the lens version, (re)built from the answers when missing or incomplete.
+
+        Without a lens version the definition is built from the answers and never cached - there is no key
+        that tells its questions apart from another version's.
+        """
+        if not lens_version:
+            return LensDefinition.from_answer_summaries(lens_alias, None, answer_summaries_by_pillar, pillar_names)
+        lens = self.get(lens_alias, lens_version)
+        if lens is None or not lens.covers(answer_summaries_by_pillar):
+            lens = LensDefinition.from_answer_summaries(lens_alias, lens_version, answer_summaries_by_pillar, pillar_names)
+            self.put(lens)
+        return lens
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "lenses": len(self._lenses),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+def build_lens_cache(backend_name=LENS_CACHE_BACKEND):
+    """
+    Build the lens cache configured by WAFR_LENS_CACHE (disk, s3 or memory).
+    """
+    if backend_name == "disk":
+        return LensCache(DiskCacheBackend(LENS_CACHE_DIR, LENS_CACHE_MAX_BYTES))
+    if backend_name == "s3":
+        #lens versions never change - no ttl
+        return LensCache(S3CacheBackend(LENS_CACHE_BUCKET, LENS_CACHE_PREFIX, ttl_seconds=0))
+    return LensCache()
@@ -0,0 +1,231 @@
+#third-party imports
+from botocore.exceptions import ClientError
+from langchain_core.runnables import RunnableLambda
+
+#system imports
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+#local/user imports
+from aws_clients import get_client
+from rate_limiter import LLM_EXPECTED_OUTPUT_TOKENS, estimate_tokens
+from telemetry import TELEMETRY_ENABLED, span
+
+#cache config - WAFR_LLM_CACHE = disk | s3 | off
+LLM_CACHE_BACKEND = os.getenv("WAFR_LLM_CACHE", "disk").lower()
+LLM_CACHE_DIR = os.getenv("WAFR_LLM_CACHE_DIR", "/tmp/wafr_llm_cache")
+LLM_CACHE_MAX_BYTES = int(os.getenv("WAFR_LLM_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+LLM_CACHE_BUCKET = os.getenv("WAFR_LLM_CACHE_BUCKET", "aws-wafr-automation-output-reports")
+LLM_CACHE_PREFIX = os.getenv("WAFR_LLM_CACHE_PREFIX", "llm-cache/")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("WAFR_LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+def make_cache_key(model_id, model_kwargs, prompt):
+    """
+    Content address for an LLM call: sha256 of (model id, model kwargs, rendered prompt).
+
+    Args:
+    - model_id: model identifier i.e. anthropic.claude-v2:1.
+    - model_kwargs: dict of model parameters (max tokens, temperature, ...).
+    - prompt: fully rendered prompt text.
+    """
+    payload = json.dumps([model_id, model_kwargs or {}, prompt], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DiskCacheBackend:
+    """
+    Local disk cache, one file per key, least recently used entries evicted above max_bytes.
+    """
+    def __init__(self, cache_dir=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        #touch the entry so eviction is least recently used rather than oldest written
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total_bytes = 0
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_bytes += stat.st_size
+
+            for _, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_bytes -= size
+
+
+class S3CacheBackend:
+    """
+    S3 prefix cache shared across containers, entries older than ttl_seconds count as misses.
+    """
+    def __init__(self, bucket=LLM_CACHE_BUCKET, prefix=LLM_CACHE_PREFIX, ttl_seconds=LLM_CACHE_TTL_SECONDS):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.s3 = get_client('s3')
+
+    def _key(self, key):
+        return f"{self.prefix}{key}.json"
+
+    def get(self, key):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+
+        age = (datetime.now(timezone.utc) - response['LastModified']).total_seconds()
+        if self.ttl_seconds and age > self.ttl_seconds:
+            return None
+        return response['Body'].read().decode('utf-8')
+
+    def set(self, key, value):
+        self.s3.put_object(Bucket=self.bucket, Key=self._key(key), Body=value.encode('utf-8'), ContentType='application/json')
+
+
+class LLMCache:
+    """
+    Content-addressed LLM response cache with hit/miss counters over a pluggable backend.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            #a broken cache should never break the report - treat as a miss
+            print(f"llm cache read failed: {e}")
+            value = None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            print(f"llm cache write failed: {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+def build_llm_cache(backend_name=LLM_CACHE_BACKEND):
+    """
+    Build the LLM cache configured by WAFR_LLM_CACHE (disk, s3 or off).
+
+    Returns:
+    - LLMCache, or None when caching is switched off.
+    """
+    if backend_name == "disk":
+        return LLMCache(DiskCacheBackend())
+    if backend_name == "s3":
+        return LLMCache(S3CacheBackend())
+    return None
+
+
+def cached_llm(llm, parser, cache, limiter=None):
+    """
+    Wrap an LLM + output parser so chain invocations are served from the cache when the rendered prompt was seen before.
+
+    Only successfully parsed outputs are cached, so a malformed model response is retried on the next run.
+    Cache misses go through the rate limiter (when given), cache hits never wait for it. Every model call is
+    an llm.invoke telemetry span with the prompt / completion token counts the model reported.
+    Use in place of llm | parser in a chain i.e. prompt | cached_llm(llm, parser, cache)
+
+    Args:
+    - llm: LangChain LLM.
+    - parser: output parser applied to the LLM output.
+    - cache: LLMCache instance (None = no caching).
+    - limiter: optional rate_limiter.AdaptiveRateLimiter for the model calls.
+
+    Returns:
+    - Runnable (llm | parser unchanged when there is neither a cache nor a limiter and telemetry is off).
+    """
+    if cache is None and limiter is None and not TELEMETRY_ENABLED:
+        return llm | parser
+
+    model_id = getattr(llm, "model_id", None) or getattr(llm, "model_name", None) or type(llm).__name__
+    model_kwargs = getattr(llm, "model_kwargs", None)
+
+    def call_model(prompt_value):
+        #token counts come from the model response - Bedrock headers (telemetry botocore hook) or chat model usage metadata
+        with span("llm.invoke", model=model_id) as llm_span:
+            completion = llm.invoke(prompt_value)
+            usage = getattr(completion, "usage_metadata", None)
+            if usage:
+                llm_span.set(prompt_tokens=usage["input_tokens"], completion_tokens=usage["output_tokens"])
+        return parser.invoke(completion)
+
+    def invoke(prompt_value):
+        prompt_text = prompt_value.to_string() if hasattr(prompt_value, "to_string") else str(prompt_value)
+
+        key = None
+        if cache is not None:
+            key = make_cache_key(model_id, model_kwargs, prompt_text)
+            cached_output = cache.get(key)
+            if cached_output is not None:
+                return json.loads(cached_output)
+
+        if limiter is not None:
+            estimated_tokens = estimate_tokens(prompt_text) + LLM_EXPECTED_OUTPUT_TOKENS
+            parsed_output = limiter.call(lambda: call_model(prompt_value), estimated_tokens)
+        else:
+            parsed_output = call_model(prompt_value)
+
+        if cache is not None:
+            cache.set(key, json.dumps(parsed_output))
+        return parsed_output
+
+    return RunnableLambda(invoke)
@@ -1,22 +1,64 @@
 #third-party imports
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from mangum import Mangum
 
 #system imports
-from io import BytesIO
-import json
-from datetime import datetime
+from typing import Optional
 
 #local/user imports
-from docx_helper_functions import add_empty_line, add_heading, add_page_break, add_paragraph, add_subheading
-from gpt_magic import quick_wins_section_prep
-from state_manager import get_wafr_report
+import providers
+import telemetry
 
 #Class Definitions
 
+#Report modules (LangChain, python-docx, matplotlib) are only imported when a report is actually generated,
+#so cold start, the health endpoint and request acceptance don't pay for them
+
+def run_wafr_report(job, on_stage):
+    state_manager = providers.get_module('state_manager')
+    if job.params.get('portfolio'):
+        return state_manager.get_portfolio_report(job.params['customer'], workload_ids=job.params['workload_ids'], name_prefix=job.params['name_prefix'], milestone_number=job.params['milestone_number'], on_stage=on_stage, lens_alias=job.params.get('lens_alias'), template=job.params.get('template'), milestone_count=job.params.get('milestone_count'))
+    if job.params.get('batch'):
+        return state_manager.get_wafr_reports_batch(job.params['customer'], workload_ids=job.params['workload_ids'], name_prefix=job.params['name_prefix'], milestone_number=job.params['milestone_number'], on_stage=on_stage, job_id=job.job_id, lens_alias=job.params.get('lens_alias'), template=job.params.get('template'))
+    return state_manager.get_wafr_report(job.params['workload_id'], job.params['milestone_number'], job.params['customer'], on_stage=on_stage, job_id=job.job_id, lens_alias=job.params.get('lens_alias'), template=job.params.get('template'))
+
+def build_job_service():
+    jobs = providers.get_module('jobs')
+    return jobs.JobService(run_wafr_report)
+
+#job queue + worker pool are started on the first report request (or queued job), not at cold start
+providers.register('job_service', build_job_service)
+
+def job_response(job, description):
+    #jobs run inline (Lambda without a job queue) are already finished when submit returns
+    if job.status == 'queued':
+        message = f"{description} queued - poll the status url for progress"
+    else:
+        message = f"{description} {job.status} - the status url has the result"
+    return {
+        "message": message,
+        "job_id": job.job_id,
+        "status_url": f"/jobs/{job.job_id}",
+    }
+
+def check_template(template):
+    #reject an unknown template name up front rather than failing the queued job
+    if template is not None:
+        try:
+            providers.get_module('template_cache').template_location(template)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
 
 app = FastAPI()
-handler = Mangum(app)
+api_handler = Mangum(app)
+
+def handler(event, context):
+    #one image, two triggers: SQS deliveries of queued report jobs are run here, everything else is the API
+    records = event.get('Records') or []
+    if records and records[0].get('eventSource') == 'aws:sqs':
+        return providers.get('job_service').process_sqs_event(event)
+    return api_handler(event, context)
 
 
 
@@ -35,13 +77,69 @@ async def hello():
 #         "message": "WAFR report generated - here's your download link: (to-do)"
 #     }
 
+#job endpoints are plain def - submitting / reading a job can mean S3 and SQS calls (or the whole job when it
+#runs inline), so FastAPI runs them in its threadpool rather than on the event loop
 @app.get('/getWafrReport')
-async def getWafrReport_background(workload_id, milestone_number:int, customer, background_tasks: BackgroundTasks): #add llm as param
-    background_tasks.add_task(get_wafr_report, workload_id, milestone_number, customer)
+def getWafrReport_job(workload_id, milestone_number:int, customer, lens_alias: Optional[str] = None, template: Optional[str] = None): #add llm as param
+    check_template(template)
+    job = providers.get('job_service').submit(workload_id=workload_id, milestone_number=milestone_number, customer=customer, lens_alias=lens_alias, template=template)
+    return job_response(job, "WAFR report generation")
+
+#127.0.0.1:8000/getWafrReports?customer=Test&workload_ids=id1,id2&name_prefix=Test-
+@app.get('/getWafrReports')
+def getWafrReports_batch_job(customer, workload_ids: Optional[str] = None, name_prefix: Optional[str] = None, milestone_number: Optional[int] = None, lens_alias: Optional[str] = None, template: Optional[str] = None):
+    #one job for many workloads - ids and / or a workload name prefix, latest milestone unless given
+    workload_id_list = [workload_id.strip() for workload_id in (workload_ids or "").split(",") if workload_id.strip()]
+    if not workload_id_list and not name_prefix:
+        raise HTTPException(status_code=400, detail="workload_ids or name_prefix is required")
+
+    check_template(template)
+    job = providers.get('job_service').submit(batch=True, workload_ids=workload_id_list, name_prefix=name_prefix, milestone_number=milestone_number, customer=customer, lens_alias=lens_alias, template=template)
+    return job_response(job, "WAFR batch report generation")
+
+#127.0.0.1:8000/getPortfolioReport?customer=Test&name_prefix=Test-&milestone_count=3
+@app.get('/getPortfolioReport')
+def getPortfolioReport_job(customer, workload_ids: Optional[str] = None, name_prefix: Optional[str] = None, milestone_number: Optional[int] = None, lens_alias: Optional[str] = None, template: Optional[str] = None, milestone_count: Optional[int] = None):
+    #one report of risk rollups across many workloads - ids and / or a workload name prefix
+    workload_id_list = [workload_id.strip() for workload_id in (workload_ids or "").split(",") if workload_id.strip()]
+    if not workload_id_list and not name_prefix:
+        raise HTTPException(status_code=400, detail="workload_ids or name_prefix is required")
+    if milestone_count is not None and milestone_count < 1:
+        raise HTTPException(status_code=400, detail="milestone_count must be at least 1")
+
+    check_template(template)
+    job = providers.get('job_service').submit(portfolio=True, workload_ids=workload_id_list, name_prefix=name_prefix, milestone_number=milestone_number, customer=customer, lens_alias=lens_alias, template=template, milestone_count=milestone_count)
+    return job_response(job, "WAFR portfolio report generation")
+
+#span timings (stages, WA Tool / Bedrock / S3 calls, doc saves) and token counts since the container started
+@app.get('/metrics')
+async def metrics():
+    return telemetry.metrics_snapshot()
+
+#configured report templates, which customers use them and the template cache hit rate
+@app.get('/templates')
+async def templates():
+    template_cache = providers.get_module('template_cache')
+    cache = providers.registry.get_or_register('template_cache', template_cache.build_template_cache)
     return {
-        "message": "WAFR report generation started - check S3 in about 2 mins Lol, async innit"
+        "templates": template_cache.list_templates(),
+        "cache": cache.stats() if cache is not None else None,
     }
 
+@app.get('/jobs')
+def jobs_summary():
+    return providers.get('job_service').summary()
+
+@app.get('/jobs/{job_id}')
+def job_status(job_id):
+    job = providers.get('job_service').get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"job {job_id} not found")
+    return job.to_dict()
+
 #uvicorn main:app --reload
 
-#use backgroundTasks to bypass async conditions for FastAPI. Otherwise EventLoop, await, asyncio, async...not fun
\ No newline at end of file
+#report generation runs as jobs (jobs.py) rather than FastAPI BackgroundTasks, so progress is visible
+#through /jobs/{job_id} - on Lambda from SQS-triggered invocations (WAFR_JOB_QUEUE_URL) with job state in
+#S3 or, without a queue, inside the invocation that submits it; on a local server from WAFR_JOB_WORKERS
+#worker threads
\ No newline at end of file
@@ -0,0 +1,376 @@
+#third-party imports
+import numpy as np
+
+#system imports
+import copy
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+#local/user imports
+import providers
+from lens_cache import compact_answers
+from risk_index import RISK_LEVELS
+from wafr_tool_api import fetch_review_data, list_milestone_numbers
+
+#Portfolio risk analytics - answers of many workloads packed into NumPy arrays (review x question and
+#review x question x choice) so rollups across 1,000+ workloads are vectorised and stay small in memory.
+#A review is one milestone of one workload - the latest N milestones of each workload can be read, the
+#risk rollups use each workload's latest review and milestone_trend compares milestones.
+
+PORTFOLIO_MAX_WORKERS = int(os.getenv("WAFR_PORTFOLIO_MAX_WORKERS", "8"))
+#milestones read per workload (1 = latest only)
+PORTFOLIO_MILESTONES = int(os.getenv("WAFR_PORTFOLIO_MILESTONES", "1"))
+PORTFOLIO_PERCENTILES = tuple(int(percentile) for percentile in os.getenv("WAFR_PORTFOLIO_PERCENTILES", "50,75,90,95").split(","))
+
+#risk codes in the risk matrix, -1 = question not in the workload's answers
+RISK_CODES = {risk: code for code, risk in enumerate(RISK_LEVELS)}
+NO_ANSWER = -1
+HIGH = RISK_CODES["HIGH"]
+MEDIUM = RISK_CODES["MEDIUM"]
+#risks that count as answered questions for the densities (unanswered / not applicable are left out)
+ANSWERED_CODES = (RISK_CODES["HIGH"], RISK_CODES["MEDIUM"], RISK_CODES["NONE"])
+
+
+class PortfolioMatrix:
+    """
+    Answers of many reviews (workload milestones) on one lens version as dense arrays.
+
+    - risk: int8 [reviews, questions] risk code per question (RISK_CODES, NO_ANSWER).
+    - unselected: bool [reviews, questions, max choices] unselected best practice choices.
+    - workload_ids / milestone_numbers / milestone_offsets: the review of each row, milestone_offsets
+      counts back from the workload's latest milestone read (0 = latest).
+
+    Questions and choices are the columns of the lens definition ("None of these" is never counted).
+    Reviews on another lens version belong in another PortfolioMatrix (load_portfolio keeps one version and
+    lists the others in excluded_reviews), answers the lens doesn't know are skipped and counted.
+    """
+    def __init__(self, lens, initial_capacity=64):
+        self.lens = lens
+        self.question_ids = [question_id for pillar in lens.pillars.values() for question_id in pillar["questions"]]
+        self.pillar_ids = list(lens.pillars)
+        self._question_columns = {question_id: column for column, question_id in enumerate(self.question_ids)}
+        self.choice_ids = [list(lens.questions[question_id]["choices"]) for question_id in self.question_ids]
+        self._choice_columns = [{choice_id: column for column, choice_id in enumerate(choice_ids)} for choice_ids in self.choice_ids]
+        max_choices = max((len(choice_ids) for choice_ids in self.choice_ids), default=0)
+
+        #question -> pillar one-hot, used to roll question level arrays up per pillar with a matmul
+        question_pillars = np.array([self.pillar_ids.index(lens.question_pillar(question_id)) for question_id in self.question_ids], dtype=np.intp)
+        self.pillar_matrix = np.zeros((len(self.question_ids), len(self.pillar_ids)), dtype=np.int32)
+        self.pillar_matrix[np.arange(len(self.question_ids)), question_pillars] = 1
+
+        self.workload_ids = []
+        self.milestone_numbers = []
+        self.milestone_offsets = []
+        self.skipped_answers = 0
+        self.excluded_reviews = []
+        self.risk = np.full((initial_capacity, len(self.question_ids)), NO_ANSWER, dtype=np.int8)
+        self.unselected = np.zeros((initial_capacity, len(self.question_ids), max_choices), dtype=bool)
+
+    def __len__(self):
+        return len(self.workload_ids)
+
+    def _grow(self):
+        capacity = max(1, 2 * self.risk.shape[0])
+        risk = np.full((capacity,) + self.risk.shape[1:], NO_ANSWER, dtype=np.int8)
+        risk[:len(self)] = self.risk[:len(self)]
+        unselected = np.zeros((capacity,) + self.unselected.shape[1:], dtype=bool)
+        unselected[:len(self)] = self.unselected[:len(self)]
+        self.risk, self.unselected = risk, unselected
+
+    def add_workload(self, workload_id, milestone_number, pillar_answers, milestone_offset=0):
+        """
+        Add one review row.
+
+        Args:
+        - workload_id / milestone_number: the review the answers come from.
+        - pillar_answers: compact answers {pillar_id: {question_id: {"UnselectedChoiceIds", "Risk"}}}.
+        - milestone_offset: milestones back from the workload's latest one read (0 = latest).
+        """
+        if len(self) == self.risk.shape[0]:
+            self._grow()
+        row = len(self)
+        for questions in pillar_answers.values():
+            for question_id, answer in questions.items():
+                column = self._question_columns.get(question_id)
+                if column is None:
+                    self.skipped_answers += 1
+                    continue
+                self.risk[row, column] = RISK_CODES.get(answer["Risk"], NO_ANSWER)
+                choice_columns = self._choice_columns[column]
+                for choice_id in answer["UnselectedChoiceIds"]:
+                    choice_column = choice_columns.get(choice_id)
+                    if choice_column is None:
+                        self.skipped_answers += 1
+                    else:
+                        self.unselected[row, column, choice_column] = True
+        self.workload_ids.append(workload_id)
+        self.milestone_numbers.append(milestone_number)
+        self.milestone_offsets.append(milestone_offset)
+
+    def subset(self, rows):
+        """
+        PortfolioMatrix of the given rows (same lens columns, arrays copied).
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        view = copy.copy(self)
+        view.risk = self.risks[rows]
+        view.unselected = self.unselected_choices[rows]
+        view.workload_ids = [self.workload_ids[row] for row in rows]
+        view.milestone_numbers = [self.milestone_numbers[row] for row in rows]
+        view.milestone_offsets = [self.milestone_offsets[row] for row in rows]
+        return view
+
+    def latest_reviews(self):
+        """
+        PortfolioMatrix with the latest review of each workload - one row per workload.
+        """
+        latest = {}
+        for row, (workload_id, offset) in enumerate(zip(self.workload_ids, self.milestone_offsets)):
+            if workload_id not in latest or offset < self.milestone_offsets[latest[workload_id]]:
+                latest[workload_id] = row
+        if len(latest) == len(self):
+            return self
+        return self.subset(sorted(latest.values()))
+
+    @property
+    def risks(self):
+        return self.risk[:len(self)]
+
+    @property
+    def unselected_choices(self):
+        return self.unselected[:len(self)]
+
+    def nbytes(self):
+        return self.risk.nbytes + self.unselected.nbytes + self.pillar_matrix.nbytes
+
+
+# Aggregates - all vectorised over the review axis, pass latest_reviews() for one row per workload
+def pillar_risk_counts(portfolio, risk_codes):
+    """
+    Questions per workload and pillar whose risk is one of risk_codes.
+
+    Returns:
+    - int32 [workloads, pillars].
+    """
+    return np.isin(portfolio.risks, risk_codes).astype(np.int32) @ portfolio.pillar_matrix
+
+
+def pillar_density(portfolio):
+    """
+    HRI / MRI density per pillar across the portfolio.
+
+    Returns:
+    - [{"Pillar", "HRI per workload", "MRI per workload", "HRI density", "MRI density", "Workloads with HRIs"}, ...]
+      densities are HRIs (MRIs) / answered questions, summed over every workload.
+    """
+    high = pillar_risk_counts(portfolio, (HIGH,))
+    medium = pillar_risk_counts(portfolio, (MEDIUM,))
+    answered = pillar_risk_counts(portfolio, ANSWERED_CODES).sum(axis=0)
+    workloads = max(1, len(portfolio))
+    safe_answered = np.maximum(answered, 1)
+
+    hri_per_workload = high.sum(axis=0) / workloads
+    mri_per_workload = medium.sum(axis=0) / workloads
+    hri_density = high.sum(axis=0) / safe_answered
+    mri_density = medium.sum(axis=0) / safe_answered
+    workloads_with_hris = (high > 0).sum(axis=0) / workloads
+
+    return [
+        {
+            "Pillar": portfolio.lens.pillars[pillar_id]["name"],
+            "HRI per workload": round(float(hri_per_workload[idx]), 2),
+            "MRI per workload": round(float(mri_per_workload[idx]), 2),
+            "HRI density": round(float(hri_density[idx]), 3),
+            "MRI density": round(float(mri_density[idx]), 3),
+            "Workloads with HRIs": round(float(workloads_with_hris[idx]), 3),
+        }
+        for idx, pillar_id in enumerate(portfolio.pillar_ids)
+    ]
+
+
+def risk_percentiles(portfolio, risk="HIGH", percentiles=PORTFOLIO_PERCENTILES):
+    """
+    Percentiles of the per-workload count of a risk, per pillar and overall.
+
+    Returns:
+    - [{"Pillar", "p50", "p75", ...}, ...] with a final "All pillars" row.
+    """
+    counts = pillar_risk_counts(portfolio, (RISK_CODES[risk],))
+    counts = np.concatenate([counts, counts.sum(axis=1, keepdims=True)], axis=1)
+    if len(portfolio):
+        values = np.percentile(counts, percentiles, axis=0)
+    else:
+        values = np.zeros((len(percentiles), counts.shape[1]))
+
+    names = [portfolio.lens.pillars[pillar_id]["name"] for pillar_id in portfolio.pillar_ids] + ["All pillars"]
+    return [
+        dict({"Pillar": name}, **{f"p{percentile}": round(float(values[row, idx]), 1) for row, percentile in enumerate(percentiles)})
+        for idx, name in enumerate(names)
+    ]
+
+
+def top_unselected_practices(portfolio, top_n=10, risks=("HIGH", "MEDIUM")):
+    """
+    Best practices most often left unselected on questions with one of the given risks.
+
+    Returns:
+    - [{"Pillar", "Question", "Best Practice", "Workloads", "Share"}, ...] most common first.
+    """
+    at_risk = np.isin(portfolio.risks, [RISK_CODES[risk] for risk in risks])
+    #[questions, choices] count of workloads with the choice unselected on an at-risk question
+    counts = (portfolio.unselected_choices & at_risk[:, :, None]).sum(axis=0, dtype=np.int64)
+
+    flat_counts = counts.ravel()
+    top_n = min(top_n, int(np.count_nonzero(flat_counts)))
+    if top_n == 0:
+        return []
+    top = np.argpartition(flat_counts, -top_n)[-top_n:]
+    top = top[np.argsort(-flat_counts[top], kind='stable')]
+
+    rows = []
+    for flat_idx in top:
+        column, choice_column = np.unravel_index(flat_idx, counts.shape)
+        question_id = portfolio.question_ids[column]
+        rows.append({
+            "Pillar": portfolio.lens.pillars[portfolio.lens.question_pillar(question_id)]["name"],
+            "Question": portfolio.lens.question_label(question_id),
+            "Best Practice": portfolio.lens.choice_title(question_id, portfolio.choice_ids[column][choice_column]),
+            "Workloads": int(flat_counts[flat_idx]),
+            "Share": round(int(flat_counts[flat_idx]) / len(portfolio), 3),
+        })
+    return rows
+
+
+def milestone_trend(portfolio):
+    """
+    HRIs / MRIs per workload at each milestone, counted back from every workload's latest milestone read.
+
+    Returns:
+    - [{"Milestone", "Workloads", "HRI per workload", "MRI per workload"}, ...] latest first.
+    """
+    offsets = np.asarray(portfolio.milestone_offsets, dtype=np.intp)
+    high = (portfolio.risks == HIGH).sum(axis=1)
+    medium = (portfolio.risks == MEDIUM).sum(axis=1)
+
+    rows = []
+    for offset in np.unique(offsets):
+        mask = offsets == offset
+        rows.append({
+            "Milestone": "Latest" if offset == 0 else f"Latest - {offset}",
+            "Workloads": int(mask.sum()),
+            "HRI per workload": round(float(high[mask].mean()), 2),
+            "MRI per workload": round(float(medium[mask].mean()), 2),
+        })
+    return rows
+
+
+def lens_version_counts(portfolio):
+    """
+    Reviews read per lens version, the portfolio's own and the excluded ones.
+    """
+    counts = {portfolio.lens.lens_version or "unknown": len(portfolio)}
+    for review in portfolio.excluded_reviews:
+        version = review["Lens version"] or "unknown"
+        counts[version] = counts.get(version, 0) + 1
+    return counts
+
+
+def portfolio_summary(portfolio, top_n=10):
+    """
+    Every portfolio aggregate in one JSON serialisable dict (input of the portfolio report).
+
+    Risk rollups are over the latest review of each workload, milestone_trend over every review read.
+    """
+    latest = portfolio.latest_reviews()
+    return {
+        "workloads": len(latest),
+        "reviews": len(portfolio),
+        "lens_alias": portfolio.lens.lens_alias,
+        "lens_version": portfolio.lens.lens_version,
+        "lens_versions": lens_version_counts(portfolio),
+        "excluded_reviews": portfolio.excluded_reviews,
+        "pillar_density": pillar_density(latest),
+        "hri_percentiles": risk_percentiles(latest, "HIGH"),
+        "mri_percentiles": risk_percentiles(latest, "MEDIUM"),
+        "top_unselected_practices": top_unselected_practices(latest, top_n),
+        "milestone_trend": milestone_trend(portfolio),
+    }
+
+
+def load_portfolio(workload_ids, lens_alias, milestone_number=None, max_workers=PORTFOLIO_MAX_WORKERS, milestone_count=PORTFOLIO_MILESTONES):
+    """
+    Read the answers of many workloads into a PortfolioMatrix.
+
+    Reviews come through the milestone cache without being kept in memory, and each one is packed into the
+    arrays as soon as it is read, so only the reviews in flight are held as dicts. Reviews are packed per lens
+    version - the version with the most reviews is kept (newest version on a tie), the reviews on any other
+    version are listed in its excluded_reviews rather than being reduced to the kept version's questions.
+
+    Args:
+    - workload_ids: WA Tool workload ids.
+    - lens_alias: lens alias or ARN.
+    - milestone_number: latest milestone to read (None = latest milestone of each workload).
+    - max_workers: max number of workloads read concurrently.
+    - milestone_count: milestones read per workload, counting back from milestone_number / the latest one.
+
+    Returns:
+    - (PortfolioMatrix or None when no workload could be read, {workload_id: error} of the failed ones).
+    """
+    lens_cache = providers.get("lens_cache")
+
+    def workload_milestones(workload_id):
+        if milestone_number is not None and milestone_count <= 1:
+            return [milestone_number]
+        milestone_numbers = list_milestone_numbers(workload_id)
+        if milestone_number is not None:
+            milestone_numbers = [number for number in milestone_numbers if number <= milestone_number]
+        #latest first - the position is the review's milestone offset
+        return milestone_numbers[::-1][:max(1, milestone_count)]
+
+    def read_workload(workload_id):
+        milestones = workload_milestones(workload_id)
+        if not milestones:
+            raise ValueError(f"workload {workload_id} has no milestones")
+        reviews = []
+        for milestone_offset, workload_milestone in enumerate(milestones):
+            review_data = fetch_review_data(workload_id, lens_alias, workload_milestone, keep_in_memory=False)
+            lens_review = review_data["lens_review"]
+            pillar_names = {pillar_summary["PillarId"]: pillar_summary["PillarName"] for pillar_summary in lens_review["PillarReviewSummaries"]}
+            lens = lens_cache.get_or_build(lens_alias, lens_review.get("LensVersion"), review_data["answers"], pillar_names)
+            reviews.append((workload_milestone, milestone_offset, lens, compact_answers(review_data["answers"])))
+        return reviews
+
+    #lens version -> PortfolioMatrix of the reviews on that version
+    portfolios = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(workload_ids) or 1))) as executor:
+        futures = {executor.submit(read_workload, workload_id): workload_id for workload_id in workload_ids}
+        for future in as_completed(futures):
+            workload_id = futures.pop(future)
+            try:
+                reviews = future.result()
+            except Exception as e:
+                errors[workload_id] = f"{type(e).__name__}: {e}"
+                print(f"portfolio read for workload {workload_id} failed: {e}")
+                continue
+            for workload_milestone, milestone_offset, lens, pillar_answers in reviews:
+                if lens.lens_version not in portfolios:
+                    #columns come from the first lens definition read on each version
+                    portfolios[lens.lens_version] = PortfolioMatrix(lens, initial_capacity=len(workload_ids) if not portfolios else 64)
+                portfolios[lens.lens_version].add_workload(workload_id, workload_milestone, pillar_answers, milestone_offset)
+
+    if not portfolios:
+        return None, errors
+
+    kept_version = max(portfolios, key=lambda version: (len(portfolios[version]), version or ""))
+    portfolio = portfolios.pop(kept_version)
+    for version, other in portfolios.items():
+        print(f"portfolio: {len(other)} reviews on lens version {version} excluded, the portfolio uses {kept_version}")
+        portfolio.excluded_reviews.extend(
+            {"Workload": workload_id, "Milestone": workload_milestone, "Lens version": version}
+            for workload_id, workload_milestone in zip(other.workload_ids, other.milestone_numbers)
+        )
+    portfolio.excluded_reviews.sort(key=lambda review: (review["Workload"], review["Milestone"]))
+
+    print(f"portfolio of {len(portfolio)} reviews loaded: {portfolio.nbytes()} bytes of arrays, {portfolio.skipped_answers} answers skipped, {len(portfolio.excluded_reviews)} reviews on other lens versions")
+    return portfolio, errors
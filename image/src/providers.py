@@ -0,0 +1,94 @@
+#system imports
+import importlib
+import threading
+
+#Lazy provider registry - clients, LLMs and heavy modules are built on first use and then memoized
+#so importing a module (and Lambda cold start) doesn't pay for anything the request doesn't need
+
+
+class LazyRegistry:
+    """
+    Name -> factory registry that builds each provider once, on first get(), thread safe.
+    """
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory):
+        """
+        Register a zero-argument factory under a name (re-registering drops any cached instance).
+
+        Args:
+        - name: provider name i.e. llm_bedrock.
+        - factory: callable returning the provider instance.
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name):
+        """
+        Return the provider instance, building it on first use.
+
+        Args:
+        - name: registered provider name.
+        """
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"no provider registered under '{name}'")
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def get_or_register(self, name, factory):
+        """
+        Register the factory if nothing is registered under name yet, then return the instance.
+
+        Args:
+        - name: provider name.
+        - factory: callable returning the provider instance.
+        """
+        with self._lock:
+            if name not in self._factories:
+                self._factories[name] = factory
+        return self.get(name)
+
+    def is_loaded(self, name):
+        return name in self._instances
+
+    def reset(self, name=None):
+        """
+        Drop memoized instances (all of them when name is None) so they are rebuilt on next use.
+        """
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+
+registry = LazyRegistry()
+
+
+def register(name, factory):
+    registry.register(name, factory)
+
+
+def get(name):
+    return registry.get(name)
+
+
+def get_module(module_name):
+    """
+    Import a module on first use and memoize it i.e. get_module('matplotlib.pyplot').
+
+    Args:
+    - module_name: dotted module path.
+    """
+    return registry.get_or_register(f"module:{module_name}", lambda: importlib.import_module(module_name))
@@ -0,0 +1,240 @@
+#third-party imports
+from botocore.exceptions import ClientError, ConnectTimeoutError, EndpointConnectionError, ReadTimeoutError
+
+#system imports
+import os
+import random
+import threading
+import time
+
+#Shared rate limiting + retry scheduling for model calls - every chain invocation takes a request and
+#its estimated tokens from token buckets, throttles / timeouts are retried with jittered exponential
+#backoff, and the allowed rates adapt to observed throttling (AIMD: halve once per congestion event, creep back
+#up on success)
+
+LLM_MAX_REQUESTS_PER_SECOND = float(os.getenv("WAFR_LLM_MAX_REQUESTS_PER_SECOND", "2"))
+LLM_MAX_TOKENS_PER_MINUTE = float(os.getenv("WAFR_LLM_MAX_TOKENS_PER_MINUTE", "200000"))
+LLM_MIN_REQUESTS_PER_SECOND = float(os.getenv("WAFR_LLM_MIN_REQUESTS_PER_SECOND", "0.1"))
+LLM_MAX_RETRIES = int(os.getenv("WAFR_LLM_MAX_RETRIES", "6"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("WAFR_LLM_BACKOFF_BASE_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("WAFR_LLM_BACKOFF_MAX_SECONDS", "30"))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("WAFR_LLM_EXPECTED_OUTPUT_TOKENS", "1000"))
+
+THROTTLING_ERROR_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException", "ServiceUnavailableException"}
+TIMEOUT_ERROR_CODES = {"ModelTimeoutException", "RequestTimeout", "RequestTimeoutException"}
+TIMEOUT_ERRORS = (ReadTimeoutError, ConnectTimeoutError, EndpointConnectionError, TimeoutError)
+
+
+def estimate_tokens(text):
+    """
+    Rough token count (~4 characters per token) - good enough for budgeting prompts and rate limits.
+    """
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket - refills at rate per second up to capacity.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def acquire(self, amount=1.0):
+        """
+        Block until amount tokens are available and take them.
+
+        Args:
+        - amount: tokens to take (capped at the capacity so oversized requests can't block forever).
+
+        Returns:
+        - seconds spent waiting.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait_seconds = (amount - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+            waited += wait_seconds
+
+
+def error_kind(exc):
+    """
+    Classify an exception (and its cause chain - LangChain re-raises Bedrock errors as ValueError).
+
+    Returns:
+    - "throttle", "timeout" or None when the error is not retryable.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, ClientError):
+            code = exc.response.get("Error", {}).get("Code")
+            if code in THROTTLING_ERROR_CODES:
+                return "throttle"
+            if code in TIMEOUT_ERROR_CODES:
+                return "timeout"
+        if isinstance(exc, TIMEOUT_ERRORS):
+            return "timeout"
+        message = str(exc)
+        if any(code in message for code in THROTTLING_ERROR_CODES) or "Too many requests" in message:
+            return "throttle"
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Request + token buckets shared by all model calls, with AIMD rate adaptation and retry scheduling.
+
+    The rate is decreased at most once per congestion window: a throttle only counts when its request was
+    issued after the last decrease, so a burst of in-flight calls throttled together halves the rate once.
+    """
+    def __init__(self, max_requests_per_second=LLM_MAX_REQUESTS_PER_SECOND, max_tokens_per_minute=LLM_MAX_TOKENS_PER_MINUTE,
+                 min_requests_per_second=LLM_MIN_REQUESTS_PER_SECOND, max_retries=LLM_MAX_RETRIES,
+                 backoff_base_seconds=LLM_BACKOFF_BASE_SECONDS, backoff_max_seconds=LLM_BACKOFF_MAX_SECONDS,
+                 decrease_factor=0.5, increase_step=None):
+        self.max_requests_per_second = max_requests_per_second
+        self.min_requests_per_second = min(min_requests_per_second, max_requests_per_second)
+        self.max_tokens_per_second = max_tokens_per_minute / 60
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.decrease_factor = decrease_factor
+        #additive increase - recover the full rate after ~20 successful calls
+        self.increase_step = increase_step or max_requests_per_second / 20
+
+        self.request_bucket = TokenBucket(max_requests_per_second, max(1.0, max_requests_per_second))
+        self.token_bucket = TokenBucket(self.max_tokens_per_second, max_tokens_per_minute)
+        self.requests_per_second = max_requests_per_second
+        #bumped on every decrease - requests carry the window they were issued in
+        self.congestion_window = 0
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttles = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.failures = 0
+        self.queue_wait_seconds = 0.0
+        self.max_queue_wait_seconds = 0.0
+
+    def _set_request_rate(self, rate):
+        self.requests_per_second = rate
+        self.request_bucket.set_rate(rate)
+        #scale the token rate with the request rate so a throttled TPM limit backs off too
+        self.token_bucket.set_rate(self.max_tokens_per_second * rate / self.max_requests_per_second)
+
+    def on_success(self):
+        with self._lock:
+            if self.requests_per_second < self.max_requests_per_second:
+                self._set_request_rate(min(self.max_requests_per_second, self.requests_per_second + self.increase_step))
+
+    def on_throttle(self, issued_window=None):
+        """
+        Record a throttle, decreasing the rate unless the request predates the last decrease.
+
+        Args:
+        - issued_window: congestion_window when the throttled request was issued (None = always decrease).
+        """
+        with self._lock:
+            self.throttles += 1
+            if issued_window is not None and issued_window < self.congestion_window:
+                return
+            self.congestion_window += 1
+            self._set_request_rate(max(self.min_requests_per_second, self.requests_per_second * self.decrease_factor))
+
+    def acquire(self, estimated_tokens=0):
+        """
+        Wait for a request slot and estimated_tokens of token budget.
+
+        Returns:
+        - seconds spent waiting.
+        """
+        waited = self.request_bucket.acquire(1)
+        if estimated_tokens:
+            waited += self.token_bucket.acquire(estimated_tokens)
+        with self._lock:
+            self.requests += 1
+            self.queue_wait_seconds += waited
+            self.max_queue_wait_seconds = max(self.max_queue_wait_seconds, waited)
+        return waited
+
+    def backoff_seconds(self, attempt):
+        #full jitter - random between 0 and the capped exponential backoff
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+
+    def call(self, fn, estimated_tokens=0):
+        """
+        Run fn() under the rate limits, retrying throttles and timeouts with jittered exponential backoff.
+
+        Args:
+        - fn: zero-argument callable making the model call.
+        - estimated_tokens: estimated prompt + output tokens of the call.
+
+        Returns:
+        - fn() result (the last error is re-raised once max_retries is used up or it isn't retryable).
+        """
+        attempt = 0
+        while True:
+            self.acquire(estimated_tokens)
+            issued_window = self.congestion_window
+            try:
+                result = fn()
+            except Exception as e:
+                kind = error_kind(e)
+                if kind == "throttle":
+                    self.on_throttle(issued_window)
+                elif kind == "timeout":
+                    with self._lock:
+                        self.timeouts += 1
+
+                if kind is None or attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self.backoff_seconds(attempt))
+                attempt += 1
+                continue
+
+            self.on_success()
+            return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "throttles": self.throttles,
+                "timeouts": self.timeouts,
+                "retries": self.retries,
+                "failures": self.failures,
+                "queue_wait_seconds": round(self.queue_wait_seconds, 3),
+                "max_queue_wait_seconds": round(self.max_queue_wait_seconds, 3),
+                "requests_per_second": round(self.requests_per_second, 3),
+                "rate_decreases": self.congestion_window,
+            }
+
+
+def build_rate_limiter():
+    return AdaptiveRateLimiter()
@@ -0,0 +1,93 @@
+#system imports
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+#local/user imports
+from workspace import Workspace
+
+#set to a directory to dump every stage output as json for troubleshooting / inspection
+#(the job workspaces are then created under it and kept instead of cleaned up)
+DEBUG_DUMP_DIR = os.getenv("WAFR_DEBUG_DUMP_DIR")
+
+
+def create_workspace(job_id=None):
+    """
+    Workspace for a report job - kept under WAFR_DEBUG_DUMP_DIR when debug dumps are on.
+
+    Args:
+    - job_id: job the workspace belongs to (random id if None).
+    """
+    if DEBUG_DUMP_DIR:
+        return Workspace(job_id, root=DEBUG_DUMP_DIR, keep=True)
+    return Workspace(job_id)
+
+
+@dataclass
+class ReportContext:
+    """
+    In-memory hand-off between the report stages.
+
+    fetch_wafr_questions fills the WA Tool data, quick_wins_section_prep adds the LLM output
+    and initialise_docs renders everything into the Word document.
+    """
+    workload_id: str
+    lens_alias: str
+    milestone_number: int
+
+    #WA Tool API data (fetch_wafr_questions) - answers are compact choice ids when lens is set
+    risk_metrics: List[dict] = field(default_factory=list)
+    pillar_answers: Dict[str, dict] = field(default_factory=dict)
+    high_risk_questions: Dict[str, dict] = field(default_factory=dict)
+    medium_risk_questions: Dict[str, dict] = field(default_factory=dict)
+    lens: Optional[object] = None #lens_cache.LensDefinition the answers are resolved against
+    risk_index: Optional[object] = None #risk_index.RiskIndex over pillar_answers, the risk views above come from it
+
+    #LLM output (quick_wins_section_prep)
+    top_10_quick_wins: List[dict] = field(default_factory=list)
+    remediation_items: List[dict] = field(default_factory=list)
+
+    #incremental mode - what changed since the previous milestone (previous_milestone_number None = full run)
+    previous_milestone_number: Optional[int] = None
+    changed_questions: List[str] = field(default_factory=list)
+    changed_quick_win_ids: List[str] = field(default_factory=list)
+    model_calls_saved: int = 0
+
+    #per-job scratch space for intermediate artifacts
+    workspace: Optional[Workspace] = None
+
+    #opt-in debug persistence, False = memory only
+    debug_dump: bool = bool(DEBUG_DUMP_DIR)
+
+    def resolve_questions(self, questions_by_pillar):
+        """
+        Question / choice titles for rendering and prompts.
+
+        Args:
+        - questions_by_pillar: pillar_answers or one of the risk filters.
+
+        Returns:
+        - {pillar_id: {question label: {"UnselectedChoices": [titles], "Risk"}}} (unchanged when there is no lens,
+          i.e. the answers already carry titles).
+        """
+        if self.lens is None:
+            return questions_by_pillar
+        return self.lens.resolve_questions(questions_by_pillar)
+
+    def dump_debug(self, name, data):
+        """
+        Write a stage output into the job workspace (no-op unless debug dumps are enabled).
+
+        Args:
+        - name: file name without extension i.e. risk_metrics.
+        - data: JSON serialisable stage output.
+
+        Returns:
+        - path of the written file, or None when debug dumps are disabled.
+        """
+        if not self.debug_dump or self.workspace is None:
+            return None
+
+        file_path = self.workspace.write_json(f"{name}.json", data)
+        print(f"debug dump saved to {file_path}")
+        return file_path
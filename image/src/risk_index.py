@@ -0,0 +1,139 @@
+#Risk partition index - one pass over the answers partitions every question by (pillar, risk) and counts the
+#unselected choices, so each report view (HRI / MRI tables, risk metrics, quick win input) is a lookup
+
+#risk levels of the WA Tool API, in report order
+RISK_LEVELS = ("UNANSWERED", "HIGH", "MEDIUM", "NONE", "NOT_APPLICABLE")
+
+#risk metrics table columns per risk level (create_risk_metrics_table layout)
+RISK_METRICS_COLUMNS = {
+    "UNANSWERED": "Unanswered",
+    "HIGH": "High",
+    "MEDIUM": "Medium",
+    "NONE": "None",
+    "NOT_APPLICABLE": "NotApplicable",
+}
+
+
+def unselected_choice_count(answer):
+    #compact answers carry choice ids, titled answers carry choice titles
+    return len(answer.get("UnselectedChoiceIds", answer.get("UnselectedChoices", [])))
+
+
+class RiskIndex:
+    """
+    Questions partitioned by (pillar_id, risk), built once from the extracted answers.
+
+    Every cell keeps its questions (in answer order) plus question and unselected choice counts.
+    Query results for a (pillars, risks) combination are memoised - treat them as read-only.
+    """
+    def __init__(self, pillar_answers):
+        """
+        Args:
+        - pillar_answers: {pillar_id: {question: {"UnselectedChoiceIds" or "UnselectedChoices", "Risk"}}},
+          compact (compact_answers) or titled.
+        """
+        self.pillar_ids = list(pillar_answers)
+        self._cells = {}
+        self._unselected_counts = {}
+        self._positions = {}
+        self._views = {}
+
+        for pillar_id, questions in pillar_answers.items():
+            for position, (question, answer) in enumerate(questions.items()):
+                cell = (pillar_id, answer["Risk"])
+                self._cells.setdefault(cell, {})[question] = answer
+                self._unselected_counts[cell] = self._unselected_counts.get(cell, 0) + unselected_choice_count(answer)
+                self._positions[(pillar_id, question)] = position
+
+    @property
+    def risks(self):
+        """
+        Risk levels present in the answers (known levels in report order first).
+        """
+        present = {risk for _, risk in self._cells}
+        return [risk for risk in RISK_LEVELS if risk in present] + sorted(present.difference(RISK_LEVELS))
+
+    @staticmethod
+    def _selection(values, default):
+        if values is None:
+            return tuple(default)
+        if isinstance(values, str):
+            return (values,)
+        return tuple(values)
+
+    def questions(self, pillars=None, risks=None):
+        """
+        Questions of the given pillars with any of the given risks.
+
+        Args:
+        - pillars: pillar id or ids (None = every pillar).
+        - risks: risk level or levels i.e. "HIGH" or ("HIGH", "MEDIUM") (None = every risk).
+
+        Returns:
+        - {pillar_id: {question: answer}} in answer order, pillars without a match left out
+          (the shape of the former filter_high_risk_questions / filter_medium_risk_questions).
+        """
+        pillars = self._selection(pillars, self.pillar_ids)
+        risks = self._selection(risks, self.risks)
+        view_key = (pillars, frozenset(risks))
+        view = self._views.get(view_key)
+        if view is not None:
+            return view
+
+        view = {}
+        for pillar_id in pillars:
+            cells = [self._cells[(pillar_id, risk)] for risk in risks if (pillar_id, risk) in self._cells]
+            if len(cells) == 1:
+                view[pillar_id] = cells[0]
+            elif cells:
+                #several risks - merge the cells back into answer order
+                merged = [(question, answer) for cell in cells for question, answer in cell.items()]
+                merged.sort(key=lambda item: self._positions[(pillar_id, item[0])])
+                view[pillar_id] = dict(merged)
+        self._views[view_key] = view
+        return view
+
+    def question_count(self, pillar_id=None, risk=None):
+        """
+        Number of questions in a pillar / risk (None = all).
+        """
+        if pillar_id is not None and risk is not None:
+            return len(self._cells.get((pillar_id, risk), {}))
+        return sum(len(questions) for (cell_pillar_id, cell_risk), questions in self._cells.items()
+                   if pillar_id in (None, cell_pillar_id) and risk in (None, cell_risk))
+
+    def unselected_count(self, pillar_id=None, risk=None):
+        """
+        Number of unselected choices in a pillar / risk (None = all).
+        """
+        if pillar_id is not None and risk is not None:
+            return self._unselected_counts.get((pillar_id, risk), 0)
+        return sum(count for (cell_pillar_id, cell_risk), count in self._unselected_counts.items()
+                   if pillar_id in (None, cell_pillar_id) and risk in (None, cell_risk))
+
+    def risk_metrics(self, pillar_names=None):
+        """
+        Risk counts per pillar for the risk metrics table and bar chart.
+
+        Args:
+        - pillar_names: optional {pillar_id: pillar name}.
+
+        Returns:
+        - [{"Name", "Unanswered", "High", "Medium", "None", "NotApplicable"}, ...] in pillar order.
+        """
+        return [
+            dict(
+                {"Name": (pillar_names or {}).get(pillar_id, pillar_id)},
+                **{column: len(self._cells.get((pillar_id, risk), {})) for risk, column in RISK_METRICS_COLUMNS.items()},
+            )
+            for pillar_id in self.pillar_ids
+        ]
+
+    def stats(self):
+        return {
+            "pillars": len(self.pillar_ids),
+            "cells": len(self._cells),
+            "questions": self.question_count(),
+            "unselected_choices": self.unselected_count(),
+            "by_risk": {risk: self.question_count(risk=risk) for risk in self.risks},
+        }
@@ -1,18 +1,17 @@
-#third-party imports
-import boto3
-from docx.api import Document
-from docx.shared import Pt
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-import matplotlib.pyplot as plt
-
 #system imports
-from io import BytesIO
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 #local/user imports
-from wafr_tool_api import fetch_wafr_questions
-from document_wrangler import initialise_docs
+from wafr_tool_api import fetch_wafr_questions, latest_milestone_number, list_workloads
+from document_wrangler import download_template_bytes, initialise_docs, initialise_portfolio_doc
+from portfolio_analytics import PORTFOLIO_MAX_WORKERS, PORTFOLIO_MILESTONES, load_portfolio, portfolio_summary
+from report_context import create_workspace
+from telemetry import timed
+from template_cache import template_location
+from workspace import cleanup_stale_workspaces
 
 #Class Definitions
 class DateTimeEncoder(json.JSONEncoder):
@@ -27,23 +26,171 @@ class DateTimeEncoder(json.JSONEncoder):
 # lens_alias = 'arn:aws:wellarchitected::aws:lens/wellarchitected'
 # milestone_number = 1 #normally 1
 
-# # Define s3 artefact params - To Do enable selection of templates 
+# # Define s3 artefact params - templates are selected per customer / request (template_cache)
 # input_bucket = 'aws-wafr-automation-base-templates'
 # input_key = 'CCL-2024/CCL AWS WAFR - Report Template v0.1.docx'
 # output_bucket = 'aws-wafr-automation-output-reports' 
 # customer_folder = 'Test'  # Specify customer-specific folder name
 
-def get_wafr_report(workload_id, milestone_number, customer):
-    #hard coded consts
-    lens_alias = 'arn:aws:wellarchitected::aws:lens/wellarchitected'
-    input_bucket = 'aws-wafr-automation-base-templates' #bucket for input cust Word template
-    input_key = 'CCL-2024/CCL AWS WAFR - Report Template v0.1.docx' #s3 path to cust template
-    output_bucket = 'aws-wafr-automation-output-reports'  # default output bucket location
+#default lens - requests can pick another (i.e. a custom lens ARN)
+LENS_ALIAS = os.getenv("WAFR_LENS_ALIAS", 'arn:aws:wellarchitected::aws:lens/wellarchitected')
+
+#hard coded consts - input Word templates come from template_cache (WAFR_TEMPLATES / WAFR_CUSTOMER_TEMPLATES)
+OUTPUT_BUCKET = 'aws-wafr-automation-output-reports'  # default output bucket location
+
+#reports generated at once by a batch (each report fans out further for WA Tool / Bedrock calls)
+BATCH_MAX_WORKERS = int(os.getenv("WAFR_BATCH_MAX_WORKERS", "4"))
+
+@timed("get_wafr_report")
+def get_wafr_report(workload_id, milestone_number, customer, on_stage=None, job_id=None, template_bytes=None, lens_alias=None, template=None):
+    """
+    Generate the WAFR report for a workload milestone and upload it to the customer folder.
+
+    Args:
+    - workload_id: WA Tool workload id.
+    - milestone_number: milestone to report on.
+    - customer: customer folder name in the output bucket.
+    - on_stage: optional callback, called with the stage name as each stage starts.
+    - job_id: id of the job, scopes the workspace for intermediate artifacts (random if None).
+    - template_bytes: already downloaded template (shared across a batch), None = download it.
+    - lens_alias: lens alias or ARN to report on (None = WAFR_LENS_ALIAS / the Well-Architected lens).
+    - template: report template name (None = the customer's template, see template_cache.template_location).
+
+    Returns:
+    - S3 key of the generated report.
+    """
+    lens_alias = lens_alias or LENS_ALIAS
+    input_bucket, input_key = template_location(template, customer)
+    output_bucket = OUTPUT_BUCKET
 
-    #fetch params from api: workload_id, milestone_number, customer_folder
-    fetch_wafr_questions(workload_id,lens_alias, milestone_number)
-    initialise_docs(input_bucket, input_key, output_bucket, customer)
+    #isolated scratch space per job - removed again when the report is done
+    cleanup_stale_workspaces()
+    with create_workspace(job_id) as workspace:
+        #fetch params from api: workload_id, milestone_number, customer_folder
+        if on_stage:
+            on_stage('fetch_wafr_questions')
+        context = fetch_wafr_questions(workload_id,lens_alias, milestone_number, workspace=workspace)
+        output_key = initialise_docs(context, input_bucket, input_key, output_bucket, customer, on_stage=on_stage, template_bytes=template_bytes)
 
     #return downloadlink (presigned URL)
+    return output_key
+
+
+def resolve_workload_ids(workload_ids=None, name_prefix=None):
+    """
+    Workloads for a batch: the given ids, plus every workload whose name starts with name_prefix.
+
+    Returns:
+    - list of unique workload ids, in the order given / listed.
+    """
+    resolved_ids = list(workload_ids or [])
+    if name_prefix:
+        resolved_ids.extend(workload_summary["WorkloadId"] for workload_summary in list_workloads(name_prefix))
+    return list(dict.fromkeys(resolved_ids))
+
+
+@timed("get_wafr_reports_batch")
+def get_wafr_reports_batch(customer, workload_ids=None, name_prefix=None, milestone_number=None, max_workers=BATCH_MAX_WORKERS, on_stage=None, job_id=None, lens_alias=None, template=None):
+    """
+    Generate the WAFR reports for many workloads in one invocation.
+
+    Clients, the template bytes, the lens definition, the LLM response cache, the chart cache and the rate limiter are shared by
+    every report, and at most max_workers reports run at once. A failing workload is recorded and the rest
+    of the batch carries on. Each report goes to <customer>/<workload_id>/.
+
+    Args:
+    - customer: customer folder name in the output bucket.
+    - workload_ids: list of WA Tool workload ids.
+    - name_prefix: add every workload whose name starts with this prefix (paginated list_workloads).
+    - milestone_number: milestone to report on (None = latest milestone of each workload).
+    - max_workers: max number of reports generated concurrently.
+    - on_stage: optional callback, called with the batch stage name as each stage starts.
+    - job_id: id of the batch job, each report's workspace is scoped under it.
+    - lens_alias: lens alias or ARN to report on (None = WAFR_LENS_ALIAS / the Well-Architected lens).
+    - template: report template name (None = the customer's template).
+
+    Returns:
+    - {workload_id: {"milestone_number", "output_key", "error"}} in workload order.
+    """
+    if on_stage:
+        on_stage('resolve_workloads')
+    resolved_ids = resolve_workload_ids(workload_ids, name_prefix)
+    if not resolved_ids:
+        raise ValueError("no workloads matched the batch request")
+    print(f"batch of {len(resolved_ids)} workloads, {max_workers} at a time")
+
+    #one template lookup for the whole batch - every report uses the customer's template
+    template_bytes = download_template_bytes(*template_location(template, customer))
+
+    def run_report(idx, workload_id):
+        workload_milestone = milestone_number if milestone_number is not None else latest_milestone_number(workload_id)
+        if workload_milestone is None:
+            raise ValueError(f"workload {workload_id} has no milestones")
+        report_job_id = f"{job_id}-{idx}" if job_id else None
+        output_key = get_wafr_report(workload_id, workload_milestone, f"{customer}/{workload_id}", job_id=report_job_id, template_bytes=template_bytes, lens_alias=lens_alias, template=template)
+        return workload_milestone, output_key
+
+    if on_stage:
+        on_stage('generate_reports')
+    results = {workload_id: {"milestone_number": milestone_number, "output_key": None, "error": None} for workload_id in resolved_ids}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(resolved_ids)))) as executor:
+        futures = {executor.submit(run_report, idx, workload_id): workload_id for idx, workload_id in enumerate(resolved_ids)}
+        for future in as_completed(futures):
+            workload_id = futures[future]
+            try:
+                results[workload_id]["milestone_number"], results[workload_id]["output_key"] = future.result()
+                print(f"batch report for workload {workload_id} done")
+            except Exception as e:
+                results[workload_id]["error"] = f"{type(e).__name__}: {e}"
+                print(f"batch report for workload {workload_id} failed: {e}")
+
+    if all(result["error"] for result in results.values()):
+        raise RuntimeError(f"every report in the batch failed: {results}")
+    return results
+
+
+@timed("get_portfolio_report")
+def get_portfolio_report(customer, workload_ids=None, name_prefix=None, milestone_number=None, max_workers=PORTFOLIO_MAX_WORKERS, on_stage=None, lens_alias=None, template=None, milestone_count=None):
+    """
+    Generate the portfolio report - risk rollups across many workloads - into the customer folder.
+
+    Args:
+    - customer: customer folder name in the output bucket.
+    - workload_ids / name_prefix: workloads to include (as for get_wafr_reports_batch).
+    - milestone_number: latest milestone to read (None = latest milestone of each workload).
+    - max_workers: max number of workloads read concurrently.
+    - on_stage: optional callback, called with the stage name as each stage starts.
+    - lens_alias: lens alias or ARN to report on (None = WAFR_LENS_ALIAS / the Well-Architected lens).
+    - template: report template name (None = the customer's template).
+    - milestone_count: milestones read per workload for the milestone trend (None = WAFR_PORTFOLIO_MILESTONES, 1 = latest only).
+
+    Returns:
+    - {"output_key", "workloads", "reviews", "lens_versions", "excluded_reviews", "errors"}.
+    """
+    lens_alias = lens_alias or LENS_ALIAS
+    milestone_count = milestone_count or PORTFOLIO_MILESTONES
+    if on_stage:
+        on_stage('resolve_workloads')
+    resolved_ids = resolve_workload_ids(workload_ids, name_prefix)
+    if not resolved_ids:
+        raise ValueError("no workloads matched the portfolio request")
+
+    if on_stage:
+        on_stage('load_portfolio')
+    portfolio, errors = load_portfolio(resolved_ids, lens_alias, milestone_number, max_workers, milestone_count)
+    if portfolio is None:
+        raise RuntimeError(f"no workload of the portfolio could be read: {errors}")
+
+    summary = portfolio_summary(portfolio)
+    input_bucket, input_key = template_location(template, customer)
+    output_key = initialise_portfolio_doc(summary, input_bucket, input_key, OUTPUT_BUCKET, customer, on_stage=on_stage)
+    return {
+        "output_key": output_key,
+        "workloads": summary["workloads"],
+        "reviews": summary["reviews"],
+        "lens_versions": summary["lens_versions"],
+        "excluded_reviews": summary["excluded_reviews"],
+        "errors": errors,
+    }
 # if __name__ == "__main__":
 #     get_wafr_report(workload_id, milestone_number, customer_folder)
\ No newline at end of file
@@ -0,0 +1,276 @@
+#system imports
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+#local/user imports
+import providers
+
+#Stage-level tracing - timing spans around report stages and external calls (WA Tool pages, Bedrock,
+#S3, doc saves), aggregated in memory for /metrics and optionally logged as CloudWatch EMF records.
+#With WAFR_TELEMETRY=off every span is a shared no-op object, so instrumented code pays one flag check.
+
+TELEMETRY_MODE = os.getenv("WAFR_TELEMETRY", "metrics").lower() #off | metrics | emf
+TELEMETRY_ENABLED = TELEMETRY_MODE != "off"
+TELEMETRY_EMF = TELEMETRY_MODE == "emf"
+EMF_NAMESPACE = os.getenv("WAFR_TELEMETRY_NAMESPACE", "WAFR")
+#recent durations kept per span name for the percentiles in /metrics
+SPAN_SAMPLE_SIZE = int(os.getenv("WAFR_TELEMETRY_SAMPLE_SIZE", "256"))
+
+#numeric span attributes that become EMF metrics (attribute -> (metric name, unit)), the rest are properties
+METRIC_ATTRIBUTES = {
+    "prompt_tokens": ("PromptTokens", "Count"),
+    "completion_tokens": ("CompletionTokens", "Count"),
+    "bytes": ("Bytes", "Bytes"),
+}
+
+_local = threading.local()
+
+
+class SpanStats:
+    """
+    Running totals of one span name plus a window of recent durations.
+    """
+    def __init__(self, sample_size=SPAN_SAMPLE_SIZE):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.totals = {} #numeric attribute -> sum i.e. prompt_tokens
+        self.recent_seconds = deque(maxlen=sample_size)
+
+    def add(self, seconds, error, attributes):
+        self.count += 1
+        self.errors += int(error)
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.recent_seconds.append(seconds)
+        for name, value in attributes.items():
+            if name in METRIC_ATTRIBUTES:
+                self.totals[name] = self.totals.get(name, 0) + value
+
+    def to_dict(self):
+        recent = sorted(self.recent_seconds)
+
+        def percentile(fraction):
+            return round(recent[min(len(recent) - 1, int(fraction * len(recent)))], 4) if recent else None
+
+        return dict({
+            "count": self.count,
+            "errors": self.errors,
+            "total_seconds": round(self.total_seconds, 4),
+            "avg_seconds": round(self.total_seconds / self.count, 4) if self.count else None,
+            "max_seconds": round(self.max_seconds, 4),
+            "p50_seconds": percentile(0.5),
+            "p95_seconds": percentile(0.95),
+        }, **self.totals)
+
+
+class MetricsRegistry:
+    """
+    Process-wide span aggregates, served by the /metrics endpoint.
+    """
+    def __init__(self):
+        self.started_at = time.time()
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, error=False, attributes=None):
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = SpanStats()
+            stats.add(seconds, error, attributes or {})
+
+    def snapshot(self):
+        with self._lock:
+            spans = {name: stats.to_dict() for name, stats in sorted(self._spans.items())}
+        return {
+            "mode": TELEMETRY_MODE,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "spans": spans,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+
+providers.register("metrics_registry", MetricsRegistry)
+
+
+def emf_record(name, seconds, error, attributes, parent=None):
+    """
+    CloudWatch Embedded Metric Format record of one span (Duration / Errors plus token and byte metrics).
+    """
+    metrics = [{"Name": "Duration", "Unit": "Milliseconds"}, {"Name": "Errors", "Unit": "Count"}]
+    record = {"Span": name, "Duration": round(seconds * 1000, 3), "Errors": int(error)}
+    if parent:
+        record["Parent"] = parent
+    for attribute, value in attributes.items():
+        if attribute in METRIC_ATTRIBUTES:
+            metric_name, unit = METRIC_ATTRIBUTES[attribute]
+            metrics.append({"Name": metric_name, "Unit": unit})
+            record[metric_name] = value
+        else:
+            record[attribute] = value
+    record["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [{"Namespace": EMF_NAMESPACE, "Dimensions": [["Span"]], "Metrics": metrics}],
+    }
+    return record
+
+
+def record_span(name, seconds, error=False, attributes=None, parent=None):
+    """
+    Record an already measured span (i.e. timed by someone else, like the job stage timings).
+    """
+    if not TELEMETRY_ENABLED:
+        return
+    attributes = attributes or {}
+    providers.get("metrics_registry").record(name, seconds, error, attributes)
+    if TELEMETRY_EMF:
+        #one JSON line on stdout - Lambda ships it to CloudWatch Logs, which extracts the metrics
+        print(json.dumps(emf_record(name, seconds, error, attributes, parent), default=str))
+
+
+class Span:
+    """
+    Timing span - use as a context manager, set() adds attributes (i.e. token counts) before it closes.
+    """
+    __slots__ = ("name", "attributes", "started_at", "parent")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = None
+        self.parent = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started_at
+        _local.stack.pop()
+        record_span(self.name, seconds, exc_type is not None, self.attributes, self.parent)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **attributes):
+    """
+    Timing span around a block i.e. with span("wa.list_answers", pillar=pillar_id): ...
+
+    Returns:
+    - Span, or the shared no-op span when telemetry is off.
+    """
+    if not TELEMETRY_ENABLED:
+        return NOOP_SPAN
+    return Span(name, attributes)
+
+
+def timed(name):
+    """
+    Decorator - run the function inside span(name).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TELEMETRY_ENABLED:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def metrics_snapshot():
+    return providers.get("metrics_registry").snapshot()
+
+
+def current_span():
+    """
+    Innermost open span of this thread (None when there is none or telemetry is off).
+    """
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+#token counts Bedrock returns with every InvokeModel response
+BEDROCK_TOKEN_HEADERS = {
+    "prompt_tokens": "x-amzn-bedrock-input-token-count",
+    "completion_tokens": "x-amzn-bedrock-output-token-count",
+}
+
+
+def bedrock_token_counts(http_response):
+    """
+    {"prompt_tokens", "completion_tokens"} from the Bedrock response headers (the ones present).
+    """
+    counts = {}
+    for attribute, header in BEDROCK_TOKEN_HEADERS.items():
+        value = http_response.headers.get(header)
+        if value is not None and str(value).isdigit():
+            counts[attribute] = int(value)
+    return counts
+
+
+# botocore hooks - every call of a pooled AWS client becomes an aws.<service>.<operation> span
+def _before_aws_call(model, context, **kwargs):
+    context["wafr_telemetry_span"] = (f"aws.{model.service_model.endpoint_prefix}.{model.name}", time.perf_counter())
+
+
+def _after_aws_call(context, http_response=None, exception=None, **kwargs):
+    #after-call carries the HTTP response (error statuses included), after-call-error the exception
+    name, started_at = context.pop("wafr_telemetry_span", (None, None))
+    if name is None:
+        return
+    #304 answers a conditional GET (IfNoneMatch) - the cached copy is current, not a failure
+    error = exception is not None or (http_response is not None and http_response.status_code >= 300 and http_response.status_code != 304)
+
+    attributes = {}
+    if http_response is not None and name.startswith("aws.bedrock-runtime."):
+        attributes = bedrock_token_counts(http_response)
+        #the model call runs inside llm.invoke on this thread - the counts belong to that span too
+        parent_span = current_span()
+        if attributes and parent_span is not None and parent_span.name == "llm.invoke":
+            parent_span.set(**attributes)
+
+    parent_span = current_span()
+    record_span(name, time.perf_counter() - started_at, error, attributes, parent_span.name if parent_span else None)
+
+
+def instrument_client(client):
+    """
+    Time every API call of a boto3 client (retries included) - no-op when telemetry is off.
+    """
+    if TELEMETRY_ENABLED:
+        client.meta.events.register('before-call', _before_aws_call)
+        client.meta.events.register('after-call', _after_aws_call)
+        client.meta.events.register('after-call-error', _after_aws_call)
+    return client
@@ -0,0 +1,243 @@
+#third-party imports
+from botocore.exceptions import ClientError
+
+#system imports
+import hashlib
+import json
+import os
+import threading
+import time
+
+#local/user imports
+from aws_clients import get_client
+
+#Report template cache - Word template bytes kept in memory and on local disk, revalidated against S3 with a
+#conditional GET (IfNoneMatch=<ETag>), so an unchanged template costs a 304 instead of a download. Reports
+#open their own Document from the cached bytes, no server-side copy into the customer folder.
+
+TEMPLATE_BUCKET = os.getenv("WAFR_TEMPLATE_BUCKET", "aws-wafr-automation-base-templates")
+TEMPLATE_KEY = os.getenv("WAFR_TEMPLATE_KEY", "CCL-2024/CCL AWS WAFR - Report Template v0.1.docx")
+
+#named templates {name: "key" or "bucket/key" (s3://bucket/key)} and customer -> template name, as JSON
+#i.e. WAFR_TEMPLATES='{"lite": "CCL-2024/CCL AWS WAFR - Lite Template.docx"}' WAFR_CUSTOMER_TEMPLATES='{"KMD": "lite"}'
+DEFAULT_TEMPLATE = "default"
+TEMPLATES = json.loads(os.getenv("WAFR_TEMPLATES", "{}"))
+CUSTOMER_TEMPLATES = json.loads(os.getenv("WAFR_CUSTOMER_TEMPLATES", "{}"))
+
+TEMPLATE_CACHE_BACKEND = os.getenv("WAFR_TEMPLATE_CACHE", "disk").lower() #disk | memory | off
+TEMPLATE_CACHE_DIR = os.getenv("WAFR_TEMPLATE_CACHE_DIR", "/tmp/wafr_template_cache")
+#a template validated this recently is served without asking S3 (0 = conditional GET on every report)
+TEMPLATE_REVALIDATE_SECONDS = float(os.getenv("WAFR_TEMPLATE_REVALIDATE_SECONDS", "60"))
+
+
+def template_location(template=None, customer=None):
+    """
+    S3 location of a report template.
+
+    Args:
+    - template: template name (WAFR_TEMPLATES or "default"), None = the customer's template.
+    - customer: customer folder name, its first path segment is looked up in WAFR_CUSTOMER_TEMPLATES.
+
+    Returns:
+    - (bucket, key).
+    """
+    if template is None and customer:
+        template = CUSTOMER_TEMPLATES.get(customer.split("/")[0])
+    template = template or DEFAULT_TEMPLATE
+    if template == DEFAULT_TEMPLATE and DEFAULT_TEMPLATE not in TEMPLATES:
+        return TEMPLATE_BUCKET, TEMPLATE_KEY
+    if template not in TEMPLATES:
+        raise ValueError(f"unknown report template '{template}', configured: {[DEFAULT_TEMPLATE] + sorted(TEMPLATES)}")
+
+    location = TEMPLATES[template]
+    if location.startswith("s3://"):
+        bucket, _, key = location[len("s3://"):].partition("/")
+        return bucket, key
+    return TEMPLATE_BUCKET, location
+
+
+def list_templates():
+    """
+    Configured templates and which customers use them.
+    """
+    names = [DEFAULT_TEMPLATE] + sorted(name for name in TEMPLATES if name != DEFAULT_TEMPLATE)
+    return {
+        name: {
+            "location": "s3://{}/{}".format(*template_location(name)),
+            "customers": sorted(customer for customer, template in CUSTOMER_TEMPLATES.items() if template == name),
+        }
+        for name in names
+    }
+
+
+def is_not_modified(error):
+    #a matching IfNoneMatch comes back from boto3 as a ClientError with a 304 status
+    return error.response.get('Error', {}).get('Code') in ('304', 'NotModified') or \
+        error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304
+
+
+class TemplateEntry:
+    __slots__ = ("etag", "template_bytes", "validated_at")
+
+    def __init__(self, etag, template_bytes, validated_at=0.0):
+        self.etag = etag
+        self.template_bytes = template_bytes
+        self.validated_at = validated_at
+
+
+class TemplateDiskStore:
+    """
+    Template bytes and their ETag on local disk, so a new container starts with a revalidation rather than a download.
+    """
+    def __init__(self, cache_dir=TEMPLATE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, bucket, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(f"{bucket}/{key}".encode('utf-8')).hexdigest())
+
+    def get(self, bucket, key):
+        path = self._path(bucket, key)
+        try:
+            with open(f"{path}.etag") as f:
+                etag = f.read()
+            with open(f"{path}.docx", 'rb') as f:
+                template_bytes = f.read()
+        except FileNotFoundError:
+            return None
+        return TemplateEntry(etag, template_bytes)
+
+    def set(self, bucket, key, entry):
+        path = self._path(bucket, key)
+        tmp_suffix = f".{threading.get_ident()}.tmp"
+        #bytes first, then the etag - a reader never sees a new etag next to old bytes
+        with open(f"{path}.docx{tmp_suffix}", 'wb') as f:
+            f.write(entry.template_bytes)
+        os.replace(f"{path}.docx{tmp_suffix}", f"{path}.docx")
+        with open(f"{path}.etag{tmp_suffix}", 'w') as f:
+            f.write(entry.etag)
+        os.replace(f"{path}.etag{tmp_suffix}", f"{path}.etag")
+
+
+class TemplateCache:
+    """
+    ETag-validated template bytes per (bucket, key), in memory for the warm container plus an optional disk store.
+
+    Counters: hits (served from cache, with or without a 304 revalidation), misses (downloaded because the
+    template was not cached or its ETag changed), revalidations (conditional GETs answered 304).
+    """
+    def __init__(self, store=None, revalidate_seconds=TEMPLATE_REVALIDATE_SECONDS):
+        self.store = store
+        self.revalidate_seconds = revalidate_seconds
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.bytes_downloaded = 0
+        self.bytes_saved = 0
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, bucket, key):
+        #one download / revalidation per template at a time (a batch asks for the same template at once)
+        with self._lock:
+            return self._locks.setdefault((bucket, key), threading.Lock())
+
+    def _count(self, hit, template_bytes):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.bytes_saved += len(template_bytes)
+            else:
+                self.misses += 1
+                self.bytes_downloaded += len(template_bytes)
+
+    def _cached_entry(self, bucket, key):
+        entry = self._entries.get((bucket, key))
+        if entry is None and self.store is not None:
+            try:
+                entry = self.store.get(bucket, key)
+            except Exception as e:
+                print(f"template cache read failed: {e}")
+                entry = None
+        return entry
+
+    def get(self, bucket, key):
+        """
+        Template bytes, downloaded only when not cached or changed in S3.
+
+        Args:
+        - bucket / key: S3 location of the template.
+
+        Returns:
+        - template file bytes (shared and immutable - open a Document from them per report).
+        """
+        with self._key_lock(bucket, key):
+            entry = self._cached_entry(bucket, key)
+            if entry is not None and time.time() - entry.validated_at < self.revalidate_seconds:
+                self._count(True, entry.template_bytes)
+                return entry.template_bytes
+
+            s3 = get_client('s3')
+            try:
+                if entry is not None:
+                    response = s3.get_object(Bucket=bucket, Key=key, IfNoneMatch=entry.etag)
+                else:
+                    response = s3.get_object(Bucket=bucket, Key=key)
+            except ClientError as e:
+                if entry is None or not is_not_modified(e):
+                    raise
+                #304 - the cached bytes are still current
+                entry.validated_at = time.time()
+                with self._lock:
+                    self._entries[(bucket, key)] = entry
+                    self.revalidations += 1
+                self._count(True, entry.template_bytes)
+                return entry.template_bytes
+
+            entry = TemplateEntry(response.get('ETag', ''), response['Body'].read(), time.time())
+            with self._lock:
+                self._entries[(bucket, key)] = entry
+            if self.store is not None:
+                try:
+                    self.store.set(bucket, key, entry)
+                except Exception as e:
+                    print(f"template cache write failed: {e}")
+            self._count(False, entry.template_bytes)
+            print(f"Template loaded from {bucket}/{key} ({len(entry.template_bytes)} bytes)")
+            return entry.template_bytes
+
+    def invalidate(self, bucket=None, key=None):
+        """
+        Force the next get() to revalidate (one template, or every template when bucket / key are None).
+        """
+        with self._lock:
+            for location, entry in self._entries.items():
+                if bucket is None or location == (bucket, key):
+                    entry.validated_at = 0.0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "templates": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "bytes_downloaded": self.bytes_downloaded,
+            "bytes_saved": self.bytes_saved,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+def build_template_cache(backend_name=TEMPLATE_CACHE_BACKEND):
+    """
+    Build the template cache configured by WAFR_TEMPLATE_CACHE (disk, memory or off).
+
+    Returns:
+    - TemplateCache, or None when caching is switched off (every report downloads its template).
+    """
+    if backend_name == "disk":
+        return TemplateCache(TemplateDiskStore())
+    if backend_name == "memory":
+        return TemplateCache()
+    return None
@@ -1,7 +1,19 @@
-import boto3
+import hashlib
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import providers
+from aws_clients import AWS_MAX_POOL_CONNECTIONS, get_client
+from lens_cache import LensDefinition, build_lens_cache, compact_answers
+from llm_cache import DiskCacheBackend, S3CacheBackend
+from report_context import ReportContext
+from risk_index import RiskIndex
+from telemetry import timed
+
 # Class Definitions
 # Custom JSON encoder to handle datetime objects
 class DateTimeEncoder(json.JSONEncoder):
@@ -10,7 +22,150 @@ class DateTimeEncoder(json.JSONEncoder):
             return o.isoformat()
         return super().default(o)
 
-client = boto3.client(service_name='wellarchitected', region_name="ap-southeast-2")
+WA_TOOL_REGION = os.getenv("WAFR_WA_TOOL_REGION", "ap-southeast-2")
+
+#WA Tool calls in flight across every thread - portfolio / batch workloads x pillar fetches nest - are capped
+#at the client's connection pool, so a call waits for a connection instead of urllib3 discarding one
+_wa_call_slots = threading.BoundedSemaphore(AWS_MAX_POOL_CONNECTIONS)
+
+def wa_client():
+    #shared, pooled WA Tool client
+    return get_client('wellarchitected', WA_TOOL_REGION)
+
+def wa_call(operation, **request_params):
+    """
+    Call a WA Tool operation on the shared client within the connection pool's capacity.
+
+    Args:
+    - operation: client method name i.e. list_answers.
+    - request_params: the operation's parameters.
+    """
+    with _wa_call_slots:
+        return getattr(wa_client(), operation)(**request_params)
+
+PILLAR_IDS = ['operationalExcellence', 'security', 'reliability', 'performance', 'costOptimization', 'sustainability']
+LIST_ANSWERS_PAGE_SIZE = 50 #max allowed by the WA Tool API
+LIST_WORKLOADS_PAGE_SIZE = 50 #max allowed by the WA Tool API
+LIST_MILESTONES_PAGE_SIZE = 50 #max allowed by the WA Tool API
+
+#lens definitions (questions / choices / titles) cached per lens version - WAFR_LENS_CACHE=disk|s3|memory
+providers.register("lens_cache", build_lens_cache)
+
+#milestone answer cache - WAFR_WA_CACHE = disk | s3 | memory | off
+WA_CACHE_BACKEND = os.getenv("WAFR_WA_CACHE", "disk").lower()
+WA_CACHE_DIR = os.getenv("WAFR_WA_CACHE_DIR", "/tmp/wafr_wa_cache")
+WA_CACHE_MAX_BYTES = int(os.getenv("WAFR_WA_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+WA_CACHE_BUCKET = os.getenv("WAFR_WA_CACHE_BUCKET", "aws-wafr-automation-output-reports")
+WA_CACHE_PREFIX = os.getenv("WAFR_WA_CACHE_PREFIX", "wa-cache/")
+WA_CURRENT_STATE_TTL_SECONDS = int(os.getenv("WAFR_WA_CURRENT_STATE_TTL_SECONDS", "60"))
+
+
+class MilestoneCache:
+    """
+    Lens review + answers per (workload_id, lens_alias, milestone_number).
+
+    Saved milestones are immutable, so their entries never expire (memory, then the disk / S3 backend).
+    Current-state reads (milestone_number None) can change at any time - they are kept in memory only,
+    for current_state_ttl_seconds.
+    """
+    def __init__(self, backend=None, current_state_ttl_seconds=WA_CURRENT_STATE_TTL_SECONDS):
+        self.backend = backend
+        self.current_state_ttl_seconds = current_state_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._entries = {} #key -> (stored at, review data)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(workload_id, lens_alias, milestone_number):
+        return hashlib.sha256(json.dumps([workload_id, lens_alias, milestone_number]).encode('utf-8')).hexdigest()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, workload_id, lens_alias, milestone_number, keep_in_memory=True):
+        """
+        Args:
+        - keep_in_memory: keep a backend hit in memory for the warm container (False for one-off bulk reads).
+
+        Returns:
+        - {"lens_review", "answers"} or None on a miss.
+        """
+        key = self.key(workload_id, lens_alias, milestone_number)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, review_data = entry
+            if milestone_number is not None or time.time() - stored_at <= self.current_state_ttl_seconds:
+                self._count(True)
+                return review_data
+            with self._lock:
+                self.expired += 1
+                self._entries.pop(key, None)
+
+        if milestone_number is not None and self.backend is not None:
+            try:
+                stored_review_data = self.backend.get(key)
+            except Exception as e:
+                print(f"milestone cache read failed: {e}")
+                stored_review_data = None
+            if stored_review_data is not None:
+                review_data = json.loads(stored_review_data)
+                if keep_in_memory:
+                    with self._lock:
+                        self._entries[key] = (time.time(), review_data)
+                self._count(True)
+                return review_data
+
+        self._count(False)
+        return None
+
+    def set(self, workload_id, lens_alias, milestone_number, review_data, keep_in_memory=True):
+        key = self.key(workload_id, lens_alias, milestone_number)
+        #round trip through json so memory and backend hits look the same (datetimes as iso strings)
+        serialised_review_data = json.dumps(review_data, cls=DateTimeEncoder)
+        if keep_in_memory:
+            with self._lock:
+                self._entries[key] = (time.time(), json.loads(serialised_review_data))
+        if milestone_number is not None and self.backend is not None:
+            try:
+                self.backend.set(key, serialised_review_data)
+            except Exception as e:
+                print(f"milestone cache write failed: {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+def build_milestone_cache(backend_name=WA_CACHE_BACKEND):
+    """
+    Build the milestone cache configured by WAFR_WA_CACHE (disk, s3, memory or off).
+
+    Returns:
+    - MilestoneCache, or None when caching is switched off.
+    """
+    if backend_name == "disk":
+        return MilestoneCache(DiskCacheBackend(WA_CACHE_DIR, WA_CACHE_MAX_BYTES))
+    if backend_name == "s3":
+        #milestones are immutable - no ttl
+        return MilestoneCache(S3CacheBackend(WA_CACHE_BUCKET, WA_CACHE_PREFIX, ttl_seconds=0))
+    if backend_name == "memory":
+        return MilestoneCache()
+    return None
+
+providers.register("milestone_cache", build_milestone_cache)
 
 
 # def get_report():
@@ -43,120 +198,190 @@ client = boto3.client(service_name='wellarchitected', region_name="ap-southeast-
 #         json.dump(response_name, f, cls=DateTimeEncoder)
 
 
-# Extract Answers from Workload (Formatting of Questions included)
-def extract_answers_items(workload_id, lens_alias, milestone_number):
-    pillar_ids = ['operationalExcellence', 'security', 'reliability', 'performance', 'costOptimization', 'sustainability']
-    pillar_short_codes = ['OPS', 'SEC', 'REL', 'PERF', 'COST', 'SUS']
-
-    # Initialize an empty dictionary to store extracted data for each pillar
-    extracted_data_by_pillar = {}
+# Fetch every answer summary for a pillar, following NextToken to the last page
+def list_pillar_answers(workload_id, lens_alias, pillar_id, milestone_number):
+    """
+    Fetch all answer summaries for a single pillar of a lens review.
+
+    Args:
+    - workload_id: WA Tool workload id.
+    - lens_alias: lens alias or ARN.
+    - pillar_id: pillar to fetch answers for.
+    - milestone_number: milestone to read from (None = current state).
+
+    Returns:
+    - list of AnswerSummaries across all pages, in API order.
+    """
+    answer_summaries = []
+    request_params = {
+        "WorkloadId": workload_id,
+        "LensAlias": lens_alias,
+        "PillarId": pillar_id,
+        "MaxResults": LIST_ANSWERS_PAGE_SIZE,
+    }
+    if milestone_number is not None:
+        request_params["MilestoneNumber"] = milestone_number
+
+    while True:
+        response_answers_pillar = wa_call('list_answers', **request_params)
+        answer_summaries.extend(response_answers_pillar["AnswerSummaries"])
+
+        next_token = response_answers_pillar.get("NextToken")
+        if not next_token:
+            break
+        request_params["NextToken"] = next_token
+
+    return answer_summaries
+
+
+# Fetch every workload summary (optionally filtered by name prefix), following NextToken to the last page
+def list_workloads(name_prefix=None):
+    """
+    List the workloads visible to the account.
+
+    Args:
+    - name_prefix: optional workload name prefix filter (WorkloadNamePrefix).
+
+    Returns:
+    - list of WorkloadSummaries across all pages, in API order.
+    """
+    workload_summaries = []
+    request_params = {"MaxResults": LIST_WORKLOADS_PAGE_SIZE}
+    if name_prefix:
+        request_params["WorkloadNamePrefix"] = name_prefix
+
+    while True:
+        response_list_workloads = wa_call('list_workloads', **request_params)
+        workload_summaries.extend(response_list_workloads["WorkloadSummaries"])
+
+        next_token = response_list_workloads.get("NextToken")
+        if not next_token:
+            break
+        request_params["NextToken"] = next_token
+
+    return workload_summaries
+
+
+def list_milestone_numbers(workload_id):
+    """
+    Milestone numbers of a workload, following NextToken to the last page.
+
+    Returns:
+    - milestone numbers, oldest first (empty if the workload has no milestones).
+    """
+    milestone_numbers = []
+    request_params = {"WorkloadId": workload_id, "MaxResults": LIST_MILESTONES_PAGE_SIZE}
+
+    while True:
+        response_list_milestones = wa_call('list_milestones', **request_params)
+        milestone_numbers.extend(milestone_summary["MilestoneNumber"] for milestone_summary in response_list_milestones["MilestoneSummaries"])
+
+        next_token = response_list_milestones.get("NextToken")
+        if not next_token:
+            break
+        request_params["NextToken"] = next_token
+
+    return sorted(milestone_numbers)
+
+
+def latest_milestone_number(workload_id):
+    """
+    Highest milestone number of a workload.
+
+    Returns:
+    - milestone number, or None if the workload has no milestones.
+    """
+    milestone_numbers = list_milestone_numbers(workload_id)
+    return milestone_numbers[-1] if milestone_numbers else None
+
+
+# Fetch the raw answer summaries of every pillar of the lens
+def list_answer_summaries(workload_id, lens_alias, milestone_number, pillar_ids=PILLAR_IDS):
+    """
+    Fetch the answer summaries of every pillar.
+
+    Args:
+    - workload_id / lens_alias / milestone_number: lens review to read.
+    - pillar_ids: pillars of the lens (from the lens review).
+
+    Returns:
+    - {pillar_id: [AnswerSummary, ...]} in API order.
+    """
+    # Fetch all pillars concurrently over the shared client (boto3 clients are thread safe)
+    with ThreadPoolExecutor(max_workers=max(1, len(pillar_ids))) as executor:
+        answers_by_pillar = list(executor.map(
+            lambda pillar_id: list_pillar_answers(workload_id, lens_alias, pillar_id, milestone_number),
+            pillar_ids,
+        ))
+    return dict(zip(pillar_ids, answers_by_pillar))
 
-    for pillar_id, pillar_short_code in zip(pillar_ids, pillar_short_codes):
-        response_answers_pillar = client.list_answers(
-            WorkloadId=workload_id,
-            LensAlias=lens_alias,
-            PillarId=pillar_id,
-            MilestoneNumber=milestone_number,
-        )
 
-        # Initialize an empty dictionary to store the extracted information for this pillar
-        extracted_data = {}
-
-        # Initialize a counter for numbering the questions
-        question_number = 1
-
-        # Iterate over each question in the AnswerSummaries
-        for answer_summary in response_answers_pillar["AnswerSummaries"]:
-            # Extract the question title
-            question_title = f"{pillar_short_code} {question_number}. {answer_summary['QuestionTitle']}"
-            
-            # Initialize an empty list to store unselected choices
-            unselected_choices = []
-            
-            # Iterate over each choice for the question
-            for choice in answer_summary["Choices"]:
-                # Check if the choice is not in the list of selected choices
-                if choice["ChoiceId"] not in answer_summary["SelectedChoices"]:
-                    if choice["Title"] != "None of these":
-                        # Append the title of the unselected choice to the list
-                        unselected_choices.append(choice["Title"])
-            
-            # Extract the risk value
-            risk = answer_summary["Risk"]
-            
-            # Store the extracted information in the dictionary
-            extracted_data[question_title] = {
-                "UnselectedChoices": unselected_choices,
-                "Risk": risk
-            }
-
-            # Increment the question number
-            question_number += 1
-        
-        # Store the extracted data for this pillar in the dictionary of extracted data by pillar
-        extracted_data_by_pillar[pillar_id] = extracted_data
-    
-    with open('/tmp/pillar_answers.json', 'w') as f:
-        json.dump(extracted_data_by_pillar, f, cls=DateTimeEncoder)
+# Extract the answers of every pillar into Py Struct (question label -> unselected choice titles + risk)
+def extract_answers_items(workload_id, lens_alias, milestone_number, pillar_ids=PILLAR_IDS):
+    """
+    Returns:
+    - {pillar_id: {question label: {"UnselectedChoices": [choice titles], "Risk": ...}}} - the input of
+      filter_high_risk_questions / filter_medium_risk_questions.
+    """
+    answer_summaries = list_answer_summaries(workload_id, lens_alias, milestone_number, pillar_ids)
+    lens = LensDefinition.from_answer_summaries(lens_alias, None, answer_summaries)
+    return lens.resolve_questions(compact_answers(answer_summaries))
 
-    return extracted_data_by_pillar
-    
 
 
-# Filter out HRIs into Py Struct
+# Filter out HRIs into Py Struct (one-off - reports query the RiskIndex built in fetch_wafr_questions)
 def filter_high_risk_questions(extracted_data_by_pillar):
-    filtered_data_by_pillar = {}
+    return RiskIndex(extracted_data_by_pillar).questions(risks="HIGH")
 
-    for pillar_id, extracted_data in extracted_data_by_pillar.items():
-        filtered_data = {}
-
-        for question_title, info in extracted_data.items():
-            if info["Risk"] == "HIGH":
-                filtered_data[question_title] = info
+# Filter out MRIs into Py Struct
+def filter_medium_risk_questions(extracted_data_by_pillar):
+    return RiskIndex(extracted_data_by_pillar).questions(risks="MEDIUM")
 
-        if filtered_data:
-            filtered_data_by_pillar[pillar_id] = filtered_data
 
-    with open('/tmp/filter_high_risk_questions.json', 'w') as f:
-        json.dump(filtered_data_by_pillar, f, cls=DateTimeEncoder)
-    return filtered_data_by_pillar 
+# Lens review for a milestone (risk counts per pillar, lens version)
+def get_lens_review(workload_id, lens_alias, milestone_number):
+    #Get correct workload and lens from WA Tool API (no milestone = current state)
+    request_params = {"WorkloadId": workload_id, "LensAlias": lens_alias}
+    if milestone_number is not None:
+        request_params["MilestoneNumber"] = milestone_number
+    response_get_lens_review = wa_call('get_lens_review', **request_params)
+    return response_get_lens_review["LensReview"]
 
-# Filter out MRIs into Py Struct
-def filter_medium_risk_questions(extracted_data_by_pillar):
-    filtered_data_by_pillar = {}
 
-    for pillar_id, extracted_data in extracted_data_by_pillar.items():
-        filtered_data = {}
+# Lens review + answers for a milestone, served from the milestone cache when possible
+@timed("fetch_review_data")
+def fetch_review_data(workload_id, lens_alias, milestone_number, keep_in_memory=True):
+    """
+    Args:
+    - keep_in_memory: also keep the review in the in-memory milestone cache (False for portfolio-size reads).
 
-        for question_title, info in extracted_data.items():
-            if info["Risk"] == "MEDIUM":
-                filtered_data[question_title] = info
+    Returns:
+    - {"lens_review": LensReview, "answers": {pillar_id: [AnswerSummary, ...]}}.
+    """
+    milestone_cache = providers.get("milestone_cache")
+    if milestone_cache is not None:
+        review_data = milestone_cache.get(workload_id, lens_alias, milestone_number, keep_in_memory)
+        if review_data is not None:
+            return review_data
 
-        if filtered_data:
-            filtered_data_by_pillar[pillar_id] = filtered_data
+    lens_review = get_lens_review(workload_id, lens_alias, milestone_number)
+    #pillars come from the lens review, so custom lenses work as well as the standard one
+    pillar_ids = [pillar_summary["PillarId"] for pillar_summary in lens_review["PillarReviewSummaries"]]
+    review_data = {"lens_review": lens_review, "answers": list_answer_summaries(workload_id, lens_alias, milestone_number, pillar_ids)}
 
-    with open('/tmp/filter_medium_risk_questions.json', 'w') as f:
-        json.dump(filtered_data_by_pillar, f, cls=DateTimeEncoder)
-    return filtered_data_by_pillar 
+    if milestone_cache is not None:
+        milestone_cache.set(workload_id, lens_alias, milestone_number, review_data, keep_in_memory)
+    return review_data
 
 
 # Extract Risk Metrics into Dict (Combined HRI and MRIs)
-def extract_risk_table_items(workload_id, lens_alias,milestone_number):
-    
-    #Get correct workload and lens from WA Tool API
-    response_get_lens_review = client.get_lens_review(
-        WorkloadId= workload_id,
-        LensAlias= lens_alias,
-        MilestoneNumber=milestone_number
-    )
-
-    # Build Pillar Risk Metrics Dict
+def risk_metrics_from_lens_review(lens_review):
+    # Build Pillar Risk Metrics Dict - one entry per pillar of the lens
     pillars_risk_dict = [] #Risk dictionary
-    for pillar_num in range(1, 7):  # Pillar numbers range from 1 to 6
-        pillar_name = response_get_lens_review["LensReview"]["PillarReviewSummaries"][pillar_num - 1]["PillarName"]
-        risk_counts = response_get_lens_review["LensReview"]["PillarReviewSummaries"][pillar_num - 1]["RiskCounts"]
+    for pillar_review_summary in lens_review["PillarReviewSummaries"]:
+        risk_counts = pillar_review_summary["RiskCounts"]
         pillar_metrics = {
-            "Name": pillar_name,
+            "Name": pillar_review_summary["PillarName"],
             "Unanswered": risk_counts.get("UNANSWERED", None),
             "High": risk_counts.get("HIGH", None),
             "Medium": risk_counts.get("MEDIUM", None),
@@ -164,24 +389,47 @@ def extract_risk_table_items(workload_id, lens_alias,milestone_number):
             "NotApplicable": risk_counts.get("NOT_APPLICABLE", None)
         }
         pillars_risk_dict.append(pillar_metrics) #pillar = pillars_risk_dict[0] #hri_count = pillar['High']
-    with open('/tmp/risk_metrics.json', 'w') as f:
-        json.dump(pillars_risk_dict, f, cls=DateTimeEncoder)
     return pillars_risk_dict
+
+
+def extract_risk_table_items(workload_id, lens_alias,milestone_number):
+    return risk_metrics_from_lens_review(get_lens_review(workload_id, lens_alias, milestone_number))
    
 ########################################
 #__main__
 
-def fetch_wafr_questions(workloadId, lensAlias, milestoneNumber):
+@timed("fetch_wafr_questions")
+def fetch_wafr_questions(workloadId, lensAlias, milestoneNumber, workspace=None):
     #Review Selection defaults - incase custom overrides / testing
 
-    #Note: questions are being chopped off at 10 per pillar - need to consider pag
     workload_id = workloadId
     lens_alias = lensAlias
     milestone_number = milestoneNumber
 
-    extract_risk_table_items(workload_id, lens_alias,milestone_number)
-    extracted_data_by_pillar = extract_answers_items(workload_id, lens_alias,milestone_number)
-    filter_high_risk_questions(extracted_data_by_pillar)
-    filter_medium_risk_questions(extracted_data_by_pillar)
-
-    print("WAFR Workload pulled - Questions extracted, HRI and MRI filters extracted")
\ No newline at end of file
+    context = ReportContext(workload_id, lens_alias, milestone_number, workspace=workspace)
+    review_data = fetch_review_data(workload_id, lens_alias, milestone_number)
+    lens_review = review_data["lens_review"]
+
+    # Question / choice titles live once per lens version in the lens cache, answers keep ids only (no version = not cached)
+    pillar_names = {pillar_summary["PillarId"]: pillar_summary["PillarName"] for pillar_summary in lens_review["PillarReviewSummaries"]}
+    context.lens = providers.get("lens_cache").get_or_build(lens_alias, lens_review.get("LensVersion"), review_data["answers"], pillar_names)
+    context.pillar_answers = compact_answers(review_data["answers"])
+
+    # One pass over the answers - risk metrics, HRI / MRI tables and the quick win input are all index lookups
+    context.risk_index = RiskIndex(context.pillar_answers)
+    context.risk_metrics = context.risk_index.risk_metrics(pillar_names)
+    context.high_risk_questions = context.risk_index.questions(risks="HIGH")
+    context.medium_risk_questions = context.risk_index.questions(risks="MEDIUM")
+
+    #optional debug dumps into the job workspace - memory only unless WAFR_DEBUG_DUMP_DIR is set
+    context.dump_debug("risk_metrics", context.risk_metrics)
+    context.dump_debug("pillar_answers", context.pillar_answers)
+    context.dump_debug("filter_high_risk_questions", context.high_risk_questions)
+    context.dump_debug("filter_medium_risk_questions", context.medium_risk_questions)
+    context.dump_debug("risk_index_stats", context.risk_index.stats())
+
+    milestone_cache = providers.get("milestone_cache")
+    if milestone_cache is not None:
+        print(f"milestone cache stats: {milestone_cache.stats()}")
+    print("WAFR Workload pulled - Questions extracted, HRI and MRI filters extracted")
+    return context
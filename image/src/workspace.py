@@ -0,0 +1,162 @@
+#system imports
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+
+#Per-job scratch space - every intermediate artifact of a report lives under <root>/<job_id>,
+#so concurrent reports in one process / warm container never overwrite each other's files
+
+WORKSPACE_ROOT = os.getenv("WAFR_WORKSPACE_ROOT", "/tmp/wafr_workspaces")
+WORKSPACE_MAX_BYTES = int(os.getenv("WAFR_WORKSPACE_MAX_BYTES", str(64 * 1024 * 1024)))
+WORKSPACE_STALE_SECONDS = int(os.getenv("WAFR_WORKSPACE_STALE_SECONDS", "3600"))
+#open workspaces touch a heartbeat file this often - staleness is judged by the last heartbeat, not the directory
+WORKSPACE_HEARTBEAT_SECONDS = int(os.getenv("WAFR_WORKSPACE_HEARTBEAT_SECONDS", "60"))
+HEARTBEAT_FILE = ".heartbeat"
+
+#workspace directories open in this process - never removed by cleanup_stale_workspaces
+_live_dirs = set()
+_live_lock = threading.Lock()
+
+#Class Definitions
+class DateTimeEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class WorkspaceBudgetExceeded(Exception):
+    pass
+
+
+class Workspace:
+    """
+    Directory scoped to one job, with a size budget and cleanup on exit.
+
+    Use as a context manager: with Workspace(job_id) as workspace: ... - while it is open a heartbeat
+    file is touched every WAFR_WORKSPACE_HEARTBEAT_SECONDS, so a long LLM stage doesn't look abandoned.
+    """
+    def __init__(self, job_id=None, root=WORKSPACE_ROOT, max_bytes=WORKSPACE_MAX_BYTES, keep=False):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.root = root
+        self.max_bytes = max_bytes
+        self.keep = keep #keep the files after exit i.e. for debug dumps
+        self.dir = os.path.join(self.root, self.job_id)
+        os.makedirs(self.dir, exist_ok=True)
+        with _live_lock:
+            _live_dirs.add(os.path.abspath(self.dir))
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat_thread = None
+        self.heartbeat()
+
+    def __enter__(self):
+        def beat():
+            while not self._stop_heartbeat.wait(WORKSPACE_HEARTBEAT_SECONDS):
+                self.heartbeat()
+
+        self._heartbeat_thread = threading.Thread(target=beat, name=f"wafr-workspace-heartbeat-{self.job_id}", daemon=True)
+        self._heartbeat_thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop_heartbeat.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+        with _live_lock:
+            _live_dirs.discard(os.path.abspath(self.dir))
+        if not self.keep:
+            self.cleanup()
+        return False
+
+    def heartbeat(self):
+        #mark the workspace as in use (its mtime is what cleanup_stale_workspaces looks at)
+        try:
+            with open(os.path.join(self.dir, HEARTBEAT_FILE), 'a'):
+                pass
+            os.utime(os.path.join(self.dir, HEARTBEAT_FILE))
+        except FileNotFoundError:
+            pass
+
+    def path(self, name):
+        """
+        Absolute path for an artifact inside the workspace (sub folders are created as needed).
+
+        Args:
+        - name: relative file name i.e. bar_chart.png or debug/risk_metrics.json.
+        """
+        path = os.path.normpath(os.path.join(self.dir, name))
+        if os.path.commonpath([path, self.dir]) != self.dir:
+            raise ValueError(f"'{name}' is outside the workspace")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def used_bytes(self):
+        total_bytes = 0
+        for dir_path, _, file_names in os.walk(self.dir):
+            for file_name in file_names:
+                try:
+                    total_bytes += os.path.getsize(os.path.join(dir_path, file_name))
+                except FileNotFoundError:
+                    pass
+        return total_bytes
+
+    def check_budget(self, extra_bytes=0):
+        """
+        Raise WorkspaceBudgetExceeded if the workspace (plus extra_bytes about to be written) is over budget.
+        """
+        used_bytes = self.used_bytes() + extra_bytes
+        if self.max_bytes and used_bytes > self.max_bytes:
+            raise WorkspaceBudgetExceeded(f"workspace {self.job_id} needs {used_bytes} bytes, budget is {self.max_bytes}")
+
+    def write_bytes(self, name, data):
+        self.check_budget(len(data))
+        path = self.path(name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def write_json(self, name, data):
+        return self.write_bytes(name, json.dumps(data, cls=DateTimeEncoder, indent=4).encode('utf-8'))
+
+    def read_json(self, name):
+        with open(self.path(name)) as f:
+            return json.load(f)
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def last_activity(workspace_dir):
+    """
+    Last sign of life of a workspace: its heartbeat file, or the directory itself for one without a heartbeat.
+    """
+    try:
+        return os.stat(os.path.join(workspace_dir, HEARTBEAT_FILE)).st_mtime
+    except FileNotFoundError:
+        return os.stat(workspace_dir).st_mtime
+
+
+def cleanup_stale_workspaces(root=WORKSPACE_ROOT, max_age_seconds=WORKSPACE_STALE_SECONDS):
+    """
+    Remove workspaces left behind by crashed / killed jobs (no heartbeat for max_age_seconds).
+
+    Workspaces open in this process are always kept, whatever their age.
+    """
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - max_age_seconds
+    with _live_lock:
+        live_dirs = set(_live_dirs)
+    for entry in os.scandir(root):
+        if not entry.is_dir() or os.path.abspath(entry.path) in live_dirs:
+            continue
+        try:
+            stale = last_activity(entry.path) < cutoff
+        except FileNotFoundError:
+            continue
+        if stale:
+            shutil.rmtree(entry.path, ignore_errors=True)
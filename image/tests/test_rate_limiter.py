@@ -0,0 +1,85 @@
+"""
+AdaptiveRateLimiter against the local fake Bedrock endpoint of bench_rate_limiter.
+
+Run with: python -m pytest image/tests
+"""
+#system imports
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+#third-party imports
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from langchain.llms.bedrock import Bedrock
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import JsonOutputParser
+
+#local/user imports
+from aws_clients import build_client_config
+from bench_rate_limiter import FakeBedrockHandler
+from llm_cache import cached_llm
+from rate_limiter import AdaptiveRateLimiter, TokenBucket
+
+CLIENT_RPS = 10
+CONCURRENT_CALLS = 10
+
+
+class SlowFakeBedrockHandler(FakeBedrockHandler):
+    """
+    Answers throttles after a delay too, so every call of a burst is issued before the first 429 is back.
+    """
+    def do_POST(self):
+        time.sleep(0.3)
+        super().do_POST()
+
+
+@pytest.fixture
+def fake_bedrock():
+    #admits one request, throttles the rest of a burst
+    FakeBedrockHandler.bucket = TokenBucket(0.01, 1)
+    FakeBedrockHandler.throttled = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowFakeBedrockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_burst_of_concurrent_throttles_halves_the_rate_once(fake_bedrock):
+    client = boto3.client('bedrock-runtime', endpoint_url=fake_bedrock, config=build_client_config('bedrock-runtime'))
+    llm = Bedrock(client=client, model_id="anthropic.claude-v2:1", model_kwargs={"max_tokens_to_sample": 256})
+    limiter = AdaptiveRateLimiter(max_requests_per_second=CLIENT_RPS, max_retries=0)
+    chain = PromptTemplate.from_template("Answer as json for item {item}") | cached_llm(llm, JsonOutputParser(), None, limiter)
+
+    #every call is in flight before the first throttle comes back - one congestion event
+    with ThreadPoolExecutor(max_workers=CONCURRENT_CALLS) as executor:
+        futures = [executor.submit(chain.invoke, {"item": str(i)}) for i in range(CONCURRENT_CALLS)]
+        failures = sum(1 for future in futures if future.exception() is not None)
+
+    stats = limiter.stats()
+    assert FakeBedrockHandler.throttled == CONCURRENT_CALLS - 1
+    assert failures == CONCURRENT_CALLS - 1
+    assert stats["throttles"] == CONCURRENT_CALLS - 1
+    assert stats["rate_decreases"] == 1
+    #halved once (plus at most one additive step from the admitted call), nowhere near the floor
+    assert CLIENT_RPS / 2 <= stats["requests_per_second"] <= CLIENT_RPS / 2 + limiter.increase_step
+
+
+def test_throttle_after_a_decrease_starts_a_new_window():
+    limiter = AdaptiveRateLimiter(max_requests_per_second=CLIENT_RPS, max_retries=1, backoff_base_seconds=0)
+    throttle = ClientError({"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}}, "InvokeModel")
+
+    for _ in range(2):
+        #retried request is issued after the first decrease, so its throttle decreases again
+        with pytest.raises(ClientError):
+            limiter.call(lambda: (_ for _ in ()).throw(throttle))
+
+    assert limiter.stats()["rate_decreases"] == 4
+    assert limiter.requests_per_second == pytest.approx(CLIENT_RPS / 16)